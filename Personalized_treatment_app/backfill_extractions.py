@@ -0,0 +1,30 @@
+# backfill_extractions.py
+"""
+Refresh stored extractions after METRIC_ALIASES / REF_RANGES / extractor changes.
+
+    python backfill_extractions.py [--dry-run] [--workers 2] [--batch-size 200] [--pause 0.5] [--limit N]
+
+Only the stages affected by the change are re-run (see services/extraction_backfill.py).
+"""
+import argparse
+
+from database.db import init_db
+from services.extraction_backfill import run_backfill
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incremental re-extraction backfill")
+    parser.add_argument("--dry-run", action="store_true", help="only count stale reports per action")
+    parser.add_argument("--workers", type=int, default=2, help="worker processes (keep low on a live server)")
+    parser.add_argument("--batch-size", type=int, default=200, help="reports per batch / DB transaction")
+    parser.add_argument("--pause", type=float, default=0.5, help="seconds to sleep between batches")
+    parser.add_argument("--limit", type=int, default=None, help="stop after N stale reports")
+    args = parser.parse_args()
+
+    init_db()
+    run_backfill(workers=args.workers, batch_size=args.batch_size, pause_seconds=args.pause,
+                 limit=args.limit, dry_run=args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+# batch_recommendations.py
+"""
+Regenerate AI recommendations in bulk through a batch endpoint instead of one call per report.
+
+    python batch_recommendations.py write requests.jsonl [--status pending_ai] [--only-missing]
+                                                         [--report-id ID ...] [--limit N]
+    python batch_recommendations.py fake-results requests.jsonl results.jsonl [--error-rate 0.05]
+    python batch_recommendations.py ingest results.jsonl [--chunk-size 500] [--overwrite-reviewed]
+
+`write` produces an OpenAI Batch API request file (upload it with purpose
+"batch" and create a batch on /v1/chat/completions); `ingest` applies the
+downloaded output file. `fake-results` answers a request file offline with the
+deterministic fake backend, so the whole flow runs without an API key.
+
+fixtures/llm_batch/ holds sample request and result files for reports in
+healthcare.db; ingesting results_sample.jsonl into a copy of the database
+exercises every outcome (updated, created, checkpointed, skipped_reviewed,
+unknown_report, and two failed requests). See services/llm_batch.py.
+"""
+import argparse
+
+from database.db import init_db
+from services.llm_batch import ingest_batch_results, select_reports, write_batch_requests, write_fake_results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    write = commands.add_parser("write", help="write a batch-request file for the selected reports")
+    write.add_argument("out")
+    write.add_argument("--report-id", action="append", default=None, help="repeat for several reports")
+    write.add_argument("--status", default=None, help="only reports with this processing_status, e.g. pending_ai")
+    write.add_argument("--only-missing", action="store_true", help="only reports without a recommendation")
+    write.add_argument("--limit", type=int, default=None)
+
+    fake = commands.add_parser("fake-results", help="answer a request file offline")
+    fake.add_argument("requests")
+    fake.add_argument("out")
+    fake.add_argument("--error-rate", type=float, default=0.0)
+    fake.add_argument("--invalid-rate", type=float, default=0.0)
+    fake.add_argument("--seed", type=int, default=0)
+
+    ingest = commands.add_parser("ingest", help="apply a batch result file")
+    ingest.add_argument("results")
+    ingest.add_argument("--chunk-size", type=int, default=500, help="reports per DB transaction")
+    ingest.add_argument("--overwrite-reviewed", action="store_true",
+                        help="also replace the AI suggestions of recommendations a doctor already reviewed "
+                             "and send them back for review")
+    args = parser.parse_args()
+
+    if args.command == "fake-results":
+        write_fake_results(args.requests, args.out, args.error_rate, args.invalid_rate, args.seed)
+        return
+
+    init_db()
+    if args.command == "write":
+        reports = select_reports(args.report_id, args.status, args.only_missing, args.limit)
+        write_batch_requests(args.out, reports)
+    else:
+        summary = ingest_batch_results(args.results, args.chunk_size, args.overwrite_reviewed)
+        for report_id, error in summary["failures"]:
+            print(f"  ✗ {report_id}: {error}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+# benchmark_metric_batch.py
+"""
+Compare per-document metric extraction with the vectorised batch API.
+
+    python benchmark_metric_batch.py [--docs 2000] [--seed 0]
+
+Builds a corpus from the raw text of stored reports with every number
+randomised (so value lines don't repeat), runs MetricExtractor per document
+and BatchMetricExtractor on the whole batch, checks that values and flags
+agree, and prints documents per second for both.
+"""
+import argparse
+import json
+import random
+import re
+import time
+
+import pandas as pd
+
+from database.db import init_db
+from database.db_utils import DBManager
+from services.extraction.metric_extractor import MetricExtractor
+from services.extraction.batch_metric_extractor import BatchMetricExtractor
+from utils.flagging import flag_code
+
+
+def build_corpus(n_docs: int, seed: int) -> list:
+    rows = DBManager.fetch_all("SELECT extracted_data_json FROM health_reports")
+    templates = [json.loads(r["extracted_data_json"] or "{}").get("raw_text") for r in rows]
+    templates = [t for t in templates if t]
+    if not templates:
+        raise SystemExit("No extracted reports with raw_text in the database.")
+    rng = random.Random(seed)
+    number = re.compile(r"\d+(?:\.\d+)?")
+    return [number.sub(lambda m: f"{rng.uniform(0, 300):.1f}", rng.choice(templates))
+            for _ in range(n_docs)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--docs", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    init_db()
+    texts = build_corpus(args.docs, args.seed)
+
+    start = time.perf_counter()
+    scalar = [MetricExtractor.derive_ratios(MetricExtractor.extract_values(t, is_path=False)) for t in texts]
+    scalar_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    values, flags = BatchMetricExtractor.extract_metrics(texts)
+    batch_s = time.perf_counter() - start
+
+    mismatches = 0
+    for i, (expected, got) in enumerate(zip(scalar, BatchMetricExtractor.to_records(values))):
+        expected_flags = {m: (None if v is None else flag_code(m, v)) for m, v in expected.items()}
+        got_flags = {m: (None if pd.isna(f) else f) for m, f in flags.iloc[i].items()}
+        if expected != got or expected_flags != got_flags:
+            mismatches += 1
+
+    print(f"{len(texts)} documents")
+    print(f"  per-document: {len(texts) / scalar_s:8.1f} docs/s  ({scalar_s:.2f}s)")
+    print(f"  batch:        {len(texts) / batch_s:8.1f} docs/s  ({batch_s:.2f}s)")
+    print(f"  mismatching documents: {mismatches}")
+
+
+if __name__ == "__main__":
+    main()
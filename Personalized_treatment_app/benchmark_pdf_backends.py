@@ -0,0 +1,54 @@
+# benchmark_pdf_backends.py
+"""
+Compare PDF text-layer backends on a report corpus.
+
+    python benchmark_pdf_backends.py [corpus_dir] [--repeat N]
+
+Reports pages per second for PyMuPDF (fast path), pdfplumber, and the
+table-aware path that mixes both. Defaults to the uploads directory.
+"""
+import argparse
+import glob
+import os
+import time
+
+import fitz
+
+from config import UPLOAD_DIR
+from services.extraction.text_extractor import RawTextExtractor
+
+
+def _page_count(path: str) -> int:
+    with fitz.open(path) as doc:
+        return doc.page_count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("corpus_dir", nargs="?", default=UPLOAD_DIR)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    pdfs = sorted(glob.glob(os.path.join(args.corpus_dir, "**", "*.pdf"), recursive=True))
+    if not pdfs:
+        print(f"No PDFs found under {args.corpus_dir}")
+        return
+    pages = sum(_page_count(p) for p in pdfs)
+
+    backends = {
+        "pymupdf": RawTextExtractor._pdf_pages_pymupdf,
+        "pdfplumber": RawTextExtractor._pdf_text_pdfplumber,
+        "table-aware": RawTextExtractor._extract_pdf_text_and_tables,
+    }
+    print(f"Corpus: {len(pdfs)} PDFs, {pages} pages, {args.repeat} repeat(s)")
+    for name, fn in backends.items():
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            for path in pdfs:
+                fn(path)
+        elapsed = time.perf_counter() - start
+        print(f"{name:>12}: {pages * args.repeat / elapsed:8.1f} pages/s  ({elapsed:.2f}s)")
+
+
+if __name__ == "__main__":
+    main()
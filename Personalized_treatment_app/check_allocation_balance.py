@@ -0,0 +1,148 @@
+# check_allocation_balance.py
+"""
+Burst test of doctor auto-allocation: is work spread by workload, with no report claimed twice?
+
+    python check_allocation_balance.py [--reports 200] [--processes 4] [--threads 8]
+                                       [--extra-doctors 4] [--report-type "Blood Test"]
+
+Works on a copy of the database: adds `--extra-doctors` idle doctors of the
+report type's specialization, inserts `--reports` extracted reports and
+allocates them all at once from `--processes` processes (separate SQLite
+connections, like several app instances) with `--threads` threads each.
+Every report is submitted by two processes, as a retried upload would be.
+Prints every doctor's pending reviews before and after, and fails if a
+report is unassigned or ended up with another doctor than a worker saw it
+claimed by (a double claim), if a patient-doctor pair has more than one
+active mapping, or if the doctors' final workloads differ by more than one
+report (unless the burst was too small to level out the starting workloads).
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import redirect_stdout
+
+
+def _init_worker(database_file: str):
+    import config
+    config.DATABASE_FILE = database_file
+    from database.db import init_db
+    with redirect_stdout(open(os.devnull, "w")):
+        init_db()
+
+
+def _allocate_one(report_id: str):
+    """(report_id, the doctor the report has right after this worker allocated it)."""
+    from models.health_report import HealthReport
+    from services.auto_allocator import auto_assign_doctor
+    auto_assign_doctor(report_id)
+    return report_id, HealthReport.get_by_report_id(report_id).assigned_doctor_id
+
+
+def _allocate(report_ids: list, threads: int) -> list:
+    """Allocates the reports on `threads` threads of this process."""
+    with redirect_stdout(open(os.devnull, "w")), ThreadPoolExecutor(threads) as pool:
+        return list(pool.map(_allocate_one, report_ids))
+
+
+def _workload(specialization: str) -> dict:
+    from models.doctor import Doctor
+    return {doctor.doctor_id: pending for doctor, pending in Doctor.get_workload_by_specialization(specialization)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--reports", type=int, default=200)
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--extra-doctors", type=int, default=4)
+    parser.add_argument("--report-type", default="Blood Test")
+    args = parser.parse_args()
+
+    import config
+    workdir = tempfile.mkdtemp(prefix="pta-allocation-")
+    config.DATABASE_FILE = os.path.join(workdir, "healthcare.db")
+    shutil.copy(os.path.join(config.BASE_DIR, "healthcare.db"), config.DATABASE_FILE)
+    _init_worker(config.DATABASE_FILE)
+
+    from database.db_utils import DBManager
+    from models.health_report import HealthReport
+    from models.report_specialist_mapping import ReportSpecialistMapping
+    specialization = ReportSpecialistMapping.get_specialization_by_report_type(args.report_type)
+    if not specialization:
+        raise SystemExit(f"No specialization is mapped to report type '{args.report_type}'.")
+
+    for i in range(args.extra_doctors):
+        user_id, doctor_id = str(uuid.uuid4()), str(uuid.uuid4())
+        DBManager.execute_transaction([
+            ("INSERT INTO users (user_id, username, password_hash, user_type, email) VALUES (?, ?, '-', 'doctor', ?)",
+             [(user_id, f"burst_doctor_{i}", f"burst_doctor_{i}@example.com")]),
+            ("INSERT INTO doctors (doctor_id, user_id, specialization, is_available) VALUES (?, ?, ?, 1)",
+             [(doctor_id, user_id, specialization)]),
+        ])
+    patients = DBManager.fetch_all("SELECT patient_id, user_id FROM patients")
+    if not patients:
+        raise SystemExit("No patients in the database to upload for.")
+
+    report_ids = []
+    with redirect_stdout(open(os.devnull, "w")):
+        for i in range(args.reports):
+            patient = patients[i % len(patients)]
+            report = HealthReport(patient_id=patient["patient_id"], uploaded_by=patient["user_id"], report_type=args.report_type,
+                                  file_type="pdf", file_name=f"burst_{i}.pdf", file_path=f"burst_{i}.pdf",
+                                  processing_status="extracted", pipeline_stage="allocation")
+            if not report.save():
+                raise SystemExit("Failed to insert a report.")
+            report_ids.append(report.report_id)
+
+    before = _workload(specialization)
+    print(f"{args.reports} '{args.report_type}' reports → {len(before)} available {specialization}(s), "
+          f"{args.processes} processes × {args.threads} threads – database copy in {workdir}")
+
+    start = time.perf_counter()
+    rng = random.Random(0)
+    slices = []
+    for p in range(args.processes):
+        # Each report in two processes' slices (its own and the next one's)
+        part = report_ids[p::args.processes] + report_ids[(p - 1) % args.processes::args.processes]
+        rng.shuffle(part)
+        slices.append(part)
+    with ProcessPoolExecutor(args.processes, initializer=_init_worker, initargs=(config.DATABASE_FILE,)) as pool:
+        seen = [pair for part in pool.map(_allocate, slices, [args.threads] * len(slices)) for pair in part]
+    elapsed = time.perf_counter() - start
+
+    after = _workload(specialization)
+    print(f"\n{len(seen)} allocation calls for {args.reports} reports in {elapsed:.2f}s "
+          f"({len(seen) / elapsed:.0f} calls/s)")
+    print(f"\n{'doctor':<38} {'before':>7} {'after':>7} {'claimed':>8}")
+    for doctor_id in after:
+        print(f"{doctor_id:<38} {before[doctor_id]:>7} {after[doctor_id]:>7} {after[doctor_id] - before[doctor_id]:>8}")
+
+    placeholders = ", ".join("?" * len(report_ids))
+    final = {row["report_id"]: row["assigned_doctor_id"] for row in DBManager.fetch_all(
+        f"SELECT report_id, assigned_doctor_id FROM health_reports WHERE report_id IN ({placeholders})",
+        tuple(report_ids))}
+    unassigned = sum(1 for doctor_id in final.values() if doctor_id is None)
+    double_claims = len({report_id for report_id, doctor_id in seen if doctor_id != final[report_id]})
+    duplicate_mappings = DBManager.fetch_one("""
+        SELECT COUNT(*) AS n FROM (SELECT 1 FROM patient_doctor_mapping WHERE is_active = 1
+                                   GROUP BY patient_id, doctor_id HAVING COUNT(*) > 1)
+    """)["n"]
+    claimed = sum(after.values()) - sum(before.values())
+    # Claims go to the least loaded doctor, so a burst large enough to level the
+    # starting workloads must leave them within one report of each other
+    levels_out = args.reports >= sum(max(before.values()) - n for n in before.values())
+    spread = max(after.values()) - min(after.values())
+    print(f"\nunassigned: {unassigned}, double claims: {double_claims}, "
+          f"duplicate active mappings: {duplicate_mappings}, final spread: {spread}")
+    if unassigned or double_claims or claimed != args.reports or duplicate_mappings or (levels_out and spread > 1):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+# check_import_budget.py
+"""
+Import-time budget check for start-up critical modules.
+
+    python check_import_budget.py [--budget-ms 300]
+
+Each module is imported in a fresh interpreter. The check fails (exit code 1)
+if an import exceeds the time budget or drags in one of the heavy OCR / PDF /
+LLM / NLP libraries that must only load when they are actually used.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Modules imported at cold start or on the login page
+MODULES = [
+    "services.extraction.text_extractor",
+    "services.extraction.metric_extractor",
+    "services.ai_recommendation_engine",
+    "services.db_initializer",
+    "models.health_report",
+]
+
+HEAVY = ["cv2", "fitz", "pymupdf", "pdfplumber", "pytesseract", "docx", "PIL", "openai", "spacy"]
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = (time.perf_counter() - start) * 1000
+print(json.dumps({{"ms": elapsed, "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure(module: str) -> dict:
+    out = subprocess.run(
+        [sys.executable, "-c", _PROBE.format(module=module, heavy=HEAVY)],
+        cwd=BASE_DIR, capture_output=True, text=True,
+    )
+    if out.returncode != 0:
+        return {"ms": None, "heavy": [], "error": out.stderr.strip().splitlines()[-1]}
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Import-time budget check")
+    parser.add_argument("--budget-ms", type=float, default=300.0)
+    args = parser.parse_args()
+
+    failed = False
+    for module in MODULES:
+        result = measure(module)
+        if result.get("error"):
+            print(f"✗ {module}: import failed – {result['error']}")
+            failed = True
+            continue
+        over = result["ms"] > args.budget_ms
+        status = "✗" if over or result["heavy"] else "✓"
+        heavy = f"  heavy: {', '.join(result['heavy'])}" if result["heavy"] else ""
+        print(f"{status} {module}: {result['ms']:.1f} ms{heavy}")
+        failed = failed or over or bool(result["heavy"])
+
+    print("Import budget exceeded." if failed else "All imports within budget.")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
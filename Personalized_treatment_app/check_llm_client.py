@@ -0,0 +1,77 @@
+# check_llm_client.py
+"""
+Exercise AsyncLLMClient against the local stub server.
+
+    python check_llm_client.py [--requests 60] [--distinct 40] [--rpm 600]
+                               [--concurrency 4] [--rate-limit-rate 0.2]
+
+Fires a burst of requests at once (`--distinct` different prompts, the rest
+duplicates of them) and checks that:
+  - duplicates were coalesced (the stub saw at most one call per prompt and attempt),
+  - the stub never served more than `--concurrency` requests at a time,
+  - injected 429s were retried and every request still succeeded,
+  - the request rate stayed within `--rpm` (after the bucket's initial burst).
+"""
+import argparse
+import asyncio
+import time
+
+from llm_stub_server import StubLLMServer
+from services.llm_client import AsyncLLMClient
+
+
+async def burst(client: AsyncLLMClient, n_requests: int, n_distinct: int):
+    async def one(i: int):
+        messages = [{"role": "user", "content": f"report {i % n_distinct}"}]
+        return await client.chat("stub-model", messages, max_tokens=50)
+    return await asyncio.gather(*(one(i) for i in range(n_requests)), return_exceptions=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=60)
+    parser.add_argument("--distinct", type=int, default=40)
+    parser.add_argument("--rpm", type=float, default=600)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.2)
+    parser.add_argument("--latency-ms", type=float, default=100)
+    args = parser.parse_args()
+
+    server = StubLLMServer(latency_ms=args.latency_ms, rate_limit_rate=args.rate_limit_rate,
+                           retry_after_seconds=0.05, seed=0).start()
+
+    async def run():
+        client = AsyncLLMClient(base_url=server.base_url, requests_per_minute=args.rpm,
+                                max_concurrency=args.concurrency, max_retries=6, base_delay=0.05)
+        # Start with one second's worth banked so the limiter is visible in a short run
+        client._requests.tokens = args.rpm / 60
+        start = time.perf_counter()
+        results = await burst(client, args.requests, args.distinct)
+        return client, results, time.perf_counter() - start
+
+    client, results, elapsed = asyncio.run(run())
+    server.shutdown()
+
+    failures = [r for r in results if isinstance(r, Exception)]
+    ok = len(results) - len(failures)
+    stub = server.stats
+    print(f"{len(results)} requests ({args.distinct} distinct) in {elapsed:.2f}s: {ok} ok, {len(failures)} failed")
+    print(f"  client: {client.counters}")
+    print(f"  stub:   {stub}")
+    allowed = args.rpm / 60 * (1 + elapsed)
+    checks = {
+        "all requests succeeded": not failures,
+        "duplicates coalesced": client.counters["coalesced"] == args.requests - args.distinct,
+        "one HTTP call per prompt and attempt": stub["requests"] == args.distinct + client.counters["retries"],
+        f"peak concurrency <= {args.concurrency}": stub["peak_concurrency"] <= args.concurrency,
+        f"request rate within {args.rpm:g}/min": stub["requests"] <= allowed + 1,
+    }
+    for name, passed in checks.items():
+        print(f"  {'✓' if passed else '✗'} {name}")
+    if failures:
+        print(f"  first failure: {failures[0]!r}")
+    raise SystemExit(0 if all(checks.values()) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -14,4 +14,53 @@ UPLOAD_DIR = os.path.join(BASE_DIR, 'uploads')
 # Create the upload directory if it doesn't exist
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
-OPENAI_API_KEY = os.getenv('OPENAI_API_KEY', '')
\ No newline at end of file
+OPENAI_API_KEY = os.getenv('OPENAI_API_KEY', '')
+# Any OpenAI-compatible endpoint, e.g. the local stub (llm_stub_server.py); empty = api.openai.com
+OPENAI_BASE_URL = os.getenv('OPENAI_BASE_URL', '')
+
+# On-disk cache for OCR output of scanned pages (keyed by page pixels + engine settings)
+OCR_CACHE_DIR = os.path.join(BASE_DIR, 'cache', 'ocr')
+OCR_CACHE_MAX_BYTES = int(os.getenv('OCR_CACHE_MAX_BYTES', 200 * 1024 * 1024))
+
+# Per-document limits of the sandboxed extraction worker (services/extraction/sandbox.py); 0 disables a limit
+EXTRACTION_TIMEOUT_SECONDS = float(os.getenv('EXTRACTION_TIMEOUT_SECONDS', 120))
+EXTRACTION_MAX_MEMORY_MB = int(os.getenv('EXTRACTION_MAX_MEMORY_MB', 2048))
+EXTRACTION_MAX_PAGES = int(os.getenv('EXTRACTION_MAX_PAGES', 50))
+
+# Persistent cache of LLM responses (services/llm_cache.py)
+LLM_CACHE_TTL_SECONDS = int(os.getenv('LLM_CACHE_TTL_SECONDS', 7 * 24 * 3600))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv('LLM_CACHE_MAX_ENTRIES', 5000))
+
+# Upper bound on tokens of the recommendation prompt (services/prompt_builder.py); 0 = unlimited
+PROMPT_TOKEN_BUDGET = int(os.getenv('PROMPT_TOKEN_BUDGET', 600))
+
+# Limits of the shared async LLM client (services/llm_client.py) – keep below the provider's quota
+LLM_REQUESTS_PER_MINUTE = float(os.getenv('LLM_REQUESTS_PER_MINUTE', 500))
+LLM_TOKENS_PER_MINUTE = float(os.getenv('LLM_TOKENS_PER_MINUTE', 200000))
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', 8))
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', 4))
+
+# Backend of the AI recommendation engine (services/llm_backends.py): openai, stub (llm_stub_server.py) or fake
+AI_BACKEND = os.getenv('AI_BACKEND', 'openai')
+LLM_STUB_URL = os.getenv('LLM_STUB_URL', 'http://127.0.0.1:8089/v1')
+# Set to 0 to always call the backend (e.g. load tests of identical reports)
+LLM_CACHE_ENABLED = os.getenv('LLM_CACHE_ENABLED', '1') != '0'
+# Answer well-understood reports from rules (services/rule_recommendations.py) instead of the LLM; 0 = always LLM
+RULE_FAST_PATH_ENABLED = os.getenv('RULE_FAST_PATH_ENABLED', '1') != '0'
+
+# Guard rails of the AI stage (services/circuit_breaker.py): the longest a pipeline waits for the LLM,
+# consecutive failures that open the breaker, and how long it stays open before a trial call
+AI_LATENCY_BUDGET_SECONDS = float(os.getenv('AI_LATENCY_BUDGET_SECONDS', 20))
+AI_BREAKER_FAILURE_THRESHOLD = int(os.getenv('AI_BREAKER_FAILURE_THRESHOLD', 5))
+AI_BREAKER_RESET_SECONDS = float(os.getenv('AI_BREAKER_RESET_SECONDS', 30))
+# Seconds between runs of the background sweeper that fills in 'pending_ai' reports; 0 = off
+PENDING_AI_SWEEP_SECONDS = float(os.getenv('PENDING_AI_SWEEP_SECONDS', 60))
+
+# Prices of LLM calls in USD per million (prompt, completion) tokens, for the cost columns of the
+# llm_calls telemetry (models/llm_call.py); unlisted models are recorded without a cost.
+# Batch API calls are billed at LLM_BATCH_PRICE_FACTOR of these prices.
+LLM_PRICES_PER_MILLION = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+}
+LLM_BATCH_PRICE_FACTOR = 0.5
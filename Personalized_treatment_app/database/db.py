@@ -7,6 +7,9 @@ from config import DATABASE_FILE # Ensure DATABASE_FILE is defined in your confi
 _conn = None
 _cursor = None
 
+# Bump when a migration is added to _MIGRATIONS (stored in PRAGMA user_version)
+SCHEMA_VERSION = 7
+
 def init_db():
     """
     Initializes the global database connection and creates tables if they don't exist.
@@ -26,11 +29,28 @@ def init_db():
         _conn.execute("PRAGMA foreign_keys = ON;") # Ensure foreign keys are enforced
 
         _cursor = _conn.cursor()
-        _create_tables()
+        _apply_migrations()
         print(f"Database connection established successfully at: {DATABASE_FILE}")
     else:
         print("Database connection already established.")
 
+def _apply_migrations():
+    """
+    Brings the schema up to SCHEMA_VERSION. An up-to-date database costs a
+    single PRAGMA read; DDL only runs for versions it has not seen yet.
+    """
+    global _conn
+    current = _conn.execute("PRAGMA user_version;").fetchone()[0]
+    if current >= SCHEMA_VERSION:
+        print(f"Database schema is up to date (version {current}).")
+        return
+    for version, migrate in _MIGRATIONS:
+        if version > current:
+            migrate()
+            _conn.execute(f"PRAGMA user_version = {int(version)};")
+            _conn.commit()
+            print(f"Database schema migrated to version {version}.")
+
 def _create_tables():
     """Private helper to create all necessary database tables."""
     global _cursor, _conn
@@ -152,6 +172,171 @@ def _create_tables():
     _conn.commit()
     print("All necessary tables checked/created.")
 
+def _create_pipeline_runs_table():
+    """v2: per-stage timings of the report processing pipeline (services/pipeline_tracing.py)."""
+    global _cursor
+    _cursor.execute('''
+        CREATE TABLE IF NOT EXISTS pipeline_runs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            run_id TEXT NOT NULL,       -- one pipeline invocation
+            report_id TEXT NOT NULL,
+            stage TEXT NOT NULL,        -- e.g. 'text_extraction', 'metric_parsing', 'ai_generation'
+            started_at TEXT NOT NULL,
+            duration_ms REAL,
+            status TEXT NOT NULL,       -- 'ok' or 'error'
+            input_bytes INTEGER,
+            pages INTEGER,
+            ocr_pages INTEGER,
+            details_json TEXT,          -- any other span attributes
+            FOREIGN KEY (report_id) REFERENCES health_reports (report_id) ON DELETE CASCADE
+        );
+    ''')
+    _cursor.execute("CREATE INDEX IF NOT EXISTS idx_pipeline_runs_report ON pipeline_runs (report_id);")
+    _cursor.execute("CREATE INDEX IF NOT EXISTS idx_pipeline_runs_stage ON pipeline_runs (stage, started_at);")
+    print("Table 'pipeline_runs' checked/created.")
+
+def _add_pipeline_checkpoint_columns():
+    """
+    v3: pipeline checkpoints on health_reports.
+    pipeline_stage is the first stage still to run ('extraction', 'allocation',
+    'ai_generation', 'recommendation' or 'completed'); ai_output_json keeps the
+    AI output so a retry doesn't call the model again.
+    """
+    global _cursor
+    columns = {row[1] for row in _cursor.execute("PRAGMA table_info(health_reports);")}
+    for column in ("pipeline_stage", "pipeline_stage_updated_at", "ai_output_json"):
+        if column not in columns:
+            _cursor.execute(f"ALTER TABLE health_reports ADD COLUMN {column} TEXT;")
+    # Derive the marker of existing reports from what they already have
+    _cursor.execute('''
+        UPDATE health_reports SET pipeline_stage = CASE
+            WHEN EXISTS (SELECT 1 FROM recommendations r WHERE r.report_id = health_reports.report_id) THEN 'completed'
+            WHEN processing_status IN ('extracted', 'pending_manual_assignment') AND assigned_doctor_id IS NOT NULL THEN 'ai_generation'
+            WHEN processing_status IN ('extracted', 'pending_manual_assignment') THEN 'allocation'
+            ELSE 'extraction'
+        END
+        WHERE pipeline_stage IS NULL;
+    ''')
+    _cursor.execute("CREATE INDEX IF NOT EXISTS idx_health_reports_pipeline_stage ON health_reports (pipeline_stage);")
+    print("Pipeline checkpoint columns added to 'health_reports'.")
+
+def _create_metric_observations_table():
+    """
+    v4: one row per extracted metric value – numeric value, unit and flag stored
+    separately (models/metric_observation.py), seeded from existing extractions.
+    """
+    global _cursor
+    import json
+    from utils.flagging import flag_code
+    _cursor.execute('''
+        CREATE TABLE IF NOT EXISTS metric_observations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            report_id TEXT NOT NULL,
+            metric TEXT NOT NULL,       -- canonical name from utils/metrics.py
+            value REAL NOT NULL,
+            unit TEXT,
+            flag TEXT NOT NULL,         -- 'normal', 'low', 'high' or 'no_ref'
+            UNIQUE (report_id, metric),
+            FOREIGN KEY (report_id) REFERENCES health_reports (report_id) ON DELETE CASCADE
+        );
+    ''')
+    _cursor.execute("CREATE INDEX IF NOT EXISTS idx_metric_observations_metric ON metric_observations (metric);")
+
+    rows = []
+    for report_id, extracted_json in _cursor.execute(
+            "SELECT report_id, extracted_data_json FROM health_reports").fetchall():
+        try:
+            extracted = json.loads(extracted_json or "{}")
+        except json.JSONDecodeError:
+            continue
+        values = extracted.get("metric_values")
+        if values is None:
+            # Older extractions only kept display strings such as "7.5 ⚠️"
+            values = {}
+            for metric, flagged in (extracted.get("metrics") or {}).items():
+                try:
+                    values[metric] = float(str(flagged[0]).split()[0])
+                except (ValueError, IndexError, TypeError):
+                    values[metric] = None
+        units = extracted.get("metric_units") or {}
+        rows.extend((report_id, metric, value, units.get(metric), flag_code(metric, value))
+                    for metric, value in values.items() if value is not None)
+    _cursor.executemany(
+        "INSERT OR IGNORE INTO metric_observations (report_id, metric, value, unit, flag) VALUES (?, ?, ?, ?, ?)",
+        rows,
+    )
+    print(f"Table 'metric_observations' checked/created ({len(rows)} observations seeded).")
+
+def _create_llm_cache_tables():
+    """v5: persistent LLM response cache and its counters (services/llm_cache.py)."""
+    global _cursor
+    _cursor.execute('''
+        CREATE TABLE IF NOT EXISTS llm_cache (
+            cache_key TEXT PRIMARY KEY,     -- sha256 of model, temperature and the canonical prompt
+            model TEXT NOT NULL,
+            temperature REAL NOT NULL,
+            response_json TEXT NOT NULL,
+            total_tokens INTEGER,           -- tokens the original call used
+            latency_ms REAL,                -- how long the original call took
+            created_at TEXT NOT NULL,       -- TTL is measured from here
+            last_accessed_at TEXT NOT NULL, -- LRU eviction order
+            hit_count INTEGER NOT NULL DEFAULT 0
+        );
+    ''')
+    _cursor.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_accessed ON llm_cache (last_accessed_at);")
+    _cursor.execute('''
+        CREATE TABLE IF NOT EXISTS llm_cache_stats (
+            name TEXT PRIMARY KEY,          -- 'hits', 'misses', 'bypasses', 'latency_saved_ms', 'tokens_saved'
+            value REAL NOT NULL DEFAULT 0
+        );
+    ''')
+    print("Tables 'llm_cache' and 'llm_cache_stats' checked/created.")
+
+def _create_llm_calls_table():
+    """v6: one row per LLM recommendation request – tokens, latency, cost, cache status (models/llm_call.py)."""
+    global _cursor
+    _cursor.execute('''
+        CREATE TABLE IF NOT EXISTS llm_calls (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            report_id TEXT,             -- NULL when the caller didn't name a report
+            called_at TEXT NOT NULL,
+            mode TEXT NOT NULL,         -- 'sync', 'stream' or 'batch'
+            model TEXT NOT NULL,
+            backend TEXT,               -- AI_BACKEND, e.g. 'openai'
+            status TEXT NOT NULL,       -- 'ok', 'invalid', 'error', 'timeout', 'abandoned' or 'breaker_open'
+            cache_status TEXT,          -- 'hit', 'miss', 'bypass', 'coalesced' or NULL (cache off)
+            prompt_tokens INTEGER,
+            completion_tokens INTEGER,
+            latency_ms REAL,            -- including rate-limit waits and retries
+            first_token_ms REAL,        -- streamed calls only
+            retries INTEGER NOT NULL DEFAULT 0,
+            cost_usd REAL,              -- at LLM_PRICES_PER_MILLION when the call was made
+            request_id TEXT UNIQUE,     -- batch result id, so re-ingesting a result file isn't counted twice
+            FOREIGN KEY (report_id) REFERENCES health_reports (report_id) ON DELETE CASCADE
+        );
+    ''')
+    _cursor.execute("CREATE INDEX IF NOT EXISTS idx_llm_calls_called_at ON llm_calls (called_at);")
+    _cursor.execute("CREATE INDEX IF NOT EXISTS idx_llm_calls_report ON llm_calls (report_id);")
+    print("Table 'llm_calls' checked/created.")
+
+def _add_doctor_workload_indexes():
+    """v7: indexes behind the per-doctor pending-review count used by allocation (models/doctor.py)."""
+    global _cursor
+    _cursor.execute("CREATE INDEX IF NOT EXISTS idx_health_reports_assigned_doctor ON health_reports (assigned_doctor_id);")
+    _cursor.execute("CREATE INDEX IF NOT EXISTS idx_recommendations_report ON recommendations (report_id);")
+    print("Doctor workload indexes checked/created.")
+
+# (version, migration) pairs, applied in order by _apply_migrations()
+_MIGRATIONS = [
+    (1, _create_tables),
+    (2, _create_pipeline_runs_table),
+    (3, _add_pipeline_checkpoint_columns),
+    (4, _create_metric_observations_table),
+    (5, _create_llm_cache_tables),
+    (6, _create_llm_calls_table),
+    (7, _add_doctor_workload_indexes),
+]
+
 def get_db_connection():
     """Returns the current persistent database connection object."""
     global _conn
@@ -1,5 +1,6 @@
 # database/db_utils.py
 import sqlite3
+import threading
 # Import all necessary functions/globals from your db.py
 from database.db import init_db, get_db_connection, get_db_cursor, close_db_connection
 
@@ -7,47 +8,126 @@ class DBManager:
     # No need for init_db or _ensure_db_initialized here.
     # init_db() is called directly from main_app.py
 
+    # All queries share one connection and cursor; pipeline stages may run on
+    # worker threads (services/stage_graph.py), so execute+fetch is serialised.
+    _lock = threading.RLock()
+
     @classmethod
     def execute_query(cls, query: str, params=()):
         """Executes a SQL query with optional parameters."""
-        try:
+        with cls._lock:
+            try:
+                conn = get_db_connection()
+                cursor = get_db_cursor()
+                cursor.execute(query, params)
+                conn.commit()
+                return True
+            except sqlite3.Error as e:
+                print(f"Database error executing query: {query} with params {params}. Error: {e}")
+                return False
+
+    @classmethod
+    def execute_many(cls, query: str, seq_of_params):
+        """Executes a SQL statement for every parameter tuple in a single transaction."""
+        with cls._lock:
+            try:
+                conn = get_db_connection()
+                cursor = get_db_cursor()
+                cursor.executemany(query, seq_of_params)
+                conn.commit()
+                return True
+            except sqlite3.Error as e:
+                get_db_connection().rollback()
+                print(f"Database error executing many: {query}. Error: {e}")
+                return False
+
+    @classmethod
+    def execute_transaction(cls, statements):
+        """
+        Runs several statements in one transaction: `statements` is a list of
+        (query, seq_of_params) pairs, each executed for every parameter tuple.
+        Either all of them are committed or, on any error, none.
+        """
+        with cls._lock:
             conn = get_db_connection()
-            cursor = get_db_cursor()
-            cursor.execute(query, params)
-            conn.commit()
-            return True
-        except sqlite3.Error as e:
-            print(f"Database error executing query: {query} with params {params}. Error: {e}")
-            return False
+            try:
+                cursor = get_db_cursor()
+                for query, seq_of_params in statements:
+                    cursor.executemany(query, seq_of_params)
+                conn.commit()
+                return True
+            except sqlite3.Error as e:
+                conn.rollback()
+                print(f"Database error executing transaction of {len(statements)} statement(s). Error: {e}")
+                return False
+
+    @classmethod
+    def run_in_transaction(cls, work):
+        """
+        Runs `work(cursor)` – reads and writes – in one BEGIN IMMEDIATE transaction.
+        SQLite's write lock is taken up front, so what `work` reads can't be changed
+        by another connection (e.g. another app process) before its writes commit.
+        Returns the result of `work`, or None if it raised a database error (rolled back).
+        """
+        with cls._lock:
+            conn = get_db_connection()
+            try:
+                cursor = get_db_cursor()
+                cursor.execute("BEGIN IMMEDIATE")
+                result = work(cursor)
+                conn.commit()
+                return result
+            except sqlite3.Error as e:
+                if conn.in_transaction:
+                    conn.rollback()
+                print(f"Database error in transaction. Error: {e}")
+                return None
+            except Exception:
+                if conn.in_transaction:
+                    conn.rollback()
+                raise
 
     @classmethod
     def fetch_one(cls, query: str, params=()):
         """Fetches a single row from the database, returned as a dictionary (due to row_factory)."""
-        try:
-            cursor = get_db_cursor()
-            cursor.execute(query, params)
-            row = cursor.fetchone()
-            if row:
-                return dict(row)
-            return None
-        except sqlite3.Error as e:
-            print(f"Database error fetching one row: {query} with params {params}. Error: {e}")
-            return None
+        with cls._lock:
+            try:
+                cursor = get_db_cursor()
+                cursor.execute(query, params)
+                row = cursor.fetchone()
+                if row:
+                    return dict(row)
+                return None
+            except sqlite3.Error as e:
+                print(f"Database error fetching one row: {query} with params {params}. Error: {e}")
+                return None
 
     @classmethod
     def fetch_all(cls, query: str, params=()):
         """Fetches all rows from the database, returned as a list of dictionaries."""
-        try:
-            cursor = get_db_cursor()
-            cursor.execute(query, params)
-            rows = cursor.fetchall()
-            if rows:
-                return [dict(row) for row in rows]
-            return []
-        except sqlite3.Error as e:
-            print(f"Database error fetching all rows: {query} with params {params}. Error: {e}")
-            return []
+        with cls._lock:
+            try:
+                cursor = get_db_cursor()
+                cursor.execute(query, params)
+                rows = cursor.fetchall()
+                if rows:
+                    return [dict(row) for row in rows]
+                return []
+            except sqlite3.Error as e:
+                print(f"Database error fetching all rows: {query} with params {params}. Error: {e}")
+                return []
     
+    @classmethod
+    def fetch_frame(cls, query: str, params=()):
+        """Fetches a result set as a pandas DataFrame (for bulk/vectorised work over many rows)."""
+        import pandas as pd # Lazy import: only batch jobs need pandas
+        with cls._lock:
+            try:
+                return pd.read_sql_query(query, get_db_connection(), params=params)
+            except Exception as e:
+                print(f"Database error fetching frame: {query} with params {params}. Error: {e}")
+                return pd.DataFrame()
+
     @classmethod
     def close_connection(cls):
         """Closes the database connection."""
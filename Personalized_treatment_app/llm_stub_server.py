@@ -0,0 +1,222 @@
+# llm_stub_server.py
+"""
+Local OpenAI-compatible stub for exercising the LLM client without a real API.
+
+    python llm_stub_server.py [--port 8089] [--latency-ms 300] [--latency-dist lognormal]
+                              [--rate-limit-rate 0.1] [--error-rate 0.02] [--hang-rate 0.01]
+    AI_BACKEND=stub streamlit run main_app.py
+
+POST /v1/chat/completions answers with a well-formed recommendation JSON
+after a random delay, drawn around `latency_ms` from one of
+
+    constant   – exactly latency_ms
+    uniform    – 0.5x to 1.5x latency_ms
+    lognormal  – median latency_ms with a long right tail (`latency_sigma`)
+
+Failures are injected at the given rates: a 429 with Retry-After, a 500, or
+a hang of `hang_seconds` (longer than the client's timeout) before a 500.
+Requests with "stream": true get the answer as server-sent events: the
+first after the drawn delay, then one every `stream_interval` seconds.
+The server counts requests, each kind of failure and the peak number of
+requests it was serving at once (GET /stats).
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+LATENCY_DISTRIBUTIONS = ("constant", "uniform", "lognormal")
+
+# Streamed answers ("stream": true) are sent this many characters per event
+_STREAM_PIECE = 8
+
+_RECOMMENDATION = {
+    "treatment_suggestions": "Stub suggestion: review the out-of-range results with the patient.",
+    "lifestyle_recommendations": "Stub advice: balanced diet, regular exercise, adequate sleep.",
+    "priority": "Medium",
+}
+
+
+class StubLLMServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port: int = 0, latency_ms: float = 300.0, rate_limit_rate: float = 0.0,
+                 retry_after_seconds: float = 0.2, seed: int = None, latency_distribution: str = "uniform",
+                 latency_sigma: float = 0.5, error_rate: float = 0.0, hang_rate: float = 0.0,
+                 hang_seconds: float = 90.0, stream_interval: float = 0.02):
+        if latency_distribution not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"Unknown latency distribution '{latency_distribution}'")
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.latency_ms = latency_ms
+        self.latency_distribution = latency_distribution
+        self.latency_sigma = latency_sigma
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after_seconds = retry_after_seconds
+        self.error_rate = error_rate
+        self.hang_rate = hang_rate
+        self.hang_seconds = hang_seconds
+        self.stream_interval = stream_interval
+        self.random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._active = 0
+        self.stats = {"requests": 0, "rate_limited": 0, "server_errors": 0, "hangs": 0,
+                      "completed": 0, "peak_concurrency": 0}
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_port}/v1"
+
+    def start(self) -> "StubLLMServer":
+        """Serves on a background thread (for use inside scripts)."""
+        threading.Thread(target=self.serve_forever, name="llm-stub", daemon=True).start()
+        return self
+
+    def enter(self) -> str:
+        """Counts a request and picks its outcome: "ok", "rate_limited", "server_error" or "hang"."""
+        with self._lock:
+            self.stats["requests"] += 1
+            draw = self.random.random()
+            if draw < self.rate_limit_rate:
+                self.stats["rate_limited"] += 1
+                return "rate_limited"
+            self._active += 1
+            self.stats["peak_concurrency"] = max(self.stats["peak_concurrency"], self._active)
+            draw -= self.rate_limit_rate
+            if draw < self.error_rate:
+                self.stats["server_errors"] += 1
+                return "server_error"
+            if draw - self.error_rate < self.hang_rate:
+                self.stats["hangs"] += 1
+                return "hang"
+            return "ok"
+
+    def leave(self):
+        with self._lock:
+            self._active -= 1
+            self.stats["completed"] += 1
+
+    def delay_seconds(self) -> float:
+        with self._lock:
+            if self.latency_distribution == "constant":
+                factor = 1.0
+            elif self.latency_distribution == "lognormal":
+                factor = self.random.lognormvariate(0.0, self.latency_sigma)  # median 1
+            else:
+                factor = self.random.uniform(0.5, 1.5)
+            return factor * self.latency_ms / 1000
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: StubLLMServer
+
+    def _send_json(self, status: int, payload: dict, headers: dict = None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/stats"):
+            self._send_json(200, self.server.stats)
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+        outcome = self.server.enter()
+        if outcome == "rate_limited":
+            self._send_json(429, {"error": {"message": "Rate limit reached (stub)", "type": "rate_limit"}},
+                            {"Retry-After": f"{self.server.retry_after_seconds:g}"})
+            return
+        try:
+            if outcome == "hang":
+                time.sleep(self.server.hang_seconds)  # the client normally gives up first
+            else:
+                time.sleep(self.server.delay_seconds())
+            if outcome != "ok":
+                self._send_json(500, {"error": {"message": "Internal error (stub)", "type": "server_error"}})
+                return
+            prompt_tokens = sum(len(m.get("content") or "") for m in request.get("messages", [])) // 4
+            content = json.dumps(_RECOMMENDATION)
+            completion_tokens = len(content) // 4
+            if request.get("stream"):
+                self._stream(request, content, prompt_tokens, completion_tokens)
+                return
+            self._send_json(200, {
+                "id": f"chatcmpl-stub-{self.server.stats['requests']}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request.get("model", "stub"),
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": content}}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                          "total_tokens": prompt_tokens + completion_tokens},
+            })
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client timed out and hung up
+        finally:
+            self.server.leave()
+
+    def _stream(self, request: dict, content: str, prompt_tokens: int, completion_tokens: int):
+        """Server-sent events in the OpenAI format: the content a few characters at a time, then [DONE]."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        base = {"id": f"chatcmpl-stub-{self.server.stats['requests']}", "object": "chat.completion.chunk",
+                "created": int(time.time()), "model": request.get("model", "stub")}
+
+        def send(choices: list, usage: dict = None):
+            event = dict(base, choices=choices)
+            if usage:
+                event["usage"] = usage
+            self.wfile.write(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        send([{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}])
+        for i in range(0, len(content), _STREAM_PIECE):
+            send([{"index": 0, "delta": {"content": content[i:i + _STREAM_PIECE]}, "finish_reason": None}])
+            time.sleep(self.server.stream_interval)
+        send([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+        if (request.get("stream_options") or {}).get("include_usage"):
+            send([], {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens})
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+    def log_message(self, format, *args):
+        pass  # keep benchmark output readable
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=300.0)
+    parser.add_argument("--latency-dist", choices=LATENCY_DISTRIBUTIONS, default="uniform")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="spread of the lognormal distribution")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share of requests answered with 429")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with 500")
+    parser.add_argument("--hang-rate", type=float, default=0.0, help="share of requests that hang")
+    parser.add_argument("--hang-seconds", type=float, default=90.0)
+    args = parser.parse_args()
+    server = StubLLMServer(args.port, args.latency_ms, args.rate_limit_rate,
+                           latency_distribution=args.latency_dist, latency_sigma=args.latency_sigma,
+                           error_rate=args.error_rate, hang_rate=args.hang_rate, hang_seconds=args.hang_seconds)
+    print(f"Stub LLM server on {server.base_url} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
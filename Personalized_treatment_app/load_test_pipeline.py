@@ -0,0 +1,199 @@
+# load_test_pipeline.py
+"""
+Load-test process_report_pipeline end to end against an offline LLM backend.
+
+    python load_test_pipeline.py [--reports 50] [--concurrency 8] [--backend stub|fake]
+                                 [--latency-ms 800] [--latency-dist lognormal]
+                                 [--rate-limit-rate 0.05] [--error-rate 0.02] [--reuse-extraction]
+
+Works on a copy of the database: clones `--reports` reports from a stored
+report whose file is still on disk, runs the full pipeline for all of them on
+`--concurrency` threads (as concurrent uploads would) and prints throughput,
+p50/p95/p99 pipeline latency and the per-stage breakdown from pipeline_runs.
+
+--backend stub starts llm_stub_server.py in-process (or uses --base-url);
+--backend fake uses the deterministic in-process fake. The LLM response cache
+is off and identical requests aren't coalesced, so every report pays for its
+own LLM call. --reuse-extraction copies the source report's extraction into
+the clones, so the run starts at allocation and measures the AI path alone.
+
+--ai-budget / --breaker-reset override the AI stage's latency budget and
+circuit breaker; reports the LLM couldn't answer in time end up 'pending_ai'.
+--sweep then makes the stub healthy again and runs the pending-AI sweeper
+until they are filled in.
+"""
+import argparse
+import math
+import ntpath
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
+from datetime import datetime, timezone
+
+from llm_stub_server import LATENCY_DISTRIBUTIONS, StubLLMServer
+
+
+def _percentile(sorted_values: list, pct: float) -> float:
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def _local_file(file_path: str) -> str:
+    """The report's file on this machine (stored paths may come from another OS), or None."""
+    from config import UPLOAD_DIR
+    for candidate in (file_path, os.path.join(UPLOAD_DIR, ntpath.basename(file_path or ""))):
+        if candidate and os.path.isfile(candidate):
+            return candidate
+    return None
+
+
+def clone_reports(n_reports: int, source_id: str = None, reuse_extraction: bool = False) -> list:
+    """Inserts `n_reports` copies of a stored report whose file exists; returns their ids."""
+    from database.db_utils import DBManager
+    from models.health_report import HealthReport
+    rows = DBManager.fetch_all("SELECT * FROM health_reports ORDER BY upload_date DESC")
+    sources = [r for r in rows if _local_file(r["file_path"])
+               and (source_id is None or r["report_id"] == source_id)
+               and (not reuse_extraction or '"raw_text"' in (r["extracted_data_json"] or ""))]
+    if not sources:
+        raise SystemExit("No stored report with its file on disk to clone.")
+    source = sources[0]
+
+    report_ids = []
+    for _ in range(n_reports):
+        clone = HealthReport(patient_id=source["patient_id"], uploaded_by=source["uploaded_by"],
+                             report_type=source["report_type"], file_type=source["file_type"],
+                             file_name=source["file_name"], file_path=_local_file(source["file_path"]),
+                             extracted_data_json=source["extracted_data_json"] if reuse_extraction else None,
+                             processing_status="extracted" if reuse_extraction else "uploaded",
+                             pipeline_stage="allocation" if reuse_extraction else None)
+        if not clone.save():
+            raise SystemExit("Failed to insert a cloned report.")
+        report_ids.append(clone.report_id)
+    return report_ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--reports", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--backend", choices=("stub", "fake"), default="stub")
+    parser.add_argument("--base-url", default=None, help="an already running stub (default: start one)")
+    parser.add_argument("--latency-ms", type=float, default=800.0)
+    parser.add_argument("--latency-dist", choices=LATENCY_DISTRIBUTIONS, default="lognormal")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--hang-rate", type=float, default=0.0)
+    parser.add_argument("--llm-timeout", type=float, default=10.0, help="per-attempt timeout of the LLM client")
+    parser.add_argument("--source-report", default=None, help="report_id to clone (default: most recent)")
+    parser.add_argument("--reuse-extraction", action="store_true")
+    parser.add_argument("--ai-budget", type=float, default=None, help="AI_LATENCY_BUDGET_SECONDS for this run")
+    parser.add_argument("--breaker-reset", type=float, default=None, help="AI_BREAKER_RESET_SECONDS for this run")
+    parser.add_argument("--sweep", action="store_true", help="afterwards, heal the stub and sweep 'pending_ai' reports")
+    parser.add_argument("--verbose", action="store_true", help="keep the pipeline's own output")
+    args = parser.parse_args()
+
+    # Configuration is read at import time, so set it before importing the app
+    os.environ["LLM_CACHE_ENABLED"] = "0"
+    if args.ai_budget is not None:
+        os.environ["AI_LATENCY_BUDGET_SECONDS"] = str(args.ai_budget)
+    if args.breaker_reset is not None:
+        os.environ["AI_BREAKER_RESET_SECONDS"] = str(args.breaker_reset)
+    import config
+    workdir = tempfile.mkdtemp(prefix="pta-loadtest-")
+    config.DATABASE_FILE = os.path.join(workdir, "healthcare.db")
+    shutil.copy(os.path.join(config.BASE_DIR, "healthcare.db"), config.DATABASE_FILE)
+
+    from database.db import init_db
+    from models.health_report import HealthReport
+    from models.pipeline_run import PipelineRun
+    from services import ai_recommendation_engine
+    from services.document_parser import DocumentParser
+    from services.llm_backends import create_backend
+
+    devnull = open(os.devnull, "w")
+    quiet = lambda: redirect_stdout(sys.stdout if args.verbose else devnull)
+    with quiet():
+        init_db()
+    server = None
+    if args.backend == "stub":
+        base_url = args.base_url
+        if not base_url:
+            server = StubLLMServer(latency_ms=args.latency_ms, latency_distribution=args.latency_dist,
+                                   rate_limit_rate=args.rate_limit_rate, error_rate=args.error_rate,
+                                   hang_rate=args.hang_rate, hang_seconds=args.llm_timeout * 3,
+                                   retry_after_seconds=0.2, seed=0).start()
+            base_url = server.base_url
+        backend = create_backend("stub", base_url=base_url, coalesce=False, timeout=args.llm_timeout)
+    else:
+        backend = create_backend("fake", latency_ms=args.latency_ms)
+    ai_recommendation_engine.set_backend(backend)
+
+    with quiet():
+        report_ids = clone_reports(args.reports, args.source_report, args.reuse_extraction)
+    started_at = datetime.now(timezone.utc).isoformat()  # pipeline_runs and llm_calls are stamped in UTC
+
+    def run_one(report_id: str):
+        start = time.perf_counter()
+        ok = DocumentParser.process_report_pipeline(report_id)
+        return ok, (time.perf_counter() - start) * 1000
+
+    print(f"{args.reports} reports, {args.concurrency} workers, '{args.backend}' backend "
+          f"({args.latency_dist if args.backend == 'stub' else 'fixed'} {args.latency_ms:g} ms) – database copy in {workdir}")
+    start = time.perf_counter()
+    with quiet(), ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(run_one, report_ids))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(ms for _, ms in results)
+    failed = sum(1 for ok, _ in results if not ok)
+    print(f"\n{len(results)} pipelines in {elapsed:.2f}s: {len(results) / elapsed:.2f} reports/s, {failed} failed")
+    print(f"  latency ms: p50 {_percentile(latencies, 50):.0f}  p95 {_percentile(latencies, 95):.0f}  "
+          f"p99 {_percentile(latencies, 99):.0f}  max {latencies[-1]:.0f}")
+    sources = PipelineRun.recommendation_source_summary(since=started_at)
+    share = sources["fast_path_share"]
+    print(f"  answered from rules: {sources['rules']}, by the LLM: {sources['llm']}"
+          + ("" if share is None else f" ({share:.0%} fast path)"))
+    print(f"  backend: {backend.counters}")
+    if server:
+        print(f"  stub:    {server.stats}")
+    breaker = ai_recommendation_engine.breaker
+    with quiet():
+        pending = len(HealthReport.find_by_status("pending_ai"))
+    print(f"  pending_ai: {pending}, circuit breaker {breaker.state} {breaker.counters}")
+
+    if args.sweep and pending:
+        if server:
+            server.latency_ms, server.error_rate, server.hang_rate, server.rate_limit_rate = 100.0, 0.0, 0.0, 0.0
+        sweep_start = time.perf_counter()
+        while pending:
+            time.sleep(breaker.seconds_until_retry())
+            with quiet():
+                result = DocumentParser.sweep_pending_ai()
+            pending = result["still_pending"] + result["deferred"]
+            print(f"  sweep: {result}")
+        print(f"  all pending reports filled in after {time.perf_counter() - sweep_start:.1f}s")
+    if server:
+        server.shutdown()
+
+    print(f"\n{'stage':<26} {'count':>6} {'errors':>6} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}")
+    for row in PipelineRun.stage_latency_summary(since=started_at):
+        print(f"{row['stage']:<26} {row['count']:>6} {row['errors']:>6} {row['p50_ms'] or 0:>8.0f} "
+              f"{row['p95_ms'] or 0:>8.0f} {row['max_ms'] or 0:>8.0f}")
+
+    from models.llm_call import LLMCall
+    for row in LLMCall.latency_summary(since=started_at):
+        print(f"\nLLM calls ({row['mode']}): {row['requests']} requests, {row['cache_hits']} cache hits, "
+              f"{row['model_calls']} model calls, {row['failures']} failed, {row['retries']} retries; "
+              f"p50 {row['p50_ms'] or 0:.0f} ms, p95 {row['p95_ms'] or 0:.0f} ms")
+    for row in LLMCall.daily_usage(since=started_at):
+        print(f"  {row['day']}: {row['prompt_tokens']:,} prompt + {row['completion_tokens']:,} completion tokens, "
+              f"${row['cost_usd']:.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,32 @@
 # main_app.py
+import importlib
 import streamlit as st
 from database.db import init_db
-from pages import home, signup, login, patient_dashboard, doctor_dashboard, view_report, view_patient_recommendation, doctor_patient_profile_view, view_patient_reports_for_doctor,doctor_review_interface, doctor_reviewed_recommendations_view
 from services.db_initializer import initialize_app  
+
+def load_page(name: str):
+    """
+    Imports a page module on first use. Pages pull in pandas, python-docx, PIL
+    and the extraction/AI services, so only the page being shown is imported.
+    """
+    return importlib.import_module(f"pages.{name}")
+
 # --- Global App Setup ---
 st.set_page_config(page_title="Personalized Treatment Plans", layout="centered", initial_sidebar_state="collapsed")
 
-# Initialize the database connection and create tables once at the very start of the app
-# This will also create the 'data' directory and 'healthcare_app.db' if they don't exist.
-init_db()
-initialize_app()
+# Initialize the database connection, run schema migrations and seed data once per process.
+# Streamlit re-executes this script on every interaction; st.cache_resource makes sure
+# reruns reuse the result instead of bootstrapping (and querying) again.
+@st.cache_resource(show_spinner=False)
+def bootstrap_app() -> bool:
+    from services import pending_ai_sweeper
+    init_db()
+    initialize_app()
+    # Fills in recommendations the LLM couldn't produce at upload time
+    pending_ai_sweeper.start()
+    return True
+
+bootstrap_app()
 # --- Session State Management for Navigation and Authentication ---
 if 'page' not in st.session_state:
     st.session_state.page = "home"
@@ -24,35 +41,39 @@ if 'user_type' not in st.session_state:
 if st.session_state.logged_in:
     if st.session_state.user_type == 'patient':
        if st.session_state.page == "view_report":
-            view_report.show_page()
+            load_page("view_report").show_page()
        elif st.session_state.page == "view_patient_recommendation":
-            view_patient_recommendation.show_page()
+            load_page("view_patient_recommendation").show_page()
        else:
-            patient_dashboard.show_page()
+            load_page("patient_dashboard").show_page()
 
     elif st.session_state.user_type == 'doctor':
         if st.session_state.page == "doctor_dashboard":
-            doctor_dashboard.show_page()
+            load_page("doctor_dashboard").show_page()
         elif st.session_state.page == "doctor_patient_profile_view":
-            doctor_patient_profile_view.show_page()
+            load_page("doctor_patient_profile_view").show_page()
         elif st.session_state.page == "view_patient_reports_for_doctor":
-            view_patient_reports_for_doctor.show_page()
+            load_page("view_patient_reports_for_doctor").show_page()
         elif st.session_state.page == "doctor_review_interface":
-            doctor_review_interface.show_page()
+            load_page("doctor_review_interface").show_page()
         elif st.session_state.page == "doctor_reviewed_recommendations_view":
-            doctor_reviewed_recommendations_view.show_page()
+            load_page("doctor_reviewed_recommendations_view").show_page()
         elif st.session_state.page == "view":
             # This page might be reused by doctors to view final recommendations
-            view_patient_recommendation.show_page()
+            load_page("view_patient_recommendation").show_page()
         else: # Default for doctor if an unexpected page state occurs
-            doctor_dashboard.show_page()
+            load_page("doctor_dashboard").show_page()
+
+    elif st.session_state.user_type == 'admin':
+        # Operator views; pipeline_metrics is the admin landing page for now
+        load_page("pipeline_metrics").show_page()
 else:
     if st.session_state.page == "home":
-        home.show_page()
+        load_page("home").show_page()
     elif st.session_state.page == "signup":
-        signup.app(navigate_to=lambda page: st.session_state.update(page=page))
+        load_page("signup").app(navigate_to=lambda page: st.session_state.update(page=page))
     elif st.session_state.page == "login":
-        login.show_page()
+        load_page("login").show_page()
     # Default to home if somehow an invalid page state
     else:
-        home.show_page()
\ No newline at end of file
+        load_page("home").show_page()
\ No newline at end of file
@@ -1,7 +1,24 @@
 # models/doctor.py
 import uuid
+import datetime
 from database.db_utils import DBManager
 
+# Per-doctor count of assigned reports still awaiting review: no recommendation yet
+# (AI generation still running) or one the doctor hasn't acted on. Counting reports
+# rather than recommendations makes a claim count as soon as it is made.
+_WORKLOAD_QUERY = """
+    SELECT d.*, COUNT(hr.report_id) AS pending_reviews
+    FROM doctors d
+    LEFT JOIN health_reports hr
+        ON hr.assigned_doctor_id = d.doctor_id
+        AND NOT EXISTS (SELECT 1 FROM recommendations r
+                        WHERE r.report_id = hr.report_id
+                        AND r.status NOT IN ('AI_generated', 'pending_doctor_review'))
+    WHERE d.specialization = ? AND d.is_available = 1
+    GROUP BY d.doctor_id
+    ORDER BY pending_reviews ASC, d.last_assignment_date ASC NULLS FIRST, d.doctor_id ASC
+"""
+
     
 class Doctor:
     def __init__(self, doctor_id: str, user_id: str, medical_license_number: str = None, specialization: str = None, contact_number: str = None, hospital_affiliation: str = None, is_available: int = 1, last_assignment_date: str = None):
@@ -87,6 +104,55 @@ class Doctor:
             return [cls(**data) for data in doctors_data]
         return []
 
+    @classmethod
+    def get_workload_by_specialization(cls, specialization: str) -> list[tuple['Doctor', int]]:
+        """Available doctors of a specialization with their pending reviews, least loaded first."""
+        rows = DBManager.fetch_all(_WORKLOAD_QUERY, (specialization,))
+        return [(cls(**{k: v for k, v in row.items() if k != 'pending_reviews'}), row['pending_reviews'])
+                for row in rows]
+
+    @classmethod
+    def claim_for_report(cls, report_id: str, specialization: str) -> 'Doctor':
+        """
+        Assigns the report to the available doctor of `specialization` with the fewest
+        pending reviews, in one transaction: picking the doctor, setting the report's
+        assigned_doctor_id, the doctor's last_assignment_date and an active
+        patient-doctor mapping. Concurrent claims (threads or other processes) queue
+        on the write lock, so each sees the workload including the previous claims.
+        Returns the assigned doctor – the existing one if the report already had a
+        doctor – or None if no doctor is available (or on a database error).
+        """
+        def claim(cursor):
+            report = cursor.execute("SELECT patient_id, assigned_doctor_id FROM health_reports WHERE report_id = ?",
+                                    (report_id,)).fetchone()
+            if report is None:
+                return None
+            if report['assigned_doctor_id']:
+                existing = cursor.execute("SELECT * FROM doctors WHERE doctor_id = ?",
+                                          (report['assigned_doctor_id'],)).fetchone()
+                return cls(**dict(existing)) if existing else None
+            row = cursor.execute(_WORKLOAD_QUERY + " LIMIT 1", (specialization,)).fetchone()
+            if row is None:
+                return None
+            doctor = cls(**{k: row[k] for k in row.keys() if k != 'pending_reviews'})
+            now = datetime.datetime.now(datetime.timezone.utc).isoformat()
+            cursor.execute("UPDATE health_reports SET assigned_doctor_id = ? WHERE report_id = ?",
+                           (doctor.doctor_id, report_id))
+            cursor.execute("UPDATE doctors SET last_assignment_date = ? WHERE doctor_id = ?", (now, doctor.doctor_id))
+            cursor.execute("""
+                INSERT INTO patient_doctor_mapping (mapping_id, patient_id, doctor_id, assigned_date, is_active)
+                SELECT ?, ?, ?, ?, 1
+                WHERE NOT EXISTS (SELECT 1 FROM patient_doctor_mapping
+                                  WHERE patient_id = ? AND doctor_id = ? AND is_active = 1)
+            """, (str(uuid.uuid4()), report['patient_id'], doctor.doctor_id, now,
+                  report['patient_id'], doctor.doctor_id))
+            doctor.last_assignment_date = now
+            print(f"Doctor: Report {report_id} claimed by doctor {doctor.doctor_id} "
+                  f"({row['pending_reviews']} pending review(s) before).")
+            return doctor
+
+        return DBManager.run_in_transaction(claim)
+
     def update(self) -> bool:
         """Updates an existing doctor's record."""
         query = """
@@ -9,10 +9,15 @@ import os
 from config import UPLOAD_DIR  # Ensure this is imported to use the upload directory path
 
 
+# Pipeline stages in run order; pipeline_stage holds the first one not yet done (or 'completed')
+PIPELINE_STAGES = ("extraction", "allocation", "ai_generation", "recommendation")
+
+
 class HealthReport:
     def __init__(self, report_id=None, patient_id=None, uploaded_by=None, report_type=None,file_type=None,
                  upload_date=None, file_name=None, file_path=None, extracted_data_json=None,
-                 processing_status=None, assigned_doctor_id: str = None):
+                 processing_status=None, assigned_doctor_id: str = None, pipeline_stage: str = None,
+                 pipeline_stage_updated_at: str = None, ai_output_json: str = None):
         self.report_id = report_id if report_id else str(uuid.uuid4())
         self.patient_id = patient_id
         self.uploaded_by = uploaded_by # user_id of who uploaded
@@ -34,6 +39,12 @@ class HealthReport:
         self.processing_status = processing_status
         self.assigned_doctor_id = assigned_doctor_id  # ID of the doctor assigned to this report
 
+        # Pipeline checkpoint; only written through update_pipeline_stage() / save_ai_output(),
+        # never by save()/update(), so concurrent stages can't overwrite each other's output.
+        self.pipeline_stage = pipeline_stage
+        self.pipeline_stage_updated_at = pipeline_stage_updated_at
+        self.ai_output_json = ai_output_json
+
     def save(self) -> bool:
         """Saves a new health report or updates an existing one in the database."""
         if not self.report_id:
@@ -55,11 +66,16 @@ class HealthReport:
             else: # Insert new report
                 query = """
                     INSERT INTO health_reports (report_id, patient_id, uploaded_by, report_type,
-                                                upload_date, file_name, file_type, file_path, extracted_data_json, processing_status, assigned_doctor_id)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                                                upload_date, file_name, file_type, file_path, extracted_data_json, processing_status, assigned_doctor_id,
+                                                pipeline_stage, pipeline_stage_updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                 """
+                # Stamped at insert, so a report whose first run is still going isn't taken for a stuck one
+                self.pipeline_stage = self.pipeline_stage or "extraction"
+                self.pipeline_stage_updated_at = datetime.now().isoformat()
                 params = (self.report_id, self.patient_id, self.uploaded_by, self.report_type,
-                          self.upload_date, self.file_name, self.file_type, self.file_path, self.extracted_data_json, self.processing_status, self.assigned_doctor_id)
+                          self.upload_date, self.file_name, self.file_type, self.file_path, self.extracted_data_json, self.processing_status, self.assigned_doctor_id,
+                          self.pipeline_stage, self.pipeline_stage_updated_at)
                 
             print(f"Saving report to DB with report_id = {self.report_id}")
             print("SQL params:", params)
@@ -265,6 +281,61 @@ class HealthReport:
     def get_extracted_data(self) -> dict:
         """Returns the extracted data as a Python dictionary."""
         return json.loads(self.extracted_data_json) if self.extracted_data_json else {}
+
+    # ---- Pipeline checkpoints ----
+
+    def get_ai_output(self) -> dict:
+        """Returns the checkpointed AI output, or {} if AI generation hasn't completed."""
+        return json.loads(self.ai_output_json) if self.ai_output_json else {}
+
+    def save_ai_output(self, ai_output: dict) -> bool:
+        self.ai_output_json = json.dumps(ai_output)
+        query = "UPDATE health_reports SET ai_output_json = ? WHERE report_id = ?"
+        return DBManager.execute_query(query, (self.ai_output_json, self.report_id))
+
+    def next_pipeline_stage(self) -> str:
+        """First pipeline stage whose output isn't persisted yet, or 'completed'."""
+        if not self.get_extracted_data().get("raw_text"):
+            return "extraction"
+        if not self.assigned_doctor_id:
+            return "allocation"
+        has_recommendation = self.get_recommendation() is not None
+        if not self.ai_output_json and not has_recommendation:
+            return "ai_generation"
+        if not has_recommendation:
+            return "recommendation"
+        return "completed"
+
+    def update_pipeline_stage(self, stage: str) -> bool:
+        self.pipeline_stage = stage
+        self.pipeline_stage_updated_at = datetime.now().isoformat()
+        query = "UPDATE health_reports SET pipeline_stage = ?, pipeline_stage_updated_at = ? WHERE report_id = ?"
+        return DBManager.execute_query(query, (self.pipeline_stage, self.pipeline_stage_updated_at, self.report_id))
+
+    @staticmethod
+    def find_stuck_in_stage(stage: str, updated_before: str = None) -> list['HealthReport']:
+        """
+        Reports whose pipeline stopped at `stage`, optionally only those not touched since `updated_before`.
+        Reports from before the marker was stamped at upload fall back to their upload date.
+        """
+        query = "SELECT * FROM health_reports WHERE pipeline_stage = ?"
+        params = [stage]
+        if updated_before:
+            query += " AND COALESCE(pipeline_stage_updated_at, upload_date) < ?"
+            params.append(updated_before)
+        query += " ORDER BY upload_date ASC"
+        reports = []
+        for row in DBManager.fetch_all(query, tuple(params)):
+            row['extracted_data_json'] = json.loads(row['extracted_data_json']) if row['extracted_data_json'] else {}
+            reports.append(HealthReport(**row))
+        return reports
+
+    @staticmethod
+    def count_by_pipeline_stage() -> dict:
+        rows = DBManager.fetch_all(
+            "SELECT COALESCE(pipeline_stage, 'extraction') AS stage, COUNT(*) AS n FROM health_reports GROUP BY stage"
+        )
+        return {row['stage']: row['n'] for row in rows}
     
     def get_recommendation(self):
         from models.recommendation import Recommendation
@@ -283,5 +354,6 @@ class HealthReport:
             "file_path": self.file_path,
             "extracted_data_json": json.loads(self.extracted_data_json) if self.extracted_data_json else {},
             "processing_status": self.processing_status,
-            "assigned_doctor_id": self.assigned_doctor_id
+            "assigned_doctor_id": self.assigned_doctor_id,
+            "pipeline_stage": self.pipeline_stage
         }
\ No newline at end of file
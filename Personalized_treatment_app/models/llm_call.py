@@ -0,0 +1,141 @@
+# models/llm_call.py
+import datetime
+from config import LLM_PRICES_PER_MILLION, LLM_BATCH_PRICE_FACTOR
+from database.db_utils import DBManager
+from models.pipeline_run import PipelineRun
+
+
+class LLMCall:
+    """
+    Telemetry of one recommendation request to the LLM (services/ai_recommendation_engine.py,
+    services/llm_batch.py): tokens, latency, retries, cache status and cost.
+    Cache hits and calls refused by the circuit breaker are recorded too, without tokens.
+    """
+
+    _COLUMNS = ("report_id", "called_at", "mode", "model", "backend", "status", "cache_status",
+                "prompt_tokens", "completion_tokens", "latency_ms", "first_token_ms", "retries", "cost_usd",
+                "request_id")
+
+    def __init__(self, report_id: str = None, called_at: str = None, mode: str = 'sync', model: str = None,
+                 backend: str = None, status: str = 'ok', cache_status: str = None, prompt_tokens: int = None,
+                 completion_tokens: int = None, latency_ms: float = None, first_token_ms: float = None,
+                 retries: int = 0, cost_usd: float = None, request_id: str = None, id: int = None):
+        self.id = id
+        self.report_id = report_id
+        self.called_at = called_at or datetime.datetime.now(datetime.timezone.utc).isoformat()
+        self.mode = mode
+        self.model = model
+        self.backend = backend
+        self.status = status
+        self.cache_status = cache_status
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        self.latency_ms = latency_ms
+        self.first_token_ms = first_token_ms
+        self.retries = retries
+        self.cost_usd = cost_usd
+        self.request_id = request_id
+
+    @staticmethod
+    def cost_usd_for(model: str, prompt_tokens: int, completion_tokens: int, batch: bool = False) -> float:
+        """Cost at LLM_PRICES_PER_MILLION; None for an unpriced model or unknown usage."""
+        prices = LLM_PRICES_PER_MILLION.get(model)
+        if prices is None or (prompt_tokens is None and completion_tokens is None):
+            return None
+        cost = ((prompt_tokens or 0) * prices[0] + (completion_tokens or 0) * prices[1]) / 1_000_000
+        return cost * LLM_BATCH_PRICE_FACTOR if batch else cost
+
+    def _row(self) -> tuple:
+        if self.cost_usd is None and self.model:
+            self.cost_usd = self.cost_usd_for(self.model, self.prompt_tokens, self.completion_tokens,
+                                              batch=self.mode == 'batch')
+        return tuple(getattr(self, column) for column in self._COLUMNS)
+
+    @classmethod
+    def bulk_create(cls, calls: list['LLMCall']) -> bool:
+        """
+        Inserts the calls in a single transaction, pricing those without a cost.
+        Calls whose request_id is already recorded are skipped.
+        """
+        if not calls:
+            return True
+        query = f"""
+            INSERT OR IGNORE INTO llm_calls ({', '.join(cls._COLUMNS)})
+            VALUES ({', '.join('?' * len(cls._COLUMNS))})
+        """
+        return DBManager.execute_many(query, [call._row() for call in calls])
+
+    @classmethod
+    def record(cls, **fields) -> bool:
+        return cls.bulk_create([cls(**fields)])
+
+    @classmethod
+    def get_by_report_id(cls, report_id: str) -> list['LLMCall']:
+        query = "SELECT * FROM llm_calls WHERE report_id = ? ORDER BY called_at ASC, id ASC"
+        return [cls(**row) for row in DBManager.fetch_all(query, (report_id,))]
+
+    @classmethod
+    def latency_summary(cls, since: str = None) -> list[dict]:
+        """
+        Per mode ('sync', 'stream', 'batch'): requests, cache hits, model calls,
+        failures, p50/p95 latency and time to first token (ms) of the model calls,
+        average tokens and retries – optionally limited to calls at or after `since`.
+        """
+        query = """
+            SELECT mode, status, cache_status, latency_ms, first_token_ms, prompt_tokens,
+                   completion_tokens, retries
+            FROM llm_calls
+        """
+        params = ()
+        if since:
+            query += " WHERE called_at >= ?"
+            params = (since,)
+        by_mode: dict[str, list] = {}
+        for row in DBManager.fetch_all(query, params):
+            by_mode.setdefault(row['mode'], []).append(row)
+
+        summary = []
+        for mode, rows in sorted(by_mode.items()):
+            # Cache hits and breaker refusals never reached the model
+            calls = [r for r in rows if r['cache_status'] != 'hit' and r['status'] != 'breaker_open']
+            latencies = sorted(r['latency_ms'] for r in calls if r['latency_ms'] is not None)
+            first_tokens = sorted(r['first_token_ms'] for r in calls if r['first_token_ms'] is not None)
+            priced = [r for r in calls if r['prompt_tokens'] is not None]
+            summary.append({
+                "mode": mode,
+                "requests": len(rows),
+                "cache_hits": sum(1 for r in rows if r['cache_status'] == 'hit'),
+                "model_calls": len(calls),
+                "failures": sum(1 for r in rows if r['status'] != 'ok'),
+                "p50_ms": PipelineRun._percentile(latencies, 50),
+                "p95_ms": PipelineRun._percentile(latencies, 95),
+                "p50_first_token_ms": PipelineRun._percentile(first_tokens, 50),
+                "avg_prompt_tokens": sum(r['prompt_tokens'] for r in priced) / len(priced) if priced else None,
+                "avg_completion_tokens": (sum(r['completion_tokens'] or 0 for r in priced) / len(priced)
+                                          if priced else None),
+                "retries": sum(r['retries'] or 0 for r in calls),
+            })
+        return summary
+
+    @classmethod
+    def daily_usage(cls, since: str = None) -> list[dict]:
+        """Per UTC day: requests, cache hits, model calls, prompt/completion tokens and cost (USD)."""
+        query = """
+            SELECT substr(called_at, 1, 10) AS day,
+                   COUNT(*) AS requests,
+                   SUM(cache_status IS 'hit') AS cache_hits,
+                   SUM(cache_status IS NOT 'hit' AND status != 'breaker_open') AS model_calls,
+                   COALESCE(SUM(prompt_tokens), 0) AS prompt_tokens,
+                   COALESCE(SUM(completion_tokens), 0) AS completion_tokens,
+                   COALESCE(SUM(cost_usd), 0) AS cost_usd
+            FROM llm_calls
+        """
+        params = ()
+        if since:
+            query += " WHERE called_at >= ?"
+            params = (since,)
+        query += " GROUP BY day ORDER BY day"
+        return DBManager.fetch_all(query, params)
+
+    def to_dict(self):
+        return {"id": self.id, **{column: getattr(self, column) for column in self._COLUMNS}}
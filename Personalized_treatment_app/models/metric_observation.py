@@ -0,0 +1,102 @@
+# models/metric_observation.py
+from database.db_utils import DBManager
+
+
+class MetricObservation:
+    """
+    One extracted metric value of a report: the number, its unit and its flag
+    against REF_RANGES, stored separately so flags can be recomputed without
+    re-parsing (see reflag_all). extracted_data_json keeps the display strings
+    as they were at extraction time.
+    """
+
+    def __init__(self, report_id: str, metric: str, value: float, unit: str = None,
+                 flag: str = None, id: int = None):
+        self.id = id
+        self.report_id = report_id
+        self.metric = metric
+        self.value = value
+        self.unit = unit
+        self.flag = flag
+
+    @classmethod
+    def replace_statements(cls, items) -> list:
+        """
+        (query, seq_of_params) pairs that replace the observations of several
+        reports, for DBManager.execute_transaction or a caller's own transaction.
+        `items` is an iterable of (report_id, values, units) where values maps
+        metric → float|None (None = missing, not stored) and units metric → str.
+        """
+        from utils.flagging import flag_code
+        items = list(items)
+        rows = [
+            (report_id, metric, value, (units or {}).get(metric), flag_code(metric, value))
+            for report_id, values, units in items
+            for metric, value in (values or {}).items()
+            if value is not None
+        ]
+        query = """
+            INSERT INTO metric_observations (report_id, metric, value, unit, flag)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(report_id, metric) DO UPDATE SET
+                value = excluded.value, unit = excluded.unit, flag = excluded.flag
+        """
+        return [("DELETE FROM metric_observations WHERE report_id = ?", [(report_id,) for report_id, _, _ in items]),
+                (query, rows)]
+
+    @classmethod
+    def replace_for_reports(cls, items) -> bool:
+        """Stores the observations of several reports, replacing what they had, in one transaction."""
+        items = list(items)
+        if not items:
+            return True
+        return DBManager.execute_transaction(cls.replace_statements(items))
+
+    @classmethod
+    def replace_for_report(cls, report_id: str, values: dict, units: dict = None) -> bool:
+        return cls.replace_for_reports([(report_id, values, units)])
+
+    @classmethod
+    def get_by_report_id(cls, report_id: str) -> list['MetricObservation']:
+        rows = DBManager.fetch_all(
+            "SELECT * FROM metric_observations WHERE report_id = ? ORDER BY metric", (report_id,)
+        )
+        return [cls(**row) for row in rows]
+
+    @classmethod
+    def reflag_all(cls, ref_ranges: dict = None, chunk_size: int = 1_000_000) -> dict:
+        """
+        Recomputes every stored flag against `ref_ranges` (default REF_RANGES)
+        with one vectorised pass per chunk, and writes back only the flags that
+        changed. Returns {"observations": n, "changed": n}.
+        """
+        from utils.flagging import flag_codes_vectorized
+        total = changed = 0
+        last_id = 0
+        while True:
+            frame = DBManager.fetch_frame(
+                "SELECT id, metric, value, flag FROM metric_observations WHERE id > ? ORDER BY id LIMIT ?",
+                (last_id, chunk_size),
+            )
+            if frame.empty:
+                break
+            last_id = int(frame["id"].iloc[-1])
+            new_flags = flag_codes_vectorized(frame["metric"].to_numpy(), frame["value"].to_numpy(), ref_ranges)
+            diff = new_flags != frame["flag"].to_numpy(dtype=object)
+            if diff.any():
+                updates = list(zip(new_flags[diff].tolist(), frame["id"].to_numpy()[diff].tolist()))
+                if not DBManager.execute_many("UPDATE metric_observations SET flag = ? WHERE id = ?", updates):
+                    raise RuntimeError("Failed to write re-flagged observations.")
+                changed += len(updates)
+            total += len(frame)
+        print(f"[MetricObservation] Re-flagged {total} observation(s), {changed} flag(s) changed.")
+        return {"observations": total, "changed": changed}
+
+    def to_dict(self):
+        return {
+            "report_id": self.report_id,
+            "metric": self.metric,
+            "value": self.value,
+            "unit": self.unit,
+            "flag": self.flag,
+        }
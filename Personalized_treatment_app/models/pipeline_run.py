@@ -0,0 +1,126 @@
+# models/pipeline_run.py
+import json
+import math
+from database.db_utils import DBManager
+
+
+class PipelineRun:
+    """One timed stage of a report processing run (see services/pipeline_tracing.py)."""
+
+    def __init__(self, run_id: str, report_id: str, stage: str, started_at: str = None,
+                 duration_ms: float = None, status: str = 'ok', input_bytes: int = None,
+                 pages: int = None, ocr_pages: int = None, details_json: str = None, id: int = None):
+        self.id = id
+        self.run_id = run_id
+        self.report_id = report_id
+        self.stage = stage
+        self.started_at = started_at
+        self.duration_ms = duration_ms
+        self.status = status
+        self.input_bytes = input_bytes
+        self.pages = pages
+        self.ocr_pages = ocr_pages
+        self.details_json = details_json
+
+    @classmethod
+    def bulk_create(cls, run_id: str, report_id: str, spans) -> bool:
+        """Inserts all spans of one run in a single transaction."""
+        query = """
+            INSERT INTO pipeline_runs (run_id, report_id, stage, started_at, duration_ms, status,
+                                       input_bytes, pages, ocr_pages, details_json)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """
+        rows = []
+        for s in spans:
+            attrs = dict(s.attrs)
+            input_bytes = attrs.pop('input_bytes', None)
+            pages = attrs.pop('pages', None)
+            ocr_pages = attrs.pop('ocr_pages', None)
+            if s.error:
+                attrs['error'] = s.error
+            rows.append((run_id, report_id, s.stage, s.started_at, round(s.duration_ms, 3), s.status,
+                         input_bytes, pages, ocr_pages, json.dumps(attrs) if attrs else None))
+        return DBManager.execute_many(query, rows)
+
+    @classmethod
+    def get_by_report_id(cls, report_id: str) -> list['PipelineRun']:
+        query = "SELECT * FROM pipeline_runs WHERE report_id = ? ORDER BY started_at ASC, id ASC"
+        rows = DBManager.fetch_all(query, (report_id,))
+        return [cls(**row) for row in rows]
+
+    @staticmethod
+    def _percentile(sorted_values: list, pct: float) -> float:
+        """Nearest-rank percentile of an already sorted list."""
+        if not sorted_values:
+            return None
+        rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+        return sorted_values[rank - 1]
+
+    @classmethod
+    def stage_latency_summary(cls, since: str = None) -> list[dict]:
+        """
+        Per-stage count, error count, p50/p95/max duration (ms) and OCR'd pages,
+        optionally limited to runs started at or after `since` (ISO timestamp).
+        """
+        query = "SELECT stage, duration_ms, status, ocr_pages FROM pipeline_runs"
+        params = ()
+        if since:
+            query += " WHERE started_at >= ?"
+            params = (since,)
+        query += " ORDER BY stage, duration_ms"
+        rows = DBManager.fetch_all(query, params)
+
+        by_stage: dict[str, list] = {}
+        for row in rows:
+            by_stage.setdefault(row['stage'], []).append(row)
+
+        summary = []
+        for stage, stage_rows in by_stage.items():
+            durations = [r['duration_ms'] for r in stage_rows if r['duration_ms'] is not None]
+            summary.append({
+                "stage": stage,
+                "count": len(stage_rows),
+                "errors": sum(1 for r in stage_rows if r['status'] != 'ok'),
+                "p50_ms": cls._percentile(durations, 50),
+                "p95_ms": cls._percentile(durations, 95),
+                "max_ms": durations[-1] if durations else None,
+                "ocr_pages": sum(r['ocr_pages'] or 0 for r in stage_rows),
+            })
+        return sorted(summary, key=lambda s: -(s["p95_ms"] or 0))
+
+    @classmethod
+    def recommendation_source_summary(cls, since: str = None) -> dict:
+        """
+        How AI generation runs got their answer – {"rules": n, "llm": n, "fast_path_share": x} –
+        optionally limited to runs started at or after `since`. Runs that resumed
+        from a checkpoint or failed have no source and aren't counted.
+        """
+        query = """
+            SELECT json_extract(details_json, '$.recommendation_source') AS source, COUNT(*) AS n
+            FROM pipeline_runs
+            WHERE stage = 'ai_generation' AND json_extract(details_json, '$.recommendation_source') IS NOT NULL
+        """
+        params = ()
+        if since:
+            query += " AND started_at >= ?"
+            params = (since,)
+        query += " GROUP BY source"
+        counts = {row['source']: row['n'] for row in DBManager.fetch_all(query, params)}
+        summary = {"rules": counts.get("rules", 0), "llm": counts.get("llm", 0)}
+        total = summary["rules"] + summary["llm"]
+        summary["fast_path_share"] = summary["rules"] / total if total else None
+        return summary
+
+    def to_dict(self):
+        return {
+            "run_id": self.run_id,
+            "report_id": self.report_id,
+            "stage": self.stage,
+            "started_at": self.started_at,
+            "duration_ms": self.duration_ms,
+            "status": self.status,
+            "input_bytes": self.input_bytes,
+            "pages": self.pages,
+            "ocr_pages": self.ocr_pages,
+            "details_json": json.loads(self.details_json) if self.details_json else {},
+        }
@@ -182,6 +182,23 @@ class Recommendation:
             approved_lifestyle=approved_lifestyle
         )
 
+    def update_ai_output(self, ai_recommendations: dict) -> bool:
+        """Replaces the AI-generated suggestions (e.g. after a doctor asked for a fresh one)."""
+        self.ai_generated_treatment = ai_recommendations.get('treatment_suggestions', '')
+        self.ai_generated_lifestyle = ai_recommendations.get('lifestyle_recommendations', '')
+        self.ai_generated_priority = ai_recommendations.get('priority', 'Medium')
+        self.last_updated_at = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        query = """
+            UPDATE recommendations
+            SET ai_generated_treatment = ?, ai_generated_lifestyle = ?, ai_generated_priority = ?,
+                last_updated_at = ?
+            WHERE recommendation_id = ?
+        """
+        return DBManager.execute_query(query, (
+            self.ai_generated_treatment, self.ai_generated_lifestyle, self.ai_generated_priority,
+            self.last_updated_at, self.recommendation_id
+        ))
+
     def to_dict(self):
         return {
             "recommendation_id": self.recommendation_id,
@@ -1,37 +1,95 @@
 # models/report_specialist_mapping.py
 import uuid
+import threading
 from database.db_utils import DBManager
 
 class ReportSpecialistMapping:
+    # Normalized report_type -> specialization, loaded once from the (small, rarely changing)
+    # table and invalidated by create/update/delete/bulk_upsert. _generation counts the
+    # invalidations, so a load that overlapped one isn't cached.
+    _lookup = None
+    _generation = 0
+    _lookup_lock = threading.Lock()
+
     def __init__(self, report_type: str, specialization_required: str):
         self.report_type = report_type
         self.specialization_required = specialization_required
 
+    @staticmethod
+    def normalize_report_type(report_type: str) -> str:
+        """'Lipid Profile', 'lipid_profile' and ' LIPID  profile' all map to 'lipid profile'."""
+        return " ".join((report_type or "").replace("_", " ").lower().split())
+
+    @classmethod
+    def invalidate_cache(cls):
+        with cls._lookup_lock:
+            cls._generation += 1
+            cls._lookup = None
+
+    @classmethod
+    def _get_lookup(cls) -> dict:
+        lookup = cls._lookup
+        if lookup is not None:
+            return lookup
+        with cls._lookup_lock:
+            if cls._lookup is not None:
+                return cls._lookup
+            generation = cls._generation
+        rows = DBManager.fetch_all("SELECT report_type, specialization_required FROM report_specialist_mapping")
+        lookup = {cls.normalize_report_type(r['report_type']): r['specialization_required'] for r in rows}
+        with cls._lookup_lock:
+            # Not cached when empty (fetch_all returns [] on a database error too) or when the
+            # table changed during the load: the next lookup loads again
+            if lookup and cls._generation == generation:
+                cls._lookup = lookup
+        return lookup
+
     @classmethod
     def create(cls, report_type: str, specialization_required: str) -> 'ReportSpecialistMapping':
         """Creates a new report specialist mapping entry."""
         query = "INSERT INTO report_specialist_mapping (report_type, specialization_required) VALUES (?, ?)"
         if DBManager.execute_query(query, (report_type, specialization_required)):
+            cls.invalidate_cache()
             return cls(report_type, specialization_required)
         return None
 
+    @classmethod
+    def bulk_upsert(cls, mappings: dict, overwrite: bool = False) -> bool:
+        """
+        Inserts many report_type -> specialization mappings in one statement batch.
+        Existing report types are left alone unless overwrite is True.
+        """
+        conflict = ("DO UPDATE SET specialization_required = excluded.specialization_required"
+                    if overwrite else "DO NOTHING")
+        query = f"""
+            INSERT INTO report_specialist_mapping (report_type, specialization_required)
+            VALUES (?, ?)
+            ON CONFLICT(report_type) {conflict}
+        """
+        success = DBManager.execute_many(query, list(mappings.items()))
+        cls.invalidate_cache()
+        return success
+
     @classmethod
     def get_specialization_by_report_type(cls, report_type: str) -> str:
-        """Retrieves the required specialization for a given report type."""
-        query = "SELECT specialization_required FROM report_specialist_mapping WHERE report_type = ?"
-        result = DBManager.fetch_one(query, (report_type,))
-        if result:
-            return result['specialization_required']
-        return None # No specific specialization found
+        """
+        Retrieves the required specialization for a given report type.
+        Served from the in-memory lookup; matching ignores case and spaces vs. underscores.
+        """
+        return cls._get_lookup().get(cls.normalize_report_type(report_type)) # None if no specific specialization found
 
     @classmethod
     def update(cls, report_type: str, new_specialization_required: str) -> bool:
         """Updates the specialization for an existing report type mapping."""
         query = "UPDATE report_specialist_mapping SET specialization_required = ? WHERE report_type = ?"
-        return DBManager.execute_query(query, (new_specialization_required, report_type))
+        success = DBManager.execute_query(query, (new_specialization_required, report_type))
+        cls.invalidate_cache()
+        return success
 
     @classmethod
     def delete(cls, report_type: str) -> bool:
         """Deletes a report specialist mapping entry."""
         query = "DELETE FROM report_specialist_mapping WHERE report_type = ?"
-        return DBManager.execute_query(query, (report_type,))
\ No newline at end of file
+        success = DBManager.execute_query(query, (report_type,))
+        cls.invalidate_cache()
+        return success
\ No newline at end of file
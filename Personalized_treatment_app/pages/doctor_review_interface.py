@@ -69,8 +69,37 @@ def show_page():
 
     # --- Display AI-Generated Suggestions ---
     st.subheader("AI-Generated Suggestions:")
-    st.info(f"**Treatment Plan:** {recommendation.ai_generated_treatment or 'N/A'}")
-    st.info(f"**Lifestyle Changes:** {recommendation.ai_generated_lifestyle or 'N/A'}")
+    # Placeholders, so a fresh suggestion can be written into them as it streams in
+    treatment_box = st.empty()
+    lifestyle_box = st.empty()
+    treatment_box.info(f"**Treatment Plan:** {recommendation.ai_generated_treatment or 'N/A'}")
+    lifestyle_box.info(f"**Lifestyle Changes:** {recommendation.ai_generated_lifestyle or 'N/A'}")
+
+    # Cached AI answers are reused for identical report data, and simple reports are
+    # answered from rules; this always asks the model
+    if st.button("🔄 Generate a fresh AI suggestion", key="regenerate_ai_button"):
+        from services.ai_recommendation_engine import stream_ai_recommendations # Lazy import
+        progress = st.empty()
+        progress.caption("Asking the AI for a fresh suggestion...")
+        stream = stream_ai_recommendations(report.get_extracted_data(), report_id=report.report_id)
+        for partial in stream:
+            progress.caption(f"Writing... (first text after {stream.first_token_ms / 1000:.1f}s)")
+            # The cursor marks the field being written (the model writes them in order)
+            writing_lifestyle = 'lifestyle_recommendations' in partial
+            treatment_box.info(f"**Treatment Plan:** {partial.get('treatment_suggestions', '')}"
+                               f"{'' if writing_lifestyle else '▌'}")
+            lifestyle_box.info(f"**Lifestyle Changes:** {partial.get('lifestyle_recommendations', '')}"
+                               f"{'▌' if writing_lifestyle else ''}")
+        # Only a complete, valid answer is saved; a broken stream leaves the stored suggestion as it was
+        if stream.result and recommendation.update_ai_output(stream.result):
+            report.save_ai_output(stream.result)
+            st.success("AI suggestion regenerated.")
+            st.rerun()
+        else:
+            progress.empty()
+            treatment_box.info(f"**Treatment Plan:** {recommendation.ai_generated_treatment or 'N/A'}")
+            lifestyle_box.info(f"**Lifestyle Changes:** {recommendation.ai_generated_lifestyle or 'N/A'}")
+            st.error(f"Could not generate a fresh AI suggestion. {stream.error or ''} Please try again later.")
 
     st.markdown("---")
 
@@ -55,9 +55,7 @@ def show_page():
             elif st.session_state.user_type == 'doctor':
                 st.session_state.page = "doctor_dashboard"
             elif st.session_state.user_type == 'admin':
-                # Future: Redirect to admin dashboard
-                st.session_state.page = "admin_dashboard" # Placeholder
-                st.warning("Admin dashboard not yet implemented.")
+                st.session_state.page = "pipeline_metrics"
             st.rerun()
         else:
             st.error("Invalid username or password.")
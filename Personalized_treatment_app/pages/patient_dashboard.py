@@ -149,6 +149,10 @@ def show_page():
                                 display_status = recommendation.status
                         else:
                             display_status = "Pending AI Analysis"
+                    elif report.processing_status == 'pending_ai':
+                        display_status = "Pending AI Analysis"
+                    elif report.processing_status == 'failed_limits':
+                        display_status = "Too large to process"
 
                     rec_approved = recommendation and recommendation.status in ['approved_by_doctor', 'modified_and_approved_by_doctor']
 
@@ -0,0 +1,144 @@
+# pages/pipeline_metrics.py
+
+import datetime
+import pandas as pd
+import streamlit as st
+from models.pipeline_run import PipelineRun
+from models.health_report import HealthReport, PIPELINE_STAGES
+from utils.layout import render_header, render_footer
+
+# Label → look-back window (None = all time)
+_WINDOWS = {
+    "Last 24 hours": datetime.timedelta(days=1),
+    "Last 7 days": datetime.timedelta(days=7),
+    "Last 30 days": datetime.timedelta(days=30),
+    "All time": None,
+}
+
+def show_page():
+    render_header()
+
+    # --- Authentication Check ---
+    if not st.session_state.get("logged_in") or st.session_state.get("user_type") != 'admin':
+        st.warning("Please log in as an admin to access this page.")
+        st.session_state.page = "login"
+        st.rerun()
+        return
+
+    st.title("Pipeline Stage Latency")
+    st.caption("Per-stage timings of report processing, slowest (p95) first.")
+
+    window = st.selectbox("Time window", list(_WINDOWS), index=1)
+    since = None
+    if _WINDOWS[window] is not None:
+        since = (datetime.datetime.now(datetime.timezone.utc) - _WINDOWS[window]).isoformat()
+
+    summary = PipelineRun.stage_latency_summary(since=since)
+    if not summary:
+        st.info("No pipeline runs recorded in this window.")
+    else:
+        df = pd.DataFrame(summary).set_index("stage")
+        st.dataframe(df.style.format({"p50_ms": "{:.1f}", "p95_ms": "{:.1f}", "max_ms": "{:.1f}"}),
+                     use_container_width=True)
+
+    # --- Share of reports answered by the rule-based fast path (same window) ---
+    sources = PipelineRun.recommendation_source_summary(since=since)
+    st.markdown("---")
+    st.subheader("Recommendation Fast Path")
+    c1, c2, c3 = st.columns(3)
+    share = sources["fast_path_share"]
+    c1.metric("Answered from rules", "–" if share is None else f"{share:.0%}")
+    c2.metric("Rule-based", sources["rules"])
+    c3.metric("LLM", sources["llm"], help="Including answers served from the LLM response cache")
+
+    # --- AI service health: circuit breaker and reports waiting for the LLM ---
+    from services.ai_recommendation_engine import breaker # Lazy import
+    pending = HealthReport.find_by_status('pending_ai')
+    st.markdown("---")
+    st.subheader("AI Service")
+    c1, c2, c3 = st.columns(3)
+    c1.metric("Circuit breaker", breaker.state.replace("_", "-"),
+              help=f"Opened {breaker.counters['opened']} time(s); "
+                   f"{breaker.counters['rejected']} call(s) refused since start-up")
+    c2.metric("Pending AI", len(pending), help="Reports waiting for the LLM; the background sweeper fills them in")
+    c3.metric("Next trial call", f"{breaker.seconds_until_retry():.0f} s")
+    if st.button("Fill in pending AI recommendations now", key="sweep_pending_ai_btn", disabled=not pending):
+        from services.document_parser import DocumentParser # Lazy import
+        with st.spinner("Generating..."):
+            result = DocumentParser.sweep_pending_ai()
+        st.success(f"{result['completed']} of {result['pending']} report(s) completed.")
+        if result["deferred"]:
+            st.info(f"{result['deferred']} report(s) deferred: the AI service is still unavailable.")
+
+    # --- LLM response cache effectiveness (counters are all-time) ---
+    from services.llm_cache import LLMResponseCache # Lazy import
+    st.markdown("---")
+    st.subheader("LLM Response Cache")
+    cache_stats = LLMResponseCache.stats()
+    c1, c2, c3, c4 = st.columns(4)
+    hit_rate = cache_stats["hit_rate"]
+    c1.metric("Hit rate", "–" if hit_rate is None else f"{hit_rate:.0%}",
+              help=f"{int(cache_stats['hits'])} hits, {int(cache_stats['misses'])} misses, "
+                   f"{int(cache_stats['bypasses'])} doctor bypasses")
+    c2.metric("Latency saved", f"{cache_stats['latency_saved_ms'] / 1000:.1f} s")
+    c3.metric("Tokens saved", f"{int(cache_stats['tokens_saved']):,}")
+    c4.metric("Cached responses", cache_stats["entries"])
+
+    # --- LLM call telemetry (same window): latency per call mode, tokens and cost per day ---
+    from models.llm_call import LLMCall # Lazy import
+    st.markdown("---")
+    st.subheader("LLM Calls")
+    calls = LLMCall.latency_summary(since=since)
+    if not calls:
+        st.info("No LLM calls recorded in this window.")
+    else:
+        daily = pd.DataFrame(LLMCall.daily_usage(since=since)).set_index("day")
+        c1, c2, c3 = st.columns(3)
+        c1.metric("Cost", f"${daily['cost_usd'].sum():.4f}")
+        c2.metric("Tokens", f"{int(daily['prompt_tokens'].sum() + daily['completion_tokens'].sum()):,}",
+                  help="Prompt + completion tokens of the model calls")
+        c3.metric("Cost per model call", f"${daily['cost_usd'].sum() / max(daily['model_calls'].sum(), 1):.5f}")
+        st.dataframe(pd.DataFrame(calls).set_index("mode").style.format(
+            {"p50_ms": "{:.0f}", "p95_ms": "{:.0f}", "p50_first_token_ms": "{:.0f}",
+             "avg_prompt_tokens": "{:.0f}", "avg_completion_tokens": "{:.0f}"}, na_rep="–"),
+            use_container_width=True)
+        st.caption("Tokens and cost per day (UTC)")
+        st.bar_chart(daily[["prompt_tokens", "completion_tokens"]])
+        st.dataframe(daily.style.format({"cost_usd": "${:.4f}"}), use_container_width=True)
+
+    st.markdown("---")
+    report_id = st.text_input("Inspect a report's runs (report ID)")
+    if report_id:
+        runs = PipelineRun.get_by_report_id(report_id.strip())
+        if runs:
+            st.dataframe(pd.DataFrame([r.to_dict() for r in runs]), use_container_width=True)
+        else:
+            st.info("No pipeline runs recorded for this report.")
+        llm_calls = LLMCall.get_by_report_id(report_id.strip())
+        if llm_calls:
+            st.caption("LLM calls")
+            st.dataframe(pd.DataFrame([c.to_dict() for c in llm_calls]), use_container_width=True)
+
+    # --- Bulk retry of reports stuck in a stage (each resumes from its checkpoint) ---
+    st.markdown("---")
+    st.subheader("Retry Stuck Reports")
+    counts = HealthReport.count_by_pipeline_stage()
+    st.caption(" · ".join(f"{stage}: {counts.get(stage, 0)}" for stage in PIPELINE_STAGES + ("completed",)))
+
+    col1, col2 = st.columns(2)
+    with col1:
+        stage = st.selectbox("Stuck at stage", PIPELINE_STAGES, index=PIPELINE_STAGES.index("ai_generation"))
+    with col2:
+        older_than = st.number_input("Untouched for at least (minutes)", min_value=0, value=5, step=5)
+
+    if st.button(f"Retry {counts.get(stage, 0)} report(s) at '{stage}'", key="retry_stuck_btn",
+                 disabled=not counts.get(stage)):
+        from services.document_parser import DocumentParser # Lazy import
+        with st.spinner("Retrying..."):
+            result = DocumentParser.retry_stuck_reports(stage, older_than_minutes=int(older_than))
+        st.success(f"Retried {result['retried']} report(s): {result['completed']} completed, "
+                   f"{result['still_stuck']} still incomplete.")
+        if result["skipped_limits"]:
+            st.info(f"Skipped {result['skipped_limits']} report(s) that exceeded the extraction limits.")
+
+    render_footer()
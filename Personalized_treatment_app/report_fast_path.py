@@ -0,0 +1,53 @@
+# report_fast_path.py
+"""
+Share of stored reports the rule-based fast path would answer without the LLM.
+
+    python report_fast_path.py [--limit 50] [--verbose]
+
+Runs services/rule_recommendations.py over every extracted report and
+prints, per report, whether it goes to the rules or to the LLM (and the
+priority the rules gave), then the overall fast-path share. Pipeline runs
+record the same split as they happen (see the Pipeline Metrics page).
+"""
+import argparse
+import json
+
+from database.db import init_db
+from database.db_utils import DBManager
+from services.rule_recommendations import recommend_from_rules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--limit", type=int, default=None, help="only the N most recent reports")
+    parser.add_argument("--verbose", action="store_true", help="print the rule-based treatment text")
+    args = parser.parse_args()
+
+    init_db()
+    query = "SELECT report_id, extracted_data_json FROM health_reports ORDER BY upload_date DESC"
+    rows = DBManager.fetch_all(query + (" LIMIT ?" if args.limit else ""), (args.limit,) if args.limit else ())
+
+    fast = n = 0
+    print(f"{'report_id':<38} {'path':<6} priority")
+    for row in rows:
+        extracted = json.loads(row["extracted_data_json"] or "{}")
+        if not extracted.get("raw_text"):
+            continue
+        n += 1
+        recommendations = recommend_from_rules(extracted)
+        if recommendations is None:
+            print(f"{row['report_id']:<38} {'llm':<6} –")
+            continue
+        fast += 1
+        print(f"{row['report_id']:<38} {'rules':<6} {recommendations['priority']}")
+        if args.verbose:
+            print(f"    {recommendations['treatment_suggestions']}")
+
+    if not n:
+        print("No extracted reports found.")
+        return
+    print(f"\n{n} reports: {fast} answered from rules, {n - fast} need the LLM ({fast / n:.0%} fast path)")
+
+
+if __name__ == "__main__":
+    main()
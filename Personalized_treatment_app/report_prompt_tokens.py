@@ -0,0 +1,67 @@
+# report_prompt_tokens.py
+"""
+Per-report prompt token counts: the previous full-JSON prompt vs the compact one.
+
+    python report_prompt_tokens.py [--budget 600] [--limit 50]
+
+The previous prompt embedded the whole extraction (raw_text, every
+"❌ Missing" metric, identifiers) as indented JSON. Token counts are exact
+with tiktoken installed, otherwise a ~4 characters/token estimate.
+"""
+import argparse
+import json
+
+from config import PROMPT_TOKEN_BUDGET
+from database.db import init_db
+from database.db_utils import DBManager
+from services.prompt_builder import build_compact_prompt, count_tokens
+
+_FULL_PROMPT_HEADER = "\n".join([
+    "You are an expert AI assistant specialized in functional and integrative medicine.",
+    "Analyze the following health report data and provide concise, actionable recommendations.",
+    "Your output MUST be a JSON object with the following keys:",
+    "- 'treatment_suggestions': A string containing medical treatment suggestions (if needed).",
+    "- 'lifestyle_recommendations': A string containing personalized lifestyle and diet recommendations, and stress/wellness strategies.",
+    "- 'priority': A string indicating the urgency (e.g., 'High', 'Medium', 'Low').",
+    "",
+    "Health Report Data (JSON format):",
+])
+
+
+def full_prompt(extracted: dict) -> str:
+    """The prompt build_ai_prompt produced before the compact builder."""
+    report_data = {k: v for k, v in extracted.items() if k not in ("metric_values", "metric_units", "extractor_version")}
+    return "\n".join([_FULL_PROMPT_HEADER, json.dumps(report_data, indent=2),
+                      "\nEnsure the JSON is perfectly formed and contains only the specified keys."])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--budget", type=int, default=PROMPT_TOKEN_BUDGET)
+    parser.add_argument("--limit", type=int, default=None, help="only the N most recent reports")
+    args = parser.parse_args()
+
+    init_db()
+    query = "SELECT report_id, extracted_data_json FROM health_reports ORDER BY upload_date DESC"
+    rows = DBManager.fetch_all(query + (" LIMIT ?" if args.limit else ""), (args.limit,) if args.limit else ())
+
+    before_total = after_total = n = 0
+    print(f"{'report_id':<38} {'before':>7} {'after':>7} {'saved':>6}")
+    for row in rows:
+        extracted = json.loads(row["extracted_data_json"] or "{}")
+        if not extracted.get("raw_text"):
+            continue
+        before = count_tokens(full_prompt(extracted))
+        after = count_tokens(build_compact_prompt(extracted, args.budget))
+        before_total, after_total, n = before_total + before, after_total + after, n + 1
+        print(f"{row['report_id']:<38} {before:>7} {after:>7} {1 - after / before:>6.0%}")
+
+    if not n:
+        print("No extracted reports found.")
+        return
+    print(f"\n{n} reports: mean {before_total / n:.0f} → {after_total / n:.0f} prompt tokens per call "
+          f"({1 - after_total / before_total:.0%} fewer, budget {args.budget})")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,95 +1,326 @@
 # services/ai_recommendation_engine.py
-import os
+import asyncio
 import json
-from openai import OpenAI
-from dotenv import load_dotenv
+import threading
+import time
 
-from config import OPENAI_API_KEY
+from config import (AI_BACKEND, LLM_CACHE_ENABLED, PROMPT_TOKEN_BUDGET, RULE_FAST_PATH_ENABLED,
+                    AI_LATENCY_BUDGET_SECONDS, AI_BREAKER_FAILURE_THRESHOLD, AI_BREAKER_RESET_SECONDS)
+from services import pipeline_tracing
+from services.circuit_breaker import CircuitBreaker
 
-# Load API key from .env
-load_dotenv()
-api_key = OPENAI_API_KEY
+MODEL = "gpt-4o-mini" # Using the model specified by the user
+TEMPERATURE = 0.7
+MAX_TOKENS = 1500
+SYSTEM_PROMPT = "You are a trusted AI health assistant that outputs valid JSON."
 
-# Ensure API key is available
-if not api_key:
-    raise ValueError("OPENAI_API_KEY environment variable not set.")
+# The backend is created on first use (see get_backend), so importing this
+# module – e.g. from the pipeline or at app start-up – neither loads the SDK
+# nor fails when no key is configured.
+_backend = None
+_backend_lock = threading.Lock()
 
-client = OpenAI(api_key=api_key)
+# Shared by every report: once the backend keeps failing or blowing the latency
+# budget, calls are refused straight away instead of each waiting for it
+breaker = CircuitBreaker(AI_BREAKER_FAILURE_THRESHOLD, AI_BREAKER_RESET_SECONDS)
+
+def get_backend():
+    """
+    Returns the process-wide LLM backend chosen by AI_BACKEND (services/llm_backends.py),
+    creating it on first call. All reports share its rate limits and concurrency bound.
+    """
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            from services.llm_backends import create_backend
+            _backend = create_backend(AI_BACKEND)
+    return _backend
+
+def set_backend(backend):
+    """Replaces the process-wide backend (e.g. a load test switching to the stub or the fake)."""
+    global _backend
+    with _backend_lock:
+        _backend = backend
 
 def build_ai_prompt(extracted_data: dict) -> str:
     """
-    Constructs a detailed prompt for the AI based on extracted health data.
+    Constructs a compact prompt for the AI based on extracted health data:
+    populated metrics with flags and age/sex only, within PROMPT_TOKEN_BUDGET
+    (see services/prompt_builder.py).
     """
-    lines = [
-        "You are an expert AI assistant specialized in functional and integrative medicine.",
-        "Analyze the following health report data and provide concise, actionable recommendations.",
-        "Your output MUST be a JSON object with the following keys:",
-        "- 'treatment_suggestions': A string containing medical treatment suggestions (if needed).",
-        "- 'lifestyle_recommendations': A string containing personalized lifestyle and diet recommendations, and stress/wellness strategies.",
-        "- 'priority': A string indicating the urgency (e.g., 'High', 'Medium', 'Low').",
-        "",
-        "Health Report Data (JSON format):"
+    from services.prompt_builder import build_compact_prompt # Lazy import
+    return build_compact_prompt(extracted_data, PROMPT_TOKEN_BUDGET)
+
+def build_messages(extracted_data: dict) -> list:
+    """Chat messages of the recommendation request for a report (also used for batch files)."""
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": build_ai_prompt(extracted_data)}
     ]
-    lines.append(json.dumps(extracted_data, indent=2))
-    lines.append("\nEnsure the JSON is perfectly formed and contains only the specified keys.")
-    
-    return "\n".join(lines)
 
-def generate_ai_recommendations(extracted_data: dict) -> dict:
+def parse_ai_response(ai_response_content: str) -> dict:
+    """
+    The recommendation dict from the model's JSON answer, or None if it isn't
+    valid JSON or lacks one of the required keys.
     """
-    Sends extracted health data to an OpenAI LLM to get structured recommendations.
+    try:
+        # Attempt to parse the JSON response
+        parsed_response = json.loads(ai_response_content)
+    except (TypeError, json.JSONDecodeError) as e:
+        print(f"AI Recommendation Engine: Failed to parse AI response as JSON: {e}")
+        print(f"Raw AI content: {(ai_response_content or '')[:500]}...")
+        return None
+    print(f"AI Recommendation Engine: Parsed AI response: {parsed_response}")
+    # Validate expected keys
+    required_keys = ['treatment_suggestions', 'lifestyle_recommendations', 'priority']
+    if not isinstance(parsed_response, dict) or not all(key in parsed_response for key in required_keys):
+        keys = parsed_response.keys() if isinstance(parsed_response, dict) else type(parsed_response).__name__
+        print(f"AI Recommendation Engine: Missing required keys in AI response: {keys}")
+        return None
+    print("AI Recommendation Engine: Successfully parsed AI recommendations.")
+    return {
+        'treatment_suggestions': parsed_response.get('treatment_suggestions', ''),
+        'lifestyle_recommendations': parsed_response.get('lifestyle_recommendations', ''),
+        'priority': parsed_response.get('priority', 'Medium') # Default to Medium if not provided
+    }
+
+def _record_call(report_id: str, mode: str, status: str, cache_status: str = None, response=None,
+                 latency_ms: float = None, **fields):
+    """One llm_calls telemetry row (models/llm_call.py); `response` supplies tokens, latency and retries."""
+    from models.llm_call import LLMCall # Lazy import
+    if response is not None:
+        if response.coalesced:
+            # The caller that owned the shared request accounts for its tokens
+            cache_status = "coalesced"
+        else:
+            fields.update(prompt_tokens=response.prompt_tokens, completion_tokens=response.completion_tokens)
+        latency_ms = response.latency_ms
+        fields["retries"] = response.retries
+    LLMCall.record(report_id=report_id, mode=mode, model=MODEL, backend=AI_BACKEND, status=status,
+                   cache_status=cache_status, latency_ms=latency_ms, **fields)
+
+def _unavailable(extracted_data: dict, use_rules: bool, reason: str) -> dict:
+    """
+    Answer when the LLM can't be used: the rules if they match (they already had their
+    chance when the fast path is on), otherwise None – the pipeline then parks the
+    report as 'pending_ai' for the sweeper.
+    """
+    pipeline_tracing.annotate(llm_unavailable=reason)
+    print(f"AI Recommendation Engine: LLM unavailable ({reason}).")
+    if use_rules and not RULE_FAST_PATH_ENABLED:
+        from services.rule_recommendations import recommend_from_rules # Lazy import
+        recommendations = recommend_from_rules(extracted_data)
+        if recommendations is not None:
+            pipeline_tracing.annotate(recommendation_source="rules")
+            return recommendations
+    return None
+
+def generate_ai_recommendations(extracted_data: dict, bypass_cache: bool = False, use_rules: bool = True,
+                                report_id: str = None) -> dict:
+    """
+    Sends extracted health data to the LLM backend (OpenAI unless AI_BACKEND says
+    otherwise) to get structured recommendations.
     Returns a dictionary with 'treatment_suggestions', 'lifestyle_recommendations', 'priority'.
     Returns None if generation or parsing fails.
+
+    Responses are cached (services/llm_cache.py), so identical report data
+    doesn't trigger another call; `bypass_cache=True` always asks the model
+    and replaces the cached answer (e.g. a doctor requesting a fresh suggestion).
+    LLM_CACHE_ENABLED=0 skips the cache altogether.
+
+    Reports that are all normal or show one mild, well-understood pattern are
+    answered from rules without calling the model (services/rule_recommendations.py);
+    `use_rules=False` always asks the model (e.g. a doctor requesting it).
+
+    A model call may take at most AI_LATENCY_BUDGET_SECONDS, retries included.
+    Failures and overruns count towards the circuit `breaker`; while it is open
+    no call is made and None is returned at once.
+
+    Every request that gets past the rules is recorded in llm_calls against
+    `report_id` – tokens, latency, retries, cache status and cost.
     """
     if not extracted_data:
         print("AI Recommendation Engine: No extracted data provided.")
         return None
 
-    prompt = build_ai_prompt(extracted_data)
-    print("AI Recommendation Engine: Sending prompt to OpenAI...")
+    if use_rules and RULE_FAST_PATH_ENABLED:
+        from services.rule_recommendations import recommend_from_rules # Lazy import
+        recommendations = recommend_from_rules(extracted_data)
+        if recommendations is not None:
+            pipeline_tracing.annotate(recommendation_source="rules")
+            print("AI Recommendation Engine: Report matches a known pattern; using rule-based recommendations.")
+            return recommendations
+
+    from services.llm_cache import LLMResponseCache # Lazy imports
+    from services.llm_client import run_sync
+    messages = build_messages(extracted_data)
+    cache = LLMResponseCache() if LLM_CACHE_ENABLED else None
+    cache_key = cache.make_key(MODEL, TEMPERATURE, messages) if cache else None
+    cache_status = None
+    if cache is not None and bypass_cache:
+        cache.record_bypass()
+        cache_status = "bypass"
+        pipeline_tracing.annotate(llm_cache="bypass")
+    elif cache is not None:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            pipeline_tracing.annotate(llm_cache="hit", recommendation_source="llm")
+            _record_call(report_id, "sync", "ok", "hit")
+            print("AI Recommendation Engine: Using cached AI recommendations.")
+            return cached
+        cache_status = "miss"
+        pipeline_tracing.annotate(llm_cache="miss")
 
+    if not breaker.allow():
+        _record_call(report_id, "sync", "breaker_open", cache_status)
+        return _unavailable(extracted_data, use_rules, "breaker_open")
+
+    print(f"AI Recommendation Engine: Sending prompt to the '{AI_BACKEND}' backend...")
+
+    start = time.perf_counter()
     try:
         # Use gemini-2.0-flash for consistency with previous instructions if needed,
         # but the user provided openai code, so sticking to that.
         # If you need to switch to Gemini, the fetch API call would be different.
-        response = client.chat.completions.create(
-            model="gpt-4o-mini", # Using the model specified by the user
-            messages=[
-                {"role": "system", "content": "You are a trusted AI health assistant that outputs valid JSON."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7,
-            max_tokens=1500,
+        # Rate-limited, retried and coalesced with identical in-flight requests
+        response = run_sync(asyncio.wait_for(get_backend().chat(
+            MODEL,
+            messages,
+            temperature=TEMPERATURE,
+            max_tokens=MAX_TOKENS,
             response_format={"type": "json_object"} # Crucial for structured output
-        )
+        ), AI_LATENCY_BUDGET_SECONDS or None))
+    except TimeoutError:
+        breaker.record_failure()
+        _record_call(report_id, "sync", "timeout", cache_status, latency_ms=(time.perf_counter() - start) * 1000)
+        return _unavailable(extracted_data, use_rules, "latency_budget")
+    except Exception as e:
+        breaker.record_failure()
+        _record_call(report_id, "sync", "error", cache_status, latency_ms=(time.perf_counter() - start) * 1000)
+        print(f"AI Recommendation Engine: Error calling the LLM backend: {type(e).__name__}: {e}")
+        return _unavailable(extracted_data, use_rules, "error")
+    breaker.record_success()
+
+    try:
+        if response.retries:
+            pipeline_tracing.annotate(llm_retries=response.retries)
+        if response.coalesced:
+            pipeline_tracing.annotate(llm_coalesced=True)
 
-        ai_response_content = response.choices[0].message.content
         print("AI Recommendation Engine: Raw AI response received.")
-        
-        # Attempt to parse the JSON response
-        parsed_response = json.loads(ai_response_content)
-        print(f"AI Recommendation Engine: Parsed AI response: {parsed_response}")
-        # Validate expected keys
-        required_keys = ['treatment_suggestions', 'lifestyle_recommendations', 'priority']
-        if all(key in parsed_response for key in required_keys):
-            print("AI Recommendation Engine: Successfully parsed AI recommendations.")
-            return {
-                'treatment_suggestions': parsed_response.get('treatment_suggestions', ''),
-                'lifestyle_recommendations': parsed_response.get('lifestyle_recommendations', ''),
-                'priority': parsed_response.get('priority', 'Medium') # Default to Medium if not provided
-            }
-        else:
-            print(f"AI Recommendation Engine: Missing required keys in AI response: {parsed_response.keys()}")
+        recommendations = parse_ai_response(response.content)
+        _record_call(report_id, "sync", "ok" if recommendations else "invalid", cache_status, response)
+        if recommendations is None:
             return None
-
-    except json.JSONDecodeError as e:
-        print(f"AI Recommendation Engine: Failed to parse AI response as JSON: {e}")
-        print(f"Raw AI content: {ai_response_content[:500]}...")
-        return None
+        pipeline_tracing.annotate(recommendation_source="llm")
+        if cache:
+            cache.put(cache_key, MODEL, TEMPERATURE, recommendations,
+                      total_tokens=response.total_tokens, latency_ms=response.latency_ms)
+        return recommendations
     except Exception as e:
-        print(f"AI Recommendation Engine: Error calling OpenAI API: {e}")
+        print(f"AI Recommendation Engine: Error handling the AI response: {type(e).__name__}: {e}")
         return None
 
+class RecommendationStream:
+    """
+    A model call whose answer is shown while it is generated (see stream_ai_recommendations).
+
+    Iterating yields snapshots of the fields parsed so far – partial
+    'treatment_suggestions' / 'lifestyle_recommendations' text, 'priority'
+    once known. Afterwards `result` holds the validated recommendations
+    (None on failure, with the reason in `error`); nothing is persisted here
+    apart from the response cache.
+    """
+
+    def __init__(self, extracted_data: dict, report_id: str = None):
+        self.extracted_data = extracted_data
+        self.report_id = report_id
+        self.result = None
+        self.error = None
+        self.first_token_ms = None   # perceived latency: time until the first text
+        self.total_ms = None
+
+    def __iter__(self):
+        from services.llm_cache import LLMResponseCache # Lazy imports
+        from services.llm_client import iterate_sync
+        from utils.streaming_json import PartialJSONObject
+
+        messages = build_messages(self.extracted_data)
+        cache = LLMResponseCache() if LLM_CACHE_ENABLED else None
+        cache_status = "bypass" if cache else None
+        if not breaker.allow():
+            pipeline_tracing.annotate(llm_unavailable="breaker_open")
+            _record_call(self.report_id, "stream", "breaker_open", cache_status)
+            self.error = "The AI service is temporarily unavailable."
+            return
+        if cache:
+            cache.record_bypass()
+
+        print(f"AI Recommendation Engine: Streaming prompt to the '{AI_BACKEND}' backend...")
+        parser = PartialJSONObject()
+        content = ""
+        usage = {}
+        start = time.perf_counter()
+        stream = None
+        reported = False  # the breaker and llm_calls have this call's outcome
+        try:
+            try:
+                deltas = get_backend().stream_chat(MODEL, messages, temperature=TEMPERATURE, max_tokens=MAX_TOKENS,
+                                                   response_format={"type": "json_object"}, usage=usage)
+                # The latency budget applies to the first token; after that the doctor is reading along
+                stream = iterate_sync(deltas, AI_LATENCY_BUDGET_SECONDS or None)
+                for delta in stream:
+                    if self.first_token_ms is None:
+                        self.first_token_ms = (time.perf_counter() - start) * 1000
+                    content += delta
+                    if parser.feed(delta):
+                        yield dict(parser.values)
+            except TimeoutError:
+                breaker.record_failure()
+                reported = True
+                self._record("timeout", cache_status, start, usage)
+                self.error = "The AI service did not respond in time."
+                return
+            except Exception as e:
+                breaker.record_failure()
+                reported = True
+                self._record("error", cache_status, start, usage)
+                print(f"AI Recommendation Engine: Error streaming from the LLM backend: {type(e).__name__}: {e}")
+                self.error = "The AI service could not be reached."
+                return
+            breaker.record_success()
+            reported = True
+            self.total_ms = (time.perf_counter() - start) * 1000
+
+            self.result = parse_ai_response(content)
+            self._record("ok" if self.result else "invalid", cache_status, start, usage)
+            if self.result is None:
+                self.error = "The AI answer was incomplete or malformed."
+            elif cache:
+                cache.put(cache.make_key(MODEL, TEMPERATURE, messages), MODEL, TEMPERATURE, self.result,
+                          latency_ms=self.total_ms)
+        finally:
+            if not reported:
+                # Closed before the answer was complete (e.g. a Streamlit rerun): no outcome to report
+                if stream is not None:
+                    stream.close()  # cancels the HTTP stream
+                breaker.release()
+                self._record("abandoned", cache_status, start, usage)
+                self.error = "The AI answer was abandoned before it was complete."
+
+    def _record(self, status: str, cache_status: str, start: float, usage: dict):
+        _record_call(self.report_id, "stream", status, cache_status,
+                     latency_ms=(time.perf_counter() - start) * 1000, first_token_ms=self.first_token_ms,
+                     prompt_tokens=usage.get("prompt_tokens"), completion_tokens=usage.get("completion_tokens"),
+                     retries=usage.get("retries", 0))
+
+def stream_ai_recommendations(extracted_data: dict, report_id: str = None) -> RecommendationStream:
+    """
+    Streaming counterpart of generate_ai_recommendations(..., bypass_cache=True, use_rules=False)
+    for a doctor asking for a fresh suggestion: text can be shown from the first token on.
+    """
+    return RecommendationStream(extracted_data, report_id)
+
 # # Example usage for testing (can be run directly for debugging)
 # if __name__ == "__main__":
 #     # Dummy extracted data for testing
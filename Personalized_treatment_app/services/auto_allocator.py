@@ -1,9 +1,6 @@
 # services/auto_allocator.py
-import datetime
 import os
 
-from streamlit import success
-
 
    # Assuming recommendations are created after AI analysis
     
@@ -13,13 +10,12 @@ def auto_assign_doctor(report_id: str) -> bool:
     from models.health_report import HealthReport
     from models.doctor import Doctor
     from models.report_specialist_mapping import ReportSpecialistMapping
-    from models.recommendation import Recommendation 
-    from models.patient_doctor_mapping import PatientDoctorMapping
    
     """
     Automates the assignment of a doctor to a health report based on its type and doctor availability/specialization.
     This function should be called after a report's data has been extracted.
-    It updates the HealthReport with the assigned doctor and creates a PatientDoctorMapping.
+    The doctor with the fewest pending reviews is claimed atomically (Doctor.claim_for_report),
+    which updates the HealthReport with the assigned doctor and creates a PatientDoctorMapping.
     Returns the doctor_id of the assigned doctor, or None if no doctor could be assigned.
     """
     print(f"Auto-assigning doctor for report {report_id}...")
@@ -46,16 +42,11 @@ def auto_assign_doctor(report_id: str) -> bool:
 
     print(f"Auto-allocation: Required specialization for '{report.report_type}' is '{required_specialization}'.")
 
-    # 2. Select a suitable doctor
-    # Get available doctors matching the specialization, sorted by last assignment date
-    available_doctors = Doctor.get_available_doctors_by_specialization(required_specialization)
+    # 2. Claim the least-loaded available doctor (fewest pending reviews) in one transaction,
+    #    so concurrent uploads can't pile onto the same doctor or assign a report twice
+    assigned_doctor = Doctor.claim_for_report(report_id, required_specialization)
 
-    assigned_doctor = None
-    if available_doctors:
-        # Simple selection: pick the first available doctor (who has the oldest last assignment date or is unassigned)
-        assigned_doctor = available_doctors[0]
-        print(f"Auto-allocation: Found suitable doctor {assigned_doctor.user_id} (ID: {assigned_doctor.doctor_id}) with specialization '{assigned_doctor.specialization}'.")
-    else:
+    if not assigned_doctor:
         print(f"Auto-allocation: No available doctor found for specialization '{required_specialization}'.")
         # Fallback: Flag for manual assignment, or assign to a default doctor/admin for triage
         report.processing_status = 'pending_manual_assignment' # A new status for this case
@@ -63,68 +54,11 @@ def auto_assign_doctor(report_id: str) -> bool:
         print(f"Auto-allocation: Report {report_id} flagged for manual assignment due to no available doctors.")
         return False
 
-    # 3. Assign the doctor to the report and update doctor's last assignment time
-    if assigned_doctor:
-        report.assigned_doctor_id = assigned_doctor.doctor_id
-        
-        # Update the report's processing status if it was extracted and not pending manual assignment
-        # This is where you might set it to 'assigned_to_doctor' or keep 'extracted' and let recommendation status drive
-        # For now, let's just ensure the assigned_doctor_id is set and status remains 'extracted' before AI.
-        
-        if report.update():
-            # Update doctor's last assignment date
-            assigned_doctor.last_assignment_date = datetime.datetime.now(datetime.timezone.utc).isoformat()
-            assigned_doctor.update()
-
-             # Ensure patient-doctor mapping exists
-            PatientDoctorMapping.create(report.patient_id, assigned_doctor.doctor_id)
-           
-               # ✅ Add patient-doctor mapping if not exists
-            existing_mapping = PatientDoctorMapping.find_active_mapping(report.patient_id, assigned_doctor.doctor_id)
-            if not existing_mapping:
-                print(f"Creating patient-doctor mapping: patient={report.patient_id}, doctor={assigned_doctor.doctor_id}")
-                mapping = PatientDoctorMapping(patient_id=report.patient_id, doctor_id=assigned_doctor.doctor_id)
-                mapping_success = mapping.save()
-                print(f"✅ Patient-doctor mapping created: {mapping.patient_id} -> {mapping.doctor_id}")
-                if mapping_success:
-                    print(f"✅ Mapping saved for patient {report.patient_id} and doctor {assigned_doctor.doctor_id}")
-                else:
-                    print("❌ Failed to save patient-doctor mapping")
-            else:
-                print("Active mapping already exists.")
-
-            # If a recommendation already exists for this report (e.g., from AI),
-            # link the doctor to it if it's currently unassigned or pending review.
-
-            # # Handle recommendation assignment
-            # # This assumes a recommendation exists for the report, which should be the case after AI generation.
-            # recommendation = Recommendation.find_by_report_id(report_id)
-            # if recommendation:
-            #     if recommendation.doctor_id is None or recommendation.status == 'AI_generated':
-            #         recommendation.update_status(
-            #             new_status='pending_doctor_review',
-            #             doctor_id=assigned_doctor.doctor_id)
-            #     print(f"Auto-allocation: Recommendation for report {report_id} linked to doctor {assigned_doctor.doctor_id} and status updated to 'pending_doctor_review'.")
-
-            # else:
-            #     # Recommendation doesn't exist, create one with doctor assigned
-            #     Recommendation.create(
-            #         report_id=report.report_id,
-            #         patient_id=report.patient_id,
-            #         doctor_id=assigned_doctor.doctor_id,
-            #         ai_generated_treatment="Auto-generated treatment",
-            #         ai_generated_lifestyle="Auto-generated lifestyle",
-            #         ai_generated_priority="Medium",
-            #         status="pending_doctor_review"
-            #     )
-            #     print(f"Created new recommendation for report {report.report_id} with doctor {assigned_doctor.doctor_id}.")
-
-            print(f"Auto-allocation complete for report {report_id}.")
-            return True
-        else:
-            print(f"Auto-allocation: Failed to update report {report_id} with assigned doctor.")
-            return False
-    return False
+    # The claim also set the doctor's last assignment time and the patient-doctor mapping
+    print(f"Auto-allocation: Assigned doctor {assigned_doctor.user_id} (ID: {assigned_doctor.doctor_id}) "
+          f"with specialization '{assigned_doctor.specialization}'.")
+    print(f"Auto-allocation complete for report {report_id}.")
+    return True
 
 # Example of how you might populate report_specialist_mapping (run once or from admin interface)
 def populate_default_specialist_mappings():
@@ -144,14 +78,14 @@ def populate_default_specialist_mappings():
         "eye_test": "Ophthalmologist",
         "hearing_test": "ENT Specialist",
         "others test": "General Physician",  # Fallback for unclassified tests
+        "Other Test": "General Physician",  # Label used by the patient upload form
         "urine_test": "Nephrologist",  # Example for urine tests
         "stool_test": "Gastroenterologist",  # Example for stool tests
         # Add more as needed
     }
-    for report_type, specialization in mappings.items():
-        if not ReportSpecialistMapping.get_specialization_by_report_type(report_type):
-            ReportSpecialistMapping.create(report_type, specialization)
-            print(f"Added mapping: {report_type} -> {specialization}")
-        else:
-            print(f"Mapping already exists for {report_type}.")
+    # One bulk upsert instead of a SELECT (+ INSERT) per mapping; existing rows are kept
+    if ReportSpecialistMapping.bulk_upsert(mappings):
+        print(f"Default specialist mappings ensured ({len(mappings)} report types).")
+    else:
+        print("Failed to seed default specialist mappings.")
 
@@ -0,0 +1,90 @@
+# services/circuit_breaker.py
+"""
+Circuit breaker for calls to an external service (the LLM backend).
+
+    closed     calls go through; `failure_threshold` failures in a row open the breaker
+    open       calls are refused at once, for `reset_timeout` seconds
+    half_open  one trial call is let through: success closes the breaker,
+               failure opens it again; a trial that reports neither within
+               `reset_timeout` (e.g. an abandoned stream) is given up and
+               another one is let through
+
+Callers ask `allow()` before calling and report the outcome with
+`record_success()` / `record_failure()`, or `release()` a call that ended
+without one (it was abandoned). Thread-safe: the pipeline's stages
+run on several threads.
+"""
+import threading
+import time
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._trial_started_at = 0.0
+        self.counters = {"allowed": 0, "rejected": 0, "failures": 0, "opened": 0}
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def _maybe_half_open(self):
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = HALF_OPEN
+            self._trial_in_flight = False
+
+    def allow(self) -> bool:
+        """True if a call may go ahead now (in half_open, only the single trial call)."""
+        with self._lock:
+            self._maybe_half_open()
+            now = time.monotonic()
+            trial_lost = self._trial_in_flight and now - self._trial_started_at >= self.reset_timeout
+            if self._state == CLOSED or (self._state == HALF_OPEN and (not self._trial_in_flight or trial_lost)):
+                self._trial_in_flight = self._state == HALF_OPEN
+                self._trial_started_at = now
+                self.counters["allowed"] += 1
+                return True
+            self.counters["rejected"] += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def release(self):
+        """The allowed call ended without an outcome: frees the half-open trial for the next call."""
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.counters["failures"] += 1
+            self._failures += 1
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    self.counters["opened"] += 1
+                    print(f"[CircuitBreaker] Opened after {self._failures} failure(s); "
+                          f"retrying in {self.reset_timeout:g}s.")
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+                self._trial_in_flight = False
+
+    def seconds_until_retry(self) -> float:
+        """Seconds until an open breaker lets a trial call through (0 if calls are allowed)."""
+        with self._lock:
+            if self._state != OPEN:
+                return 0.0
+            return max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
@@ -6,6 +6,8 @@ from datetime import datetime
 from typing import Dict, Any, Optional, Tuple
 import streamlit as st
 
+from services import pipeline_tracing
+
 # Import the specific extractors from the new extraction sub-package
 
 
@@ -17,7 +19,29 @@ class DocumentParser:
     """
 
     @staticmethod
-    def parse_report(file_path: str) -> Dict[str, Any]:
+    def _structured_result(structured: Dict[str, Any]) -> Dict[str, Any]:
+        """Build the parse_report result for a CSV/JSON upload mapped by StructuredExtractor."""
+        from services.extraction.metric_extractor import MetricExtractor
+        from services.extraction.patient_info_extractor import PatientInfoExtractor
+        from utils.flagging import flag_metrics
+        from utils.metrics import EXTRACTOR_VERSION
+        patient_info = {key: None for key in PatientInfoExtractor.extract_patient_info("")}
+        patient_info.update(structured["patient_info"])
+        values = MetricExtractor.derive_ratios(structured["values"])
+        # Compact text view of what was found (kept for display / the pipeline's empty check)
+        lines = [f"{k}: {v}" for k, v in patient_info.items() if v]
+        lines += [f"{k}: {v}" for k, v in structured["values"].items() if v is not None]
+        return {
+            "patient_info": patient_info,
+            "metrics": flag_metrics(values),
+            "metric_values": values,
+            "metric_units": {},
+            "raw_text": "\n".join(lines),
+            "extractor_version": EXTRACTOR_VERSION,
+        }
+
+    @classmethod
+    def parse_report(cls, file_path: str) -> Dict[str, Any]:
         """
         Parses a given health report file, extracts patient information and metrics.
         
@@ -29,55 +53,107 @@ class DocumentParser:
                             Returns None for either if extraction fails.
         """
         raw_text = None
+        free_text = None  # raw_text minus table cells; the only part the alias scan needs
+        table_rows = []   # (test, value, unit, range) rows from PDF/DOCX tables
         patient_info: Dict[str, Optional[str]] = {}
         metrics: Dict[str, Tuple[str, str]] = {} # FlaggedMetric is Tuple[str, str]
+        metric_values: Dict[str, Optional[float]] = {} # numeric values behind `metrics` (for re-flagging)
+        metric_units: Dict[str, str] = {} # units of table-sourced values
 
         # 1. Extract raw text from the document
-        try:
-            from services.extraction.text_extractor import RawTextExtractor
-            # Check file extension to differentiate image from document types
-            ext = os.path.splitext(file_path.lower())[1]
-            if ext in ['.jpg', '.jpeg', '.png', '.gif']: # Add other image formats if supported by Tesseract
-                raw_text = RawTextExtractor.get_text_from_image(file_path)
-            else:
-                raw_text = RawTextExtractor.extract_text(file_path)
-            
-            if not raw_text or len(raw_text.strip()) < 20: # Basic check for meaningful text
-                st.warning(f"Could not extract sufficient text from {os.path.basename(file_path)}. It might be an image without proper OCR setup or an unreadable file.")
-                raw_text = "" # Ensure it's an empty string for subsequent steps
-        except ValueError as e:
-            st.error(f"Unsupported file type for text extraction: {ext}. Error: {e}")
-            return {"patient_info": {}, "metrics": {}} # Return empty data
-        except Exception as e:
-            st.error(f"Error during raw text extraction from {os.path.basename(file_path)}: {e}")
-            return {"patient_info": {}, "metrics": {}}
+        input_bytes = os.path.getsize(file_path) if os.path.exists(file_path) else None
+        with pipeline_tracing.span("text_extraction", input_bytes=input_bytes) as span:
+            try:
+                from services.extraction import sandbox
+                from services.extraction.text_extractor import RawTextExtractor
+                from services.extraction.structured_extractor import (
+                    StructuredExtractor, STRUCTURED_EXTENSIONS, MultipleRecordsError,
+                )
+                # Check file extension to differentiate image from document types
+                ext = os.path.splitext(file_path.lower())[1]
+                span.set(file_type=ext)
+                if ext in STRUCTURED_EXTENSIONS:
+                    # CSV/JSON: map columns/keys straight to metrics, no text round trip
+                    structured = StructuredExtractor.extract(file_path)
+                    if structured is not None and any(v is not None for v in structured["values"].values()):
+                        return cls._structured_result(structured)
+                if ext in ['.jpg', '.jpeg', '.png', '.gif']: # Add other image formats if supported by Tesseract
+                    # PDF/OCR libraries run in a worker process with time, memory and page limits
+                    raw_text, _ = sandbox.extract(file_path, image=True)
+                    free_text = raw_text
+                else:
+                    # Table cells are mapped to metrics directly; raw_text keeps free text + rows for display
+                    free_text, table_rows = sandbox.extract(file_path)
+                    raw_text = free_text
+                    if table_rows:
+                        raw_text = "\n".join(
+                            t for t in (free_text, RawTextExtractor.rows_to_text(table_rows)) if t
+                        )
+                
+                if not raw_text or len(raw_text.strip()) < 20: # Basic check for meaningful text
+                    st.warning(f"Could not extract sufficient text from {os.path.basename(file_path)}. It might be an image without proper OCR setup or an unreadable file.")
+                    raw_text = "" # Ensure it's an empty string for subsequent steps
+                    span.status = "error"
+            except sandbox.ExtractionLimitExceeded as e:
+                span.status, span.error = "error", str(e)
+                span.set(limit_exceeded=e.limit)
+                st.error(f"{os.path.basename(file_path)} exceeds the extraction limits ({e.limit}: {e}).")
+                return {"patient_info": {}, "metrics": {}, "limit_exceeded": e.limit, "error": str(e)}
+            except MultipleRecordsError as e:
+                # Not split or merged: the rows may belong to different patients
+                span.status, span.error = "error", str(e)
+                st.error(f"{os.path.basename(file_path)} is not a single report: {e}.")
+                return {"patient_info": {}, "metrics": {}, "error": str(e)}
+            except ValueError as e:
+                span.status, span.error = "error", str(e)
+                st.error(f"Unsupported file type for text extraction: {ext}. Error: {e}")
+                return {"patient_info": {}, "metrics": {}} # Return empty data
+            except Exception as e:
+                span.status, span.error = "error", str(e)
+                st.error(f"Error during raw text extraction from {os.path.basename(file_path)}: {e}")
+                return {"patient_info": {}, "metrics": {}}
 
         # If text extraction was successful, proceed to extract info and metrics
         if raw_text:
             # 2. Extract patient meta-information
-            try:
-                from services.extraction.patient_info_extractor import PatientInfoExtractor
-                patient_info = PatientInfoExtractor.extract_patient_info(raw_text)
-            except Exception as e:
-                st.warning(f"Failed to extract patient info from {os.path.basename(file_path)}: {e}")
-                patient_info = {} # Ensure it's an empty dict
+            with pipeline_tracing.span("patient_info") as span:
+                try:
+                    from services.extraction.patient_info_extractor import PatientInfoExtractor
+                    patient_info = PatientInfoExtractor.extract_patient_info(raw_text)
+                except Exception as e:
+                    span.status, span.error = "error", str(e)
+                    st.warning(f"Failed to extract patient info from {os.path.basename(file_path)}: {e}")
+                    patient_info = {} # Ensure it's an empty dict
 
             # 3. Extract and flag health metrics
-            try:
-                from services.extraction.metric_extractor import MetricExtractor
-                # MetricExtractor expects either a path or raw text, since we have raw text, we pass it directly
-                metrics = MetricExtractor.extract_metrics(raw_text, is_path=False)
-            except Exception as e:
-                st.warning(f"Failed to extract health metrics from {os.path.basename(file_path)}: {e}")
-                metrics = {} # Ensure it's an empty dict
+            with pipeline_tracing.span("metric_parsing", table_rows=len(table_rows)) as span:
+                try:
+                    from services.extraction.metric_extractor import MetricExtractor
+                    # MetricExtractor expects either a path or raw text, since we have raw text, we pass it directly.
+                    # Table rows are mapped first; the alias scan only runs on the free text for what is left.
+                    from utils.flagging import flag_metrics
+                    metric_values = MetricExtractor.derive_ratios(
+                        MetricExtractor.extract_values(free_text or "", is_path=False, table_rows=table_rows)
+                    )
+                    metrics = flag_metrics(metric_values)
+                    metric_units = MetricExtractor.units_from_table_rows(table_rows)
+                except Exception as e:
+                    span.status, span.error = "error", str(e)
+                    st.warning(f"Failed to extract health metrics from {os.path.basename(file_path)}: {e}")
+                    metrics = {} # Ensure it's an empty dict
+                    metric_values = {}
         else:
             st.warning(f"No text extracted from {os.path.basename(file_path)}. Skipping patient info and metric extraction.")
 
 
+        from utils.metrics import EXTRACTOR_VERSION
         return {
             "patient_info": patient_info,
             "metrics": metrics,
-            "raw_text": raw_text # Optionally include raw text for debugging/display
+            "metric_values": metric_values,
+            "metric_units": metric_units,
+            "raw_text": raw_text, # Optionally include raw text for debugging/display
+            "extractor_version": EXTRACTOR_VERSION, # lets the backfill find stale extractions
         }
     
     @classmethod
@@ -86,105 +162,258 @@ class DocumentParser:
         Orchestrates full processing:
         1. Loads report
         2. Extracts data
-        3. Saves to DB
-        4. Generates AI recommendations
-        5. Saves/updates recommendations
-        6. Triggers doctor auto-allocation
+        3. Saves to DB, then triggers doctor auto-allocation
+        4. Generates AI recommendations (concurrently with step 3 – it only needs the extracted data)
+        5. Saves/updates recommendations once both branches have finished
+
+        Each stage is timed and stored in pipeline_runs (see services/pipeline_tracing.py).
+        Stage outputs are checkpointed on the report, so running the pipeline again
+        (e.g. via retry_stuck_reports) resumes at the first incomplete stage.
         """
         from models.health_report import HealthReport
-        from models.recommendation import Recommendation
-        from services.ai_recommendation_engine import generate_ai_recommendations
-        from services.auto_allocator import auto_assign_doctor
+        from services.pipeline_tracing import PipelineTrace
         report = HealthReport.get_by_report_id(report_id)
         if not report:
             print(f"[DocumentParser] Report {report_id} not found.")
             return False
+        # Stamp the marker as the run starts: retry_stuck_reports leaves recently touched reports alone
+        report.update_pipeline_stage(report.next_pipeline_stage())
+
+        # The trace is saved on every exit path, including failures
+        with PipelineTrace(report_id):
+            try:
+                return cls._run_pipeline_stages(report)
+            finally:
+                # Record where the pipeline got to from what was actually persisted
+                latest = HealthReport.get_by_report_id(report_id)
+                if latest:
+                    latest.update_pipeline_stage(latest.next_pipeline_stage())
+
+    @staticmethod
+    def _allocate_doctor(report_id: str):
+        """Allocation stage: returns the re-fetched report with its assigned doctor, or None."""
+        from models.health_report import HealthReport
+        from services.auto_allocator import auto_assign_doctor
+        print(f"DocumentParser: Triggering doctor auto-allocation for report {report_id}...")
+        assigned_doctor_id = auto_assign_doctor(report_id) # auto_assign_doctor now returns doctor_id
+
+        if not assigned_doctor_id:
+            pipeline_tracing.mark_error("no doctor assigned")
+            print(f"DocumentParser: No doctor could be assigned for report {report_id}. Skipping AI recommendation.")
+            # You might want to update report status to 'pending_manual_assignment' here
+            return None
+
+        # auto_assign_doctor saves the report itself; re-fetch to get the assigned_doctor_id
+        report = HealthReport.get_by_report_id(report_id)
+        if not report or not report.assigned_doctor_id:
+            pipeline_tracing.mark_error("no doctor assigned")
+            print(f"DocumentParser: Report {report_id} still has no assigned doctor after auto-allocation. Exiting pipeline.")
+            return None
+
+        print(f"DocumentParser: Doctor {report.assigned_doctor_id} assigned to report {report_id}.")
+        return report
+
+    @staticmethod
+    def _save_recommendation(report, ai_recommendations: dict) -> bool:
+        """Creates the report's recommendation, or resets an existing one for doctor review."""
+        from models.recommendation import Recommendation
+        report_id = report.report_id
+        print(f"DocumentParser: Creating/Updating recommendation for report {report_id} with AI data and assigned doctor...")
+        existing_recommendation = Recommendation.find_by_report_id(report_id)
+
+        if existing_recommendation:
+            updated = existing_recommendation.update_status(
+                new_status='pending_doctor_review',
+                doctor_id=report.assigned_doctor_id,
+                approved_treatment=ai_recommendations.get('treatment_suggestions', ''),
+                approved_lifestyle=ai_recommendations.get('lifestyle_recommendations', ''),
+                doctor_notes=''
+            )
+            if updated:
+                print(f"DocumentParser: Existing recommendation for report {report_id} updated successfully.")
+                return True
+            print(f"DocumentParser: Failed to update existing recommendation for report {report_id}.")
+            return False
+
+        new_rec = Recommendation.create(
+            report_id=report_id,
+            patient_id=report.patient_id,
+            doctor_id=report.assigned_doctor_id,
+            ai_generated_treatment=ai_recommendations.get('treatment_suggestions', ''),
+            ai_generated_lifestyle=ai_recommendations.get('lifestyle_recommendations', ''),
+            ai_generated_priority=ai_recommendations.get('priority', 'Medium'),
+            status='pending_doctor_review'
+        )
+        if new_rec:
+            print(f"DocumentParser: New recommendation created for report {report_id}.")
+            return True
+        print(f"DocumentParser: Failed to create recommendation for report {report_id}.")
+        return False
+
+    @classmethod
+    def _run_pipeline_stages(cls, report) -> bool:
+        from services.ai_recommendation_engine import generate_ai_recommendations
+        from services.stage_graph import StageGraph
+        report_id = report.report_id
+        resume_from = report.next_pipeline_stage()
 
-        print(f"[DocumentParser] 🔍 Processing report: {report.file_name} ({report.report_id})")
+        if resume_from == "completed":
+            print(f"[DocumentParser] Report {report_id} already has a recommendation; nothing to do.")
+            return True
 
-        # --- Step 1: Extract content
-        extracted = cls.parse_report(report.file_path)
+        # --- Step 1: Extract content (skipped when a previous run already persisted it)
+        if resume_from == "extraction":
+            print(f"[DocumentParser] 🔍 Processing report: {report.file_name} ({report.report_id})")
+            extracted = cls.parse_report(report.file_path)
 
-        if not extracted or not extracted.get("raw_text"):
-            report.processing_status = 'failed_extraction'
-            report.extracted_data_json = json.dumps({"error": "Extraction failed or empty content"})
+            if extracted and extracted.get("limit_exceeded"):
+                # Distinct status: retrying won't help, so retry_stuck_reports skips these
+                report.processing_status = 'failed_limits'
+                report.extracted_data_json = json.dumps(
+                    {"error": extracted.get("error"), "limit_exceeded": extracted["limit_exceeded"]})
+            elif not extracted or not extracted.get("raw_text"):
+                report.processing_status = 'failed_extraction'
+                report.extracted_data_json = json.dumps(
+                    {"error": (extracted or {}).get("error") or "Extraction failed or empty content"})
+            else:
+                report.processing_status = 'extracted'
+                report.extracted_data_json = json.dumps(extracted)
+            extraction_dirty = True
         else:
+            print(f"[DocumentParser] ⏩ Resuming report {report.file_name} ({report_id}) at stage '{resume_from}'.")
+            extracted = report.get_extracted_data()
+            # e.g. 'pending_manual_assignment' from a failed allocation goes back to 'extracted'
+            extraction_dirty = report.processing_status != 'extracted'
             report.processing_status = 'extracted'
-            report.extracted_data_json = json.dumps(extracted)
 
-        if not report.save():
-            print(f"[DocumentParser] ❌ Failed to update report with extracted data.")
-            return False
-        
-         # --- Step 2. Doctor Auto-Allocation (NEW ORDER) ---
-        # This happens AFTER extraction, but BEFORE AI recommendations.
-        # This will update report.assigned_doctor_id and create PatientDoctorMapping.
-        if report.processing_status == 'extracted':
-            print(f"DocumentParser: Triggering doctor auto-allocation for report {report_id}...")
-            assigned_doctor_id = auto_assign_doctor(report_id) # auto_assign_doctor now returns doctor_id
-            
-            if not assigned_doctor_id:
-                print(f"DocumentParser: No doctor could be assigned for report {report_id}. Skipping AI recommendation.")
-                # You might want to update report status to 'pending_manual_assignment' here
-                return False
-            
-            # Re-fetch report to get the updated assigned_doctor_id if auto_assign_doctor saves it
-            # Or, rely on the fact that auto_assign_doctor directly updates the HealthReport object.
-            # Assuming auto_assign_doctor correctly updates `report.assigned_doctor_id` in the DB and potentially the in-memory object.
-            # For safety, let's re-fetch the report or ensure the object is updated.
-            # The current auto_assign_doctor saves the report itself, so this object should be fine.
-            report = HealthReport.get_by_report_id(report_id) # Re-fetch to ensure assigned_doctor_id is up-to-date
-            
-            if not report.assigned_doctor_id:
-                print(f"DocumentParser: Report {report_id} still has no assigned doctor after auto-allocation. Exiting pipeline.")
+        # --- Steps 2-4 as a dependency graph:
+        #   db_write_extraction ──> allocation ──┐
+        #   ai_generation ───────────────────────┴──> db_write_recommendation (after the join)
+        # AI generation only needs the extracted data, so it overlaps the DB write and allocation.
+        def write_extraction():
+            from models.metric_observation import MetricObservation
+            if not extraction_dirty:
+                return True
+            if not report.save():
+                pipeline_tracing.mark_error("report save failed")
                 return False
+            # Numeric values / units / flags, queryable and re-flaggable without re-parsing
+            if resume_from == "extraction":
+                MetricObservation.replace_for_report(report_id, (extracted or {}).get("metric_values"),
+                                                     (extracted or {}).get("metric_units"))
+            return True
 
-            print(f"DocumentParser: Doctor {report.assigned_doctor_id} assigned to report {report_id}.")
+        def allocate(db_write_extraction):
+            if not db_write_extraction:
+                return None
+            if report.assigned_doctor_id:
+                pipeline_tracing.annotate(resumed=True)
+                return report
+            return cls._allocate_doctor(report_id)
 
-        # --- Step 2: AI Recommendation
-        if report.processing_status == 'extracted':
+        def generate():
+            checkpoint = report.get_ai_output()
+            if checkpoint:
+                pipeline_tracing.annotate(resumed=True)
+                return checkpoint
             print(f"DocumentParser: Generating AI recommendations for report {report_id}...")
-            ai_recommendations = generate_ai_recommendations(extracted)
-
+            ai_recommendations = generate_ai_recommendations(extracted, report_id=report_id)
             if ai_recommendations:
-                print(f"DocumentParser: Creating/Updating recommendation for report {report_id} with AI data and assigned doctor...")
-                existing_recommendation = Recommendation.find_by_report_id(report.report_id)
-
-                if existing_recommendation:
-                    updated = existing_recommendation.update_status(
-                        new_status='pending_doctor_review',
-                        doctor_id=report.assigned_doctor_id,
-                        approved_treatment=ai_recommendations.get('treatment_suggestions', ''),
-                        approved_lifestyle=ai_recommendations.get('lifestyle_recommendations', ''),
-                        doctor_notes=''
-                    )
-                    if updated:
-                        print(f"DocumentParser: Existing recommendation for report {report_id} updated successfully.")
-                    else:
-                        print(f"DocumentParser: Failed to update existing recommendation for report {report_id}.")
-                else:
-                    new_rec = Recommendation.create(
-                        report_id=report.report_id,
-                        patient_id=report.patient_id,
-                        doctor_id=report.assigned_doctor_id,
-                        ai_generated_treatment=ai_recommendations.get('treatment_suggestions', ''),
-                        ai_generated_lifestyle=ai_recommendations.get('lifestyle_recommendations', ''),
-                        ai_generated_priority=ai_recommendations.get('priority', 'Medium'),
-                        status='pending_doctor_review'
-                    )
-                    if new_rec:
-                        print(f"DocumentParser: New recommendation created for report {report_id}.")
-                    else:
-                        print(f"DocumentParser: Failed to create recommendation for report {report_id}.")
+                report.save_ai_output(ai_recommendations)
             else:
-                print(f"DocumentParser: AI recommendation engine returned no results for report {report_id}.")
-        else:
+                pipeline_tracing.mark_error("no AI output")
+            return ai_recommendations
+
+        graph = StageGraph().add("db_write_extraction", write_extraction)
+        if report.processing_status == 'extracted':
+            graph.add("allocation", allocate, deps=("db_write_extraction",))
+            graph.add("ai_generation", generate)
+        results = graph.run()
+
+        if not results["db_write_extraction"]:
+            print(f"[DocumentParser] ❌ Failed to update report with extracted data.")
+            return False
+
+        if report.processing_status != 'extracted':
             print(f"DocumentParser: Skipping doctor assignment and AI generation — status not extracted.")
+            return True
+
+        # --- Join: the recommendation needs both the assigned doctor and the AI output
+        assigned_report = results["allocation"]
+        if assigned_report is None:
+            return False
+
+        ai_recommendations = results["ai_generation"]
+        if not ai_recommendations:
+            # Parked for the sweeper (sweep_pending_ai), which resumes it at ai_generation
+            print(f"DocumentParser: AI recommendation engine returned no results for report {report_id}; marked pending_ai.")
+            assigned_report.update_processing_status('pending_ai')
+            return True
+
+        with pipeline_tracing.span("db_write_recommendation"):
+            if not cls._save_recommendation(assigned_report, ai_recommendations):
+                pipeline_tracing.mark_error("recommendation save failed")
 
         return True
 
+    @classmethod
+    def retry_stuck_reports(cls, stage: str, older_than_minutes: int = 5) -> Dict[str, int]:
+        """
+        Re-runs the pipeline for every report stuck at `stage`; each resumes from its
+        checkpoint. Reports whose marker changed in the last `older_than_minutes`
+        may still be in flight and are left alone.
+        Reports marked 'failed_limits' are skipped.
+        Returns {"retried": n, "completed": n, "still_stuck": n, "skipped_limits": n}.
+        """
+        from datetime import timedelta
+        from models.health_report import HealthReport
+        cutoff = (datetime.now() - timedelta(minutes=older_than_minutes)).isoformat()
+        stuck = HealthReport.find_stuck_in_stage(stage, updated_before=cutoff)
+        # Reports over the extraction limits would only hit them again
+        reports = [r for r in stuck if r.processing_status != 'failed_limits']
+        print(f"[DocumentParser] Retrying {len(reports)} report(s) stuck at '{stage}'...")
+
+        summary = {"retried": 0, "completed": 0, "still_stuck": 0, "skipped_limits": len(stuck) - len(reports)}
+        for report in reports:
+            cls.process_report_pipeline(report.report_id)
+            summary["retried"] += 1
+            latest = HealthReport.get_by_report_id(report.report_id)
+            if latest and latest.pipeline_stage == "completed":
+                summary["completed"] += 1
+            else:
+                summary["still_stuck"] += 1
+        print(f"[DocumentParser] Retry of '{stage}' finished: {summary}")
+        return summary
+
+    @classmethod
+    def sweep_pending_ai(cls) -> Dict[str, int]:
+        """
+        Fills in the recommendations of reports parked as 'pending_ai' (the LLM was
+        unavailable or over its latency budget), resuming each at ai_generation.
+        Stops as soon as the AI circuit breaker is open: the rest waits for the next sweep.
+        Returns {"pending": n, "completed": n, "still_pending": n, "deferred": n}.
+        """
+        from models.health_report import HealthReport
+        from services.ai_recommendation_engine import breaker
+        from services.circuit_breaker import OPEN
+        reports = HealthReport.find_by_status('pending_ai')
+        summary = {"pending": len(reports), "completed": 0, "still_pending": 0, "deferred": 0}
+        for i, report in enumerate(reports):
+            if breaker.state == OPEN:
+                summary["deferred"] = len(reports) - i
+                break
+            cls.process_report_pipeline(report.report_id)
+            latest = HealthReport.get_by_report_id(report.report_id)
+            if latest and latest.pipeline_stage == "completed":
+                summary["completed"] += 1
+            else:
+                summary["still_pending"] += 1
+        if reports:
+            print(f"[DocumentParser] Pending AI sweep finished: {summary}")
+        return summary
+
         # # --- Step 3: Auto-allocate to doctor
         # print(f"[DocumentParser] ⚙️ Triggering doctor allocation...")
         # auto_assign_doctor(report.report_id)
         # print(f"[DocumentParser] ✅ Auto-assignment completed for report {report.report_id}")
-        # return True
\ No newline at end of file
+        # return True
@@ -0,0 +1,197 @@
+"""
+Columnar, vectorised counterpart of `MetricExtractor` for many documents.
+
+    values = BatchMetricExtractor.extract_values(texts)        # one row per text, one column per metric
+    values = BatchMetricExtractor.derive_ratios(values)        # lipid ratios as column operations
+    flags  = BatchMetricExtractor.flag(values)                 # 'normal' / 'low' / 'high' / 'no_ref', NaN if missing
+
+All texts are exploded into one Series of lines and every alias is matched
+with a single pandas string operation over that Series, instead of a
+lines × aliases Python loop per document. Results are identical to
+`MetricExtractor.extract_values` / `derive_ratios` / `flag_code`.
+"""
+from __future__ import annotations
+
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from utils.metrics import METRIC_ALIASES, ALIAS_LOOKUP, REF_RANGES
+from utils.flagging import FLAG_NORMAL, FLAG_LOW, FLAG_HIGH, FLAG_NO_REF
+from .metric_extractor import MetricExtractor
+from .text_extractor import TableRow
+
+_NUMBER_PATTERN = r"([-+]?[0-9]*\.?[0-9]+)"
+_METRICS = list(METRIC_ALIASES)
+
+# (ratio, numerator, denominator) – same derivations as MetricExtractor.derive_ratios
+_RATIOS = [
+    ("LDL/HDL Ratio", "LDL", "HDL"),
+    ("Total Cholesterol/HDL Ratio", "Total Cholesterol", "HDL"),
+    ("TG/HDL Ratio", "Triglycerides", "HDL"),
+]
+
+
+def _first_number(segments: pd.Series) -> pd.Series:
+    """Vectorised MetricExtractor._clean_number."""
+    found = segments.str.replace(",", "", regex=False).str.extract(_NUMBER_PATTERN, expand=False)
+    return pd.to_numeric(found, errors="coerce")
+
+
+def _round2(series: pd.Series) -> pd.Series:
+    # Python's round() (correctly rounded) rather than NumPy's scale-and-rint, so
+    # half-way cases match MetricExtractor.derive_ratios exactly
+    return series.map(lambda x: round(x, 2))
+
+
+def _first_per_metric(candidates: List[pd.DataFrame], n_docs: int) -> pd.DataFrame:
+    """Earliest (line, alias order) candidate per document and metric, pivoted to columns."""
+    frame = pd.DataFrame(index=pd.RangeIndex(n_docs), columns=_METRICS, dtype=float)
+    if not candidates:
+        return frame
+    found = pd.concat(candidates, ignore_index=True).dropna(subset=["value"])
+    if found.empty:
+        return frame
+    found = (found.sort_values(["doc", "line", "alias_rank"], kind="stable")
+                  .drop_duplicates(["doc", "metric"]))
+    wide = found.pivot(index="doc", columns="metric", values="value")
+    return frame.combine_first(wide)[_METRICS]
+
+
+class BatchMetricExtractor:
+    @staticmethod
+    def _lines(texts: Sequence[str]) -> pd.DataFrame:
+        """One row per (document, line) with the line's position in its document."""
+        lines = pd.Series([t or "" for t in texts], dtype=object).map(str.splitlines).explode()
+        lines = lines.dropna()
+        frame = pd.DataFrame({"doc": lines.index.to_numpy(), "raw": lines.to_numpy(dtype=object)})
+        frame["line"] = frame.groupby("doc").cumcount()
+        return frame
+
+    @staticmethod
+    def _free_text_pass(lines: pd.DataFrame) -> List[pd.DataFrame]:
+        # Pass 1 of MetricExtractor.extract_values: alias anywhere on a normalised line.
+        # Lab reports repeat many lines verbatim (headers, labels), so each distinct
+        # line is matched once and the result is mapped back to every occurrence.
+        norm = lines["raw"].str.lower().str.replace(r"[\-–=|]+", ":", regex=True)
+        codes, uniques = pd.factorize(norm)
+        uniques = pd.Series(uniques, dtype=object)
+        occurrences = pd.DataFrame({"code": codes, "doc": lines["doc"].to_numpy(),
+                                    "line": lines["line"].to_numpy()})
+
+        matches = []
+        for rank, (alias, canonical) in enumerate(ALIAS_LOOKUP.items()):
+            # Cheap substring test first; the word-boundary regex only runs on those lines
+            near = uniques[uniques.str.contains(alias, regex=False)]
+            if near.empty:
+                continue
+            hit = near[near.str.contains(rf"\b{re.escape(alias)}\b", regex=True)]
+            if hit.empty:
+                continue
+            matches.append(pd.DataFrame({
+                "code": hit.index, "alias_rank": rank, "metric": canonical,
+                "value": _first_number(hit.str.partition(alias)[2]).to_numpy(),
+            }))
+        if not matches:
+            return []
+        found = pd.concat(matches, ignore_index=True).dropna(subset=["value"])
+        return [occurrences.merge(found, on="code").drop(columns="code")]
+
+    @staticmethod
+    def _pipe_table_pass(lines: pd.DataFrame) -> List[pd.DataFrame]:
+        # Pass 2: pipe-delimited lines, alias contained in the first cell, value in the second
+        raw = lines["raw"]
+        table = lines[raw.str.contains("|", regex=False) & (raw.str.len() >= 10)]
+        if table.empty:
+            return []
+        codes, uniques = pd.factorize(table["raw"])
+        cells = pd.Series(uniques, dtype=object).str.strip().str.strip("|").str.split("|")
+        cells = cells[cells.str.len() >= 2]
+        metric_text = cells.str[0].str.strip().str.lower()
+        value_text = cells.str[1].str.strip().str.lower()
+
+        matches = []
+        for rank, (alias, canonical) in enumerate(ALIAS_LOOKUP.items()):
+            hit = metric_text.str.contains(alias, regex=False)
+            if not hit.any():
+                continue
+            matches.append(pd.DataFrame({
+                "code": metric_text.index[hit], "alias_rank": rank, "metric": canonical,
+                "value": _first_number(value_text[hit]).to_numpy(),
+            }))
+        if not matches:
+            return []
+        found = pd.concat(matches, ignore_index=True).dropna(subset=["value"])
+        occurrences = pd.DataFrame({"code": codes, "doc": table["doc"].to_numpy(),
+                                    "line": table["line"].to_numpy()})
+        return [occurrences.merge(found, on="code").drop(columns="code")]
+
+    @staticmethod
+    def extract_values(texts: Sequence[str],
+                       table_rows: Optional[Sequence[List[TableRow]]] = None) -> pd.DataFrame:
+        """
+        Numeric value per document (row, in input order) and canonical metric
+        (column); NaN where missing. `table_rows[i]` (optional) are mapped first,
+        like MetricExtractor.extract_values(..., table_rows=...).
+        """
+        n_docs = len(texts)
+        lines = BatchMetricExtractor._lines(texts)
+        free = _first_per_metric(BatchMetricExtractor._free_text_pass(lines), n_docs)
+        piped = _first_per_metric(BatchMetricExtractor._pipe_table_pass(lines), n_docs)
+        values = free.combine_first(piped)
+
+        if table_rows is not None:
+            tables = pd.DataFrame(
+                [MetricExtractor.values_from_table_rows(rows or []) for rows in table_rows],
+                columns=_METRICS, dtype=float,
+            )
+            values = tables.combine_first(values)
+        return values[_METRICS].astype(float)
+
+    @staticmethod
+    def derive_ratios(values: pd.DataFrame) -> pd.DataFrame:
+        """Vectorised MetricExtractor.derive_ratios: fills missing ratio cells column-wise."""
+        values = values.copy()
+        hdl = values["HDL"]
+        # Inputs must be present and non-zero (the scalar version tests truthiness)
+        hdl_ok = hdl.notna() & (hdl != 0)
+        for ratio, numerator, denominator in _RATIOS:
+            num = values[numerator]
+            usable = values[ratio].isna() & num.notna() & (num != 0) & hdl_ok
+            values.loc[usable, ratio] = _round2(num[usable] / values.loc[usable, denominator])
+        tc = values["Total Cholesterol"]
+        usable = values["Non-HDL Cholesterol"].isna() & tc.notna() & (tc != 0) & hdl_ok
+        values.loc[usable, "Non-HDL Cholesterol"] = _round2(tc[usable] - hdl[usable])
+        return values
+
+    @staticmethod
+    def flag(values: pd.DataFrame, ref_ranges: Dict[str, Tuple[float, float]] = None) -> pd.DataFrame:
+        """Flag code per cell from lo/hi rows broadcast over the whole frame; NaN where the value is missing."""
+        ref_ranges = REF_RANGES if ref_ranges is None else ref_ranges
+        columns = list(values.columns)
+        lo = np.array([ref_ranges[c][0] if c in ref_ranges else np.nan for c in columns])
+        hi = np.array([ref_ranges[c][1] if c in ref_ranges else np.nan for c in columns])
+        data = values.to_numpy(dtype=float)
+
+        flags = np.full(data.shape, FLAG_NORMAL, dtype=object)
+        flags[data < lo] = FLAG_LOW
+        flags[data > hi] = FLAG_HIGH
+        flags[:, np.isnan(lo)] = FLAG_NO_REF
+        flags[np.isnan(data)] = None
+        return pd.DataFrame(flags, index=values.index, columns=columns)
+
+    @staticmethod
+    def extract_metrics(texts: Sequence[str],
+                        table_rows: Optional[Sequence[List[TableRow]]] = None,
+                        ref_ranges: Dict[str, Tuple[float, float]] = None) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """(values, flags) frames for a batch of texts – extraction, ratios and flags in one call."""
+        values = BatchMetricExtractor.derive_ratios(BatchMetricExtractor.extract_values(texts, table_rows))
+        return values, BatchMetricExtractor.flag(values, ref_ranges)
+
+    @staticmethod
+    def to_records(values: pd.DataFrame) -> List[Dict[str, Optional[float]]]:
+        """Per-document {metric: float|None} dicts, as MetricExtractor.extract_values returns."""
+        return [{m: (None if pd.isna(v) else float(v)) for m, v in row.items()}
+                for row in values.to_dict(orient="records")]
@@ -7,12 +7,14 @@ from __future__ import annotations
 
 import os
 import re
-from typing import Dict, Tuple, Union
+from typing import Dict, List, Optional, Tuple, Union
 
-from .text_extractor import RawTextExtractor   # ⬅️ new
+from .text_extractor import RawTextExtractor, TableRow   # ⬅️ new
 from utils.metrics import METRIC_ALIASES, ALIAS_LOOKUP, REF_RANGES
 from utils.flagging import flag_metrics, FlaggedMetric  # ✅ import here
 
+_ALIASES_LONGEST_FIRST = sorted(ALIAS_LOOKUP, key=len, reverse=True)
+
 # --------------------------- helpers from original file --------------------
 class MetricExtractor:
     @staticmethod
@@ -26,30 +28,85 @@ class MetricExtractor:
                 pass
         return None
 
-   
+    @staticmethod
+    def _canonical_for_test(test: str) -> Optional[str]:
+        """Map a table's test-name cell to a canonical metric via ALIAS_LOOKUP."""
+        name = " ".join(test.lower().split())
+        if name in ALIAS_LOOKUP:
+            return ALIAS_LOOKUP[name]
+        # Longest alias first so "hdl cholesterol" wins over "cholesterol"
+        for alias in _ALIASES_LONGEST_FIRST:
+            if re.search(rf"(?<![\w/-]){re.escape(alias)}(?![\w/-])", name):
+                return ALIAS_LOOKUP[alias]
+        return None
+
+    @staticmethod
+    def _table_matches(rows: List[TableRow]) -> Dict[str, Tuple[float, Optional[str]]]:
+        """First (value, unit) per canonical metric found in (test, value, unit, range) rows."""
+        matches: Dict[str, Tuple[float, Optional[str]]] = {}
+        for test, value_text, unit, _ref in rows:
+            canonical = MetricExtractor._canonical_for_test(test)
+            if canonical is None or canonical in matches:
+                continue
+            val = MetricExtractor._clean_number(value_text or "")
+            if val is not None:
+                matches[canonical] = (val, unit)
+        return matches
+
+    @staticmethod
+    def values_from_table_rows(rows: List[TableRow]) -> Dict[str, Union[float, None]]:
+        """Canonical metric values taken straight from (test, value, unit, range) rows."""
+        values: Dict[str, Union[float, None]] = {m: None for m in METRIC_ALIASES}
+        for canonical, (val, _unit) in MetricExtractor._table_matches(rows).items():
+            values[canonical] = val
+        return values
+
+    @staticmethod
+    def units_from_table_rows(rows: List[TableRow]) -> Dict[str, str]:
+        """Unit printed next to each table-sourced metric value (free-text values carry none)."""
+        return {canonical: unit for canonical, (_val, unit) in MetricExtractor._table_matches(rows).items() if unit}
+
     @staticmethod
     def extract_metrics(
         input_: Union[str, os.PathLike],
-        is_path: bool = True
+        is_path: bool = True,
+        table_rows: Optional[List[TableRow]] = None,
     ) -> Dict[str, FlaggedMetric]:
         """
     Exactly the same public API as before.
     Only difference: text is obtained via `extract_text()` helper if you pass a path.
+    If `table_rows` is given (see `RawTextExtractor.extract_text_and_tables`),
+    those rows are mapped first and the text scan only fills the gaps.
     """
+        values = MetricExtractor.extract_values(input_, is_path=is_path, table_rows=table_rows)
+        return MetricExtractor.derive_and_flag(values)
+
+    @staticmethod
+    def extract_values(
+        input_: Union[str, os.PathLike],
+        is_path: bool = True,
+        table_rows: Optional[List[TableRow]] = None,
+    ) -> Dict[str, Union[float, None]]:
+        """Numeric value per canonical metric (None when missing), before derivation and flagging."""
         if is_path:
             text = RawTextExtractor.extract_text(str(input_))
         else:
             text = str(input_)    # raw text directly
 
     # ------------------- remainder identical to your code -------------------
-        values: Dict[str, Union[float, None]] = {m: None for m in METRIC_ALIASES}
-        lines = text.splitlines()
+        values: Dict[str, Union[float, None]] = (
+            MetricExtractor.values_from_table_rows(table_rows) if table_rows
+            else {m: None for m in METRIC_ALIASES}
+        )
+        # Only scan for aliases of metrics that are still missing
+        pending_aliases = [(a, c) for a, c in ALIAS_LOOKUP.items() if values[c] is None]
+        lines = text.splitlines() if pending_aliases else []
 
         # Pass 1 – free‑form lines
         for raw in lines:
             line_lc = raw.lower()
             line = re.sub(r"[\-–=|]+", ":", line_lc)
-            for alias_raw, canonical in ALIAS_LOOKUP.items():
+            for alias_raw, canonical in pending_aliases:
                 if re.search(rf"\b{re.escape(alias_raw)}\b", line):
                     segment = line.split(alias_raw, 1)[1]
                     val = MetricExtractor._clean_number(segment)
@@ -64,12 +121,24 @@ class MetricExtractor:
             if len(cols) < 2:
                 continue
             metric_text, value_text = cols[0], cols[1]
-            for alias, canonical in ALIAS_LOOKUP.items():
+            for alias, canonical in pending_aliases:
                 if alias in metric_text and values[canonical] is None:
                     val = MetricExtractor._clean_number(value_text)
                     if val is not None:
                         values[canonical] = val
 
+        return values
+
+    @staticmethod
+    def derive_and_flag(values: Dict[str, Union[float, None]]) -> Dict[str, FlaggedMetric]:
+        """Fill derivable lipid ratios, then flag every metric against REF_RANGES."""
+        return flag_metrics(MetricExtractor.derive_ratios(values))
+
+    @staticmethod
+    def derive_ratios(values: Dict[str, Union[float, None]]) -> Dict[str, Union[float, None]]:
+        """Copy of `values` with missing lipid ratios computed from their inputs."""
+        values = dict(values)
+
     # Derive ratios (same helpers as before)
         def _derive(key: str, func):
             if values.get(key) is None:
@@ -93,5 +162,4 @@ class MetricExtractor:
                 lambda: values["Total Cholesterol"] - values["HDL"]
                 if values["Total Cholesterol"] and values["HDL"] else None)
         
-         # ✅ Use shared flagging logic
-        return flag_metrics(values)
+        return values
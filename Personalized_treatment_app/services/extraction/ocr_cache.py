@@ -0,0 +1,100 @@
+"""
+On‑disk cache for OCR output.
+
+OCR text depends only on the rendered page pixels and the engine settings, so
+re‑extraction (e.g. after adding aliases to `utils.metrics`) can reuse earlier
+results and only re‑run the cheap regex stages.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+from typing import Optional
+
+from config import OCR_CACHE_DIR, OCR_CACHE_MAX_BYTES
+
+# Bump when the OCR pre‑processing changes so stale entries are not reused
+OCR_CACHE_VERSION = "1"
+
+
+class OCRCache:
+    """Size‑bounded key → text store; least recently used entries are evicted first."""
+
+    def __init__(self, cache_dir: str = OCR_CACHE_DIR, max_bytes: int = OCR_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(pixels: bytes, engine_signature: str) -> str:
+        """Hash of the raw page pixels plus the OCR engine/config signature."""
+        h = hashlib.sha256()
+        h.update(OCR_CACHE_VERSION.encode())
+        h.update(b"\0")
+        h.update(engine_signature.encode("utf-8"))
+        h.update(b"\0")
+        h.update(pixels)
+        return h.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.txt")
+
+    def get(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                text = f.read()
+        except OSError:
+            return None
+        # Touch so eviction treats this entry as recently used
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return text
+
+    def put(self, key: str, text: str) -> None:
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp, path)  # atomic, so concurrent readers never see partial text
+        except OSError as exc:
+            print(f"[ocr-cache] write error: {exc}")
+            return
+        self._evict()
+
+    def _evict(self) -> None:
+        """Drop least recently used entries until the cache fits in `max_bytes`."""
+        entries = []
+        total = 0
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".txt"):
+                continue
+            try:
+                st = os.stat(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, name))
+            total += st.st_size
+
+        if total <= self.max_bytes:
+            return
+
+        for _, size, name in sorted(entries):
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def clear(self) -> None:
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".txt"):
+                try:
+                    os.remove(os.path.join(self.cache_dir, name))
+                except OSError:
+                    pass
@@ -0,0 +1,185 @@
+"""
+Sandboxed text extraction: one short-lived worker process per document.
+
+    free_text, table_rows = sandbox.extract(path)      # PDF / DOCX / CSV / JSON
+    free_text, table_rows = sandbox.extract(path, image=True)
+
+pdfplumber, PyMuPDF and Tesseract run in a child process with a page-count
+check before any parsing. The parent enforces the wall-clock timeout and
+watches the worker's resident memory; either terminates the whole process
+group, so no OCR subprocess is left behind. RLIMIT_AS (inherited by the
+tesseract binary) is a hard backstop for allocations too sudden for the
+watchdog. A document that breaks a limit raises ExtractionLimitExceeded; the
+worker never touches the database.
+
+Workers are forked from a forkserver (spawned on platforms without one) so
+the threads of the app process are never forked.
+"""
+from __future__ import annotations
+
+import multiprocessing
+import os
+import signal
+import time
+from typing import List, Optional, Tuple
+
+import config
+from services import pipeline_tracing
+from .text_extractor import TableRow
+
+_TERMINATE_GRACE_SECONDS = 2.0
+_WATCHDOG_INTERVAL_SECONDS = 0.1
+# Virtual address space is far larger than resident memory (shared libraries,
+# allocator arenas), so the hard RLIMIT_AS backstop sits well above the RSS limit
+_ADDRESS_SPACE_FACTOR = 4
+
+_mp_context = None
+
+
+class ExtractionLimitExceeded(Exception):
+    """A document exceeded one of the extraction limits ('timeout', 'memory' or 'pages')."""
+
+    def __init__(self, limit: str, message: str):
+        super().__init__(message)
+        self.limit = limit
+
+
+def _context():
+    global _mp_context
+    if _mp_context is None:
+        if "forkserver" in multiprocessing.get_all_start_methods():
+            _mp_context = multiprocessing.get_context("forkserver")
+            # Imported once in the server instead of once per document (missing ones are
+            # skipped); preloading __main__ stops every worker from re-running the main script
+            _mp_context.set_forkserver_preload(
+                ["__main__", "services.extraction.text_extractor", "fitz", "pdfplumber"])
+        else:
+            _mp_context = multiprocessing.get_context("spawn")
+    return _mp_context
+
+
+def _count_pages(path: str) -> Optional[int]:
+    if not path.lower().endswith(".pdf"):
+        return None
+    try:
+        import fitz               # PyMuPDF
+        with fitz.open(path) as doc:
+            return doc.page_count
+    except Exception:
+        import pdfplumber
+        with pdfplumber.open(path) as pdf:
+            return len(pdf.pages)
+
+
+def _worker(conn, path: str, image: bool, max_memory_mb: int, max_pages: int):
+    # Own process group, so the parent can kill us together with any tesseract child
+    if hasattr(os, "setpgid"):
+        os.setpgid(0, 0)
+    if max_memory_mb:
+        try:
+            import resource
+            limit = max_memory_mb * _ADDRESS_SPACE_FACTOR * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        except (ImportError, ValueError, OSError):
+            pass  # not enforceable on this platform
+
+    # Page / OCR counters recorded by the extractors, handed back to the parent's span
+    span = pipeline_tracing.Span("sandbox")
+    pipeline_tracing._current_span.set(span)
+    try:
+        from .text_extractor import RawTextExtractor
+        pages = 1 if image else _count_pages(path)
+        if max_pages and pages is not None and pages > max_pages:
+            conn.send(("limit", "pages", f"{pages} pages (limit {max_pages})", span.attrs))
+            return
+        if image:
+            text = RawTextExtractor.get_text_from_image(path)
+            result = (text, [])
+        else:
+            result = RawTextExtractor.extract_text_and_tables(path)
+        conn.send(("ok", result, span.attrs))
+    except MemoryError:
+        conn.send(("limit", "memory", f"exceeded {max_memory_mb} MB", span.attrs))
+    except Exception as e:
+        try:
+            conn.send(("error", e, span.attrs))
+        except Exception:
+            conn.send(("error", RuntimeError(f"{type(e).__name__}: {e}"), span.attrs))
+    finally:
+        conn.close()
+
+
+def _rss_mb(pid: int) -> Optional[float]:
+    """Resident memory of a process in MB, or None where /proc isn't available."""
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def _terminate(proc):
+    """Stops the worker and its process group: SIGTERM, then SIGKILL after a grace period."""
+    for sig, wait in ((signal.SIGTERM, _TERMINATE_GRACE_SECONDS), (getattr(signal, "SIGKILL", None), 1.0)):
+        if not proc.is_alive() or sig is None:
+            break
+        try:
+            os.killpg(proc.pid, sig)
+        except (AttributeError, ProcessLookupError, PermissionError):
+            proc.terminate()  # not a group leader yet / no process groups
+        proc.join(wait)
+    if hasattr(os, "killpg"):
+        try:
+            os.killpg(proc.pid, getattr(signal, "SIGKILL", signal.SIGTERM))  # stray OCR children
+        except (ProcessLookupError, PermissionError):
+            pass
+    proc.join(0)
+
+
+def extract(path: str, image: bool = False, timeout_seconds: float = None,
+            max_memory_mb: int = None, max_pages: int = None) -> Tuple[str, List[TableRow]]:
+    """
+    RawTextExtractor.extract_text_and_tables (or get_text_from_image when
+    `image`) in a worker process. Limits default to the EXTRACTION_* settings
+    in config.py; 0 disables a limit.
+    Raises ExtractionLimitExceeded, or re-raises the extractor's own error.
+    """
+    timeout_seconds = config.EXTRACTION_TIMEOUT_SECONDS if timeout_seconds is None else timeout_seconds
+    max_memory_mb = config.EXTRACTION_MAX_MEMORY_MB if max_memory_mb is None else max_memory_mb
+    max_pages = config.EXTRACTION_MAX_PAGES if max_pages is None else max_pages
+
+    ctx = _context()
+    receiver, sender = ctx.Pipe(duplex=False)
+    proc = ctx.Process(target=_worker, args=(sender, path, image, max_memory_mb, max_pages), daemon=True)
+    proc.start()
+    sender.close()
+    try:
+        deadline = time.monotonic() + timeout_seconds if timeout_seconds else None
+        while not receiver.poll(_WATCHDOG_INTERVAL_SECONDS if deadline is None else
+                                max(0.0, min(_WATCHDOG_INTERVAL_SECONDS, deadline - time.monotonic()))):
+            if deadline and time.monotonic() >= deadline:
+                raise ExtractionLimitExceeded("timeout", f"extraction took longer than {timeout_seconds:g}s")
+            rss = _rss_mb(proc.pid) if max_memory_mb else None
+            if rss and rss > max_memory_mb:
+                raise ExtractionLimitExceeded("memory", f"worker used {rss:.0f} MB (limit {max_memory_mb} MB)")
+        try:
+            message = receiver.recv()
+        except EOFError:
+            proc.join(_TERMINATE_GRACE_SECONDS)
+            if max_memory_mb and proc.exitcode is not None and proc.exitcode < 0:
+                # Native libraries (MuPDF, tesseract) crash on a failed malloc under RLIMIT_AS
+                # rather than raising MemoryError, so a signal death counts as the memory limit
+                raise ExtractionLimitExceeded(
+                    "memory", f"worker killed by signal {-proc.exitcode} (limit {max_memory_mb} MB)")
+            raise RuntimeError(f"extraction worker exited without a result (exit code {proc.exitcode})")
+    finally:
+        receiver.close()
+        _terminate(proc)
+
+    status, payload, attrs = message[0], message[1:-1], message[-1]
+    pipeline_tracing.annotate(**attrs)
+    if status == "ok":
+        return payload[0]
+    if status == "limit":
+        raise ExtractionLimitExceeded(*payload)
+    raise payload[0]
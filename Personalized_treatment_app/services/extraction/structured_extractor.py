@@ -0,0 +1,203 @@
+"""
+Direct metric ingestion for already‑structured uploads (CSV / JSON).
+
+Instead of rendering the file to text and regex‑scanning it again, columns,
+rows and keys are mapped to canonical metrics through `ALIAS_LOOKUP` (or
+their canonical names) with vectorised pandas operations.
+"""
+from __future__ import annotations
+
+import json
+import os
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import pandas as pd
+
+from utils.metrics import METRIC_ALIASES, ALIAS_LOOKUP
+
+_NUMBER_PATTERN = r"([-+]?[0-9]*\.?[0-9]+)"
+
+# Aliases plus the canonical names themselves, which the app's own CSV export writes
+_NAME_LOOKUP = {**{" ".join(name.lower().split()): name for name in METRIC_ALIASES}, **ALIAS_LOOKUP}
+
+# Column / key names that identify the test name and result in "long" tables
+# ("field" is the Field,Value layout of the DataExtraction CSV export)
+_TEST_COLUMNS = {"test", "test name", "parameter", "metric", "investigation", "analyte", "field"}
+_VALUE_COLUMNS = {"value", "result", "observed value", "reading", "results"}
+
+# Lower-cased key → PatientInfoExtractor field
+_PATIENT_FIELDS = {
+    "patient name": "Patient Name", "name": "Patient Name",
+    "patient id": "Patient ID", "pid": "Patient ID",
+    "age": "Age",
+    "sex": "Sex", "gender": "Sex",
+    "report date": "Report Date", "date": "Report Date",
+    "uhid": "UHID",
+    "lab id": "Lab ID",
+}
+
+STRUCTURED_EXTENSIONS = {".csv", ".json"}
+
+
+class MultipleRecordsError(ValueError):
+    """A wide table or record list holds several observations (e.g. several patients), not one report."""
+
+
+def _normalise(name: Any) -> str:
+    return " ".join(str(name).lower().replace("_", " ").split())
+
+
+def _to_numeric(series: pd.Series) -> pd.Series:
+    """Vectorised 'first number in the cell' → float (NaN when absent)."""
+    if pd.api.types.is_numeric_dtype(series):
+        return series.astype(float)
+    extracted = (series.astype(str)
+                 .str.replace(",", "", regex=False)
+                 .str.extract(_NUMBER_PATTERN, expand=False))
+    return pd.to_numeric(extracted, errors="coerce")
+
+
+def _long_columns(df: pd.DataFrame) -> Tuple[Any, Any]:
+    """(test-name column, value column) of a long table; None for a missing one."""
+    headers = [(c, _normalise(c)) for c in df.columns]
+    test_col = next((c for c, h in headers if h in _TEST_COLUMNS), None)
+    value_col = next((c for c, h in headers if h in _VALUE_COLUMNS), None)
+    return test_col, value_col
+
+
+class StructuredExtractor:
+    @staticmethod
+    def canonical_frame(df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Map a CSV/JSON table to one numeric column per canonical metric.
+
+        * Wide layout – column headers are metric names, one row per observation.
+        * Long layout – one row per test with a test‑name and a value column.
+        Columns that don't map to a metric are dropped.
+        """
+        headers = pd.Series(df.columns, index=df.columns).map(_normalise)
+        canonical = headers.map(_NAME_LOOKUP)
+
+        test_col, value_col = _long_columns(df)
+
+        if canonical.notna().any() and not (test_col is not None and value_col is not None):
+            wide = df.loc[:, canonical.notna().values]
+            numeric = wide.apply(_to_numeric)
+            numeric.columns = canonical[canonical.notna()].values
+            # Several aliases of one metric: keep the first populated column
+            return numeric.T.groupby(level=0, sort=False).first().T
+
+        if test_col is None or value_col is None:
+            return pd.DataFrame(columns=list(METRIC_ALIASES))
+
+        metric = df[test_col].map(_normalise).map(_NAME_LOOKUP)
+        long = pd.DataFrame({"metric": metric, "value": _to_numeric(df[value_col])})
+        long = long.dropna(subset=["metric"])
+        # One observation per report: first value of every metric
+        first = long.dropna(subset=["value"]).drop_duplicates("metric")
+        return pd.DataFrame([first.set_index("metric")["value"]])
+
+    @staticmethod
+    def values_from_frame(frame: pd.DataFrame) -> Dict[str, Union[float, None]]:
+        """
+        A single report from a canonical frame: the first row with any metric.
+        Rows are never merged – they may be observations of different patients.
+        """
+        values: Dict[str, Union[float, None]] = {m: None for m in METRIC_ALIASES}
+        rows = frame.dropna(how="all")
+        if rows.empty:
+            return values
+        for metric, val in rows.iloc[0].items():
+            if metric in values and pd.notna(val):
+                values[metric] = float(val)
+        return values
+
+    @staticmethod
+    def _patient_info_from_items(items) -> Dict[str, Optional[str]]:
+        info: Dict[str, Optional[str]] = {}
+        for key, val in items:
+            field = _PATIENT_FIELDS.get(_normalise(key))
+            if field and field not in info and val not in (None, ""):
+                value = str(val).strip()
+                if field == "Sex":  # same normalisation as PatientInfoExtractor
+                    value = {"M": "Male", "MALE": "Male", "F": "Female",
+                             "FEMALE": "Female"}.get(value.upper(), value.capitalize())
+                info[field] = value
+        return info
+
+    @staticmethod
+    def _flatten_json(data: Any, prefix: str = "") -> List[Tuple[str, Any]]:
+        """Flatten nested dicts to (leaf-key, value); {"value": x} leaves count as x."""
+        items: List[Tuple[str, Any]] = []
+        if isinstance(data, dict):
+            if "value" in data and not isinstance(data["value"], (dict, list)) and prefix:
+                return [(prefix, data["value"])]
+            for k, v in data.items():
+                items.extend(StructuredExtractor._flatten_json(v, str(k)))
+        elif not isinstance(data, list):
+            items.append((prefix, data))
+        return items
+
+    @staticmethod
+    def _json_frame(data: Any) -> Tuple[pd.DataFrame, Dict[str, Optional[str]]]:
+        # A list of records (or a dict wrapping one) is a table; other keys are scalars
+        records = None
+        if isinstance(data, list):
+            records = data
+        elif isinstance(data, dict):
+            records = next((v for v in data.values()
+                            if isinstance(v, list) and v and isinstance(v[0], dict)), None)
+
+        items = StructuredExtractor._flatten_json(data) if isinstance(data, dict) else []
+        info = StructuredExtractor._patient_info_from_items(items)
+
+        frame = pd.DataFrame()
+        if records:
+            frame = StructuredExtractor.canonical_frame(pd.json_normalize(records)).dropna(how="all")
+            frame = frame.reset_index(drop=True)
+        if items:
+            scalars = StructuredExtractor.canonical_frame(pd.DataFrame([dict(items)]))
+            # Same document: the record's values first, the document's own keys fill the gaps
+            frame = scalars if frame.empty else frame.combine_first(scalars)
+        return frame, info
+
+    @staticmethod
+    def extract(path: str) -> Optional[Dict[str, Any]]:
+        """
+        Returns {"values": {metric: float|None}, "patient_info": {...}} for
+        CSV/JSON files, or None if the file can't be read as structured data.
+        Raises MultipleRecordsError when more than one row carries metrics.
+        """
+        ext = os.path.splitext(path.lower())[1]
+        try:
+            if ext == ".csv":
+                df = pd.read_csv(path, dtype=str, keep_default_na=False)
+                frame = StructuredExtractor.canonical_frame(df)
+                test_col, value_col = _long_columns(df)
+                if test_col is not None and value_col is not None:
+                    # Long layout: patient fields are rows too (e.g. "Patient Name,John Doe")
+                    items = zip(df[test_col], df[value_col])
+                else:
+                    # Wide layout: patient fields come from the row the metrics are read from
+                    rows = frame.dropna(how="all").index
+                    items = df.loc[rows[0]].items() if len(rows) else (df.iloc[0].items() if len(df) else [])
+                info = StructuredExtractor._patient_info_from_items(items)
+            elif ext == ".json":
+                with open(path, "r", encoding="utf-8") as f:
+                    frame, info = StructuredExtractor._json_frame(json.load(f))
+            else:
+                return None
+            records = len(frame.dropna(how="all"))
+            if records > 1:
+                raise MultipleRecordsError(
+                    f"{os.path.basename(path)} holds {records} rows of results; upload one report per file")
+        except MultipleRecordsError:
+            raise
+        except Exception as exc:
+            print(f"[extract] structured read error: {exc}")
+            return None
+
+        return {
+            "values": StructuredExtractor.values_from_frame(frame),
+            "patient_info": info,
+        }
@@ -5,20 +5,57 @@ from __future__ import annotations
 
 import json
 import os
-from typing import Union, Dict
+import re
+from typing import Union, Dict, List, Optional, Tuple
 
-import cv2
-import fitz               # PyMuPDF
-import pandas as pd
-import pdfplumber
-import pytesseract
-import docx               # python‑docx
-from PIL import Image
+# cv2, fitz (PyMuPDF), pandas, pdfplumber, pytesseract, docx and PIL are
+# imported inside the methods that need them, so importing this module
+# (and the login page / app start-up) doesn't pay for OCR or PDF libraries.
+
+from services import pipeline_tracing
+from .ocr_cache import OCRCache
 
 # 👉 set Tesseract path if needed
-pytesseract.pytesseract.tesseract_cmd = (
-    r"C:\Program Files\Tesseract-OCR\tesseract.exe"
-)
+TESSERACT_CMD = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
+
+# (test, value, unit, reference range) – one row of a lab-report table
+TableRow = Tuple[str, Optional[str], Optional[str], Optional[str]]
+
+_NUMBER_RE = re.compile(r"^[<>≤≥]?\s*[-+]?[0-9][0-9,]*\.?[0-9]*\s*[a-zA-Z/%µ^0-9.]*$")
+_RANGE_RE = re.compile(r"[-+]?[0-9]*\.?[0-9]+\s*(?:-|–|to)\s*[-+]?[0-9]*\.?[0-9]+|^[<>≤≥]\s*[0-9]")
+
+OCR_DPI = 300
+TESSERACT_CONFIG = ""   # extra CLI flags passed to tesseract (part of the cache key)
+
+_ocr_cache: OCRCache | None = None
+_engine_signature: str | None = None
+
+
+def _get_ocr_cache() -> OCRCache:
+    global _ocr_cache
+    if _ocr_cache is None:
+        _ocr_cache = OCRCache()
+    return _ocr_cache
+
+
+def _pytesseract():
+    """Import pytesseract on first use and point it at the Tesseract binary."""
+    import pytesseract
+    pytesseract.pytesseract.tesseract_cmd = TESSERACT_CMD
+    return pytesseract
+
+
+def _get_engine_signature() -> str:
+    """Tesseract version + settings; a change here invalidates cached OCR text."""
+    global _engine_signature
+    if _engine_signature is None:
+        try:
+            version = str(_pytesseract().get_tesseract_version())
+        except Exception:
+            version = "unknown"
+        _engine_signature = f"tesseract={version};dpi={OCR_DPI};config={TESSERACT_CONFIG}"
+    return _engine_signature
+
 
 class RawTextExtractor:
     @staticmethod
@@ -29,20 +66,33 @@ class RawTextExtractor:
         """Prefer embedded text; fall back to OCR on first page."""
         text = ""
         try:
-            with pdfplumber.open(path) as pdf:
-                text = "\n".join(page.extract_text() or "" for page in pdf.pages)
+            text = "\n".join(t for t, _ in RawTextExtractor._pdf_pages_pymupdf(path))
         except Exception as exc:
-            print(f"[extract] pdfplumber error: {exc}")
+            print(f"[extract] PyMuPDF error: {exc}")
+            text = RawTextExtractor._pdf_text_pdfplumber(path)
 
         if len(text.strip()) < 20:          # likely scanned
             try:
+                import cv2
+                import fitz               # PyMuPDF
                 doc = fitz.open(path)
-                pix = doc[0].get_pixmap(dpi=300)
+                pix = doc[0].get_pixmap(dpi=OCR_DPI)
+                cache = _get_ocr_cache()
+                key = OCRCache.make_key(
+                    f"{pix.width}x{pix.height}x{pix.n};".encode() + pix.samples,
+                    _get_engine_signature(),
+                )
+                pipeline_tracing.incr("ocr_pages")
+                cached = cache.get(key)
+                if cached is not None:
+                    pipeline_tracing.incr("ocr_cache_hits")
+                    return cached
                 tmp = "_tmp_ocr.png"
                 pix.save(tmp)
                 img = cv2.imread(tmp)
-                text = pytesseract.image_to_string(img)
+                text = _pytesseract().image_to_string(img, config=TESSERACT_CONFIG)
                 os.remove(tmp)
+                cache.put(key, text)
             except Exception as exc:
                 print(f"[extract] PDF‑OCR error: {exc}")
         return text
@@ -50,15 +100,207 @@ class RawTextExtractor:
     @staticmethod
     def _extract_text_docx(path: str) -> str:
         try:
+            import docx               # python‑docx
             doc = docx.Document(path)
-            return "\n".join(p.text for p in doc.paragraphs)
+            lines = [p.text for p in doc.paragraphs]
+            # Tables are not part of doc.paragraphs – keep them as pipe rows
+            for table in doc.tables:
+                for cells in RawTextExtractor._docx_table_cells(table):
+                    lines.append(" | ".join(cells))
+            return "\n".join(lines)
         except Exception as exc:
             print(f"[extract] DOCX read error: {exc}")
             return ""
 
+    # ------------------------------------------------------------------
+    # table-aware helpers (rows are mapped to metrics without regex scan)
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _docx_table_cells(table) -> List[List[str]]:
+        rows = []
+        for row in table.rows:
+            cells: List[str] = []
+            for cell in row.cells:
+                text = cell.text.strip()
+                # merged cells are repeated by python-docx; keep one copy
+                if cells and cells[-1] == text:
+                    continue
+                cells.append(text)
+            if any(cells):
+                rows.append(cells)
+        return rows
+
+    @staticmethod
+    def _row_to_tuple(cells: List[Optional[str]]) -> Optional[TableRow]:
+        """
+        Interpret one table row as (test, value, unit, range).
+        The first non-empty cell is the test name, the first numeric cell after
+        it the value; a range-looking cell is the reference range and a short
+        textual cell next to the value is the unit. Header rows yield None.
+        """
+        cells = [" ".join((c or "").split()) for c in cells]
+        cells = [c for c in cells if c]
+        if len(cells) < 2:
+            return None
+        test = cells[0]
+        value = unit = ref = None
+        for cell in cells[1:]:
+            if value is None and _NUMBER_RE.match(cell) and not _RANGE_RE.search(cell):
+                value = cell
+            elif ref is None and _RANGE_RE.search(cell):
+                ref = cell
+            elif value is not None and unit is None and len(cell) <= 15:
+                unit = cell
+        if value is None:
+            return None
+        return (test, value, unit, ref)
+
+    @staticmethod
+    def _pdf_pages_pymupdf(path: str) -> List[Tuple[str, list]]:
+        """
+        Fast text layer: (text, words) per page via PyMuPDF.
+        `words` are PyMuPDF word boxes (x0, y0, x1, y1, word, block, line, word_no).
+        """
+        import fitz               # PyMuPDF
+        pages = []
+        with fitz.open(path) as doc:
+            for page in doc:
+                pages.append((page.get_text("text"), page.get_text("words")))
+        pipeline_tracing.annotate(pages=len(pages))
+        return pages
+
+    @staticmethod
+    def _pdf_text_pdfplumber(path: str) -> str:
+        """Slower pure-Python text layer; kept as a fallback and for benchmarks."""
+        try:
+            import pdfplumber
+            with pdfplumber.open(path) as pdf:
+                return "\n".join(page.extract_text() or "" for page in pdf.pages)
+        except Exception as exc:
+            print(f"[extract] pdfplumber error: {exc}")
+            return ""
+
+    @staticmethod
+    def _looks_tabular(words: list, min_rows: int = 3, min_cols: int = 3) -> bool:
+        """
+        Cheap table detector on PyMuPDF word boxes: at least `min_rows` visual
+        lines whose words start at `min_cols` or more shared x positions.
+        Only pages that pass are handed to pdfplumber for table extraction.
+        """
+        lines: Dict[int, set] = {}
+        for x0, y0, *_ in words:
+            lines.setdefault(round(y0 / 3), set()).add(round(x0 / 10))
+        multi = [xs for xs in lines.values() if len(xs) >= min_cols]
+        if len(multi) < min_rows:
+            return False
+        column_hits: Dict[int, int] = {}
+        for xs in multi:
+            for x in xs:
+                column_hits[x] = column_hits.get(x, 0) + 1
+        return sum(1 for n in column_hits.values() if n >= min_rows) >= min_cols
+
+    @staticmethod
+    def _split_pipe_rows(text: str) -> Tuple[str, List[TableRow]]:
+        """Pull pipe-delimited table lines ("| Hb | 13.8 | g/dL | 12-17 |") out of free text."""
+        free: List[str] = []
+        rows: List[TableRow] = []
+        for line in text.splitlines():
+            row = None
+            if line.count("|") >= 2:
+                row = RawTextExtractor._row_to_tuple(line.strip().strip("|").split("|"))
+            if row:
+                rows.append(row)
+            else:
+                free.append(line)
+        return "\n".join(free), rows
+
+    @staticmethod
+    def _extract_pdf_text_and_tables(path: str) -> Tuple[str, List[TableRow]]:
+        try:
+            fast_pages = RawTextExtractor._pdf_pages_pymupdf(path)
+        except Exception as exc:
+            print(f"[extract] PyMuPDF error: {exc}")
+            fast_pages = None
+
+        if fast_pages is None:
+            page_texts, rows = RawTextExtractor._pdf_tables_pdfplumber(path, None)
+            texts = [page_texts[i] for i in sorted(page_texts)]
+        else:
+            # Pages whose tables are plain pipe-delimited rows need no layout analysis
+            # (a stray "|" elsewhere on the page doesn't count)
+            table_pages = {i for i, (t, words) in enumerate(fast_pages)
+                           if RawTextExtractor._looks_tabular(words)
+                           and not ("|" in t and RawTextExtractor._split_pipe_rows(t)[1])}
+            # Layout fidelity matters only on table pages: use pdfplumber there
+            page_texts, rows = (RawTextExtractor._pdf_tables_pdfplumber(path, table_pages)
+                                if table_pages else ({}, []))
+            texts = [page_texts.get(i, t) for i, (t, _) in enumerate(fast_pages)]
+
+        text = "\n".join(texts)
+        if not rows and len(text.strip()) < 20:
+            # nothing usable in the text layer – reuse the OCR path
+            text = RawTextExtractor._extract_text_pdf(path)
+        text, pipe_rows = RawTextExtractor._split_pipe_rows(text)
+        return text, rows + pipe_rows
+
+    @staticmethod
+    def _pdf_tables_pdfplumber(path: str, page_numbers) -> Tuple[Dict[int, str], List[TableRow]]:
+        """
+        pdfplumber table extraction for the given 0-based pages (all when None).
+        Returns the free text outside of tables per page, plus the table rows.
+        """
+        rows: List[TableRow] = []
+        page_texts: Dict[int, str] = {}
+        try:
+            import pdfplumber
+            with pdfplumber.open(path) as pdf:
+                for i, page in enumerate(pdf.pages):
+                    if page_numbers is not None and i not in page_numbers:
+                        continue
+                    tables = page.find_tables()
+                    bboxes = [t.bbox for t in tables]
+                    for table in tables:
+                        for cells in table.extract():
+                            row = RawTextExtractor._row_to_tuple(cells)
+                            if row:
+                                rows.append(row)
+
+                    def _outside_tables(obj, _bboxes=bboxes):
+                        if "x0" not in obj:
+                            return True
+                        cx = (obj["x0"] + obj["x1"]) / 2
+                        cy = (obj["top"] + obj["bottom"]) / 2
+                        return not any(x0 <= cx <= x1 and top <= cy <= bottom
+                                       for x0, top, x1, bottom in _bboxes)
+
+                    free = page.filter(_outside_tables) if bboxes else page
+                    page_texts[i] = free.extract_text() or ""
+        except Exception as exc:
+            # Callers keep the fast text layer for pages that are missing here
+            print(f"[extract] pdfplumber table error: {exc}")
+            return {}, []
+        return page_texts, rows
+
+    @staticmethod
+    def _extract_docx_text_and_tables(path: str) -> Tuple[str, List[TableRow]]:
+        try:
+            import docx               # python‑docx
+            doc = docx.Document(path)
+        except Exception as exc:
+            print(f"[extract] DOCX read error: {exc}")
+            return "", []
+        text, rows = RawTextExtractor._split_pipe_rows("\n".join(p.text for p in doc.paragraphs))
+        for table in doc.tables:
+            for cells in RawTextExtractor._docx_table_cells(table):
+                row = RawTextExtractor._row_to_tuple(cells)
+                if row:
+                    rows.append(row)
+        return text, rows
+
     @staticmethod
     def _extract_text_csv(path: str) -> str:
         try:
+            import pandas as pd
             df = pd.read_csv(path, dtype=str, keep_default_na=False)
             return df.to_string(index=False)
         except Exception as exc:
@@ -95,11 +337,47 @@ class RawTextExtractor:
             raise ValueError(f"Unsupported file type: {ext}")
 
 
+    @staticmethod
+    def extract_text_and_tables(path: str) -> Tuple[str, List[TableRow]]:
+        """
+        Table-aware variant of `extract_text`.
+        Returns the free text left outside of tables plus the table rows as
+        (test, value, unit, range) tuples. Formats without table support
+        return their full text and no rows.
+        """
+        ext = os.path.splitext(path.lower())[1]
+        if ext == ".pdf":
+            return RawTextExtractor._extract_pdf_text_and_tables(path)
+        elif ext in {".docx", ".doc"}:
+            return RawTextExtractor._extract_docx_text_and_tables(path)
+        return RawTextExtractor.extract_text(path), []
+
+    @staticmethod
+    def rows_to_text(rows: List[TableRow]) -> str:
+        """Render table rows as pipe-delimited lines (for display / patient info)."""
+        return "\n".join(
+            " | ".join(c for c in row if c) for row in rows
+        )
+
+
 # ------------------------------------------------------------------
 # 3️⃣ OCR an image if the user uploads a JPEG/PNG
 # ------------------------------------------------------------------
     @staticmethod
     def get_text_from_image(image_path: str) -> str:
+        from PIL import Image
         img = Image.open(image_path)
-        return pytesseract.image_to_string(img)
+        cache = _get_ocr_cache()
+        key = OCRCache.make_key(
+            f"{img.width}x{img.height}x{img.mode};".encode() + img.tobytes(),
+            _get_engine_signature(),
+        )
+        pipeline_tracing.incr("ocr_pages")
+        cached = cache.get(key)
+        if cached is not None:
+            pipeline_tracing.incr("ocr_cache_hits")
+            return cached
+        text = _pytesseract().image_to_string(img, config=TESSERACT_CONFIG)
+        cache.put(key, text)
+        return text
  
\ No newline at end of file
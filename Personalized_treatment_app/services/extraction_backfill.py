@@ -0,0 +1,244 @@
+# services/extraction_backfill.py
+"""
+Incremental refresh of stored extractions after extractor changes.
+
+Every extraction carries `extractor_version` (see utils/metrics.py). Comparing
+it with the current EXTRACTOR_VERSION decides the cheapest stage to re-run:
+
+    code changed    → "reextract": parse the source file again
+    aliases changed → "rescan":    metric scan on the cached raw_text (no PDF/OCR work)
+    ranges changed  → "reflag":    re-flag the stored numeric values only
+
+Extractions from before versioning are re-extracted. When the source file
+is gone, the cached text is rescanned instead and the stamp gets
+`source_missing`, so the report isn't picked up again until the code
+version changes or the file reappears.
+
+Work is done in batches on a small, low-priority process pool with a pause
+between batches, so a backfill doesn't starve live uploads. Results are
+written with an optimistic check: a report whose extraction changed while
+it was being refreshed (e.g. re-uploaded and reprocessed) is left alone.
+"""
+import json
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from database.db_utils import DBManager
+from utils.metrics import EXTRACTOR_VERSION
+
+# (report_id, file_path, extracted_data_json, action)
+BackfillJob = Tuple[str, str, str, str]
+
+def _source_exists(file_path: Optional[str]) -> bool:
+    return bool(file_path) and os.path.exists(file_path)
+
+
+def plan_action(stamp: Optional[dict], source_exists: bool = True) -> Optional[str]:
+    """
+    Cheapest refresh for an extraction stamped with `stamp`, or None if it is current.
+    `source_exists` says whether the report's file is still on disk.
+    """
+    if not stamp:
+        # Extracted before versioning (older extractors): parse the file again if we still have it
+        return "reextract" if source_exists else "rescan"
+    if stamp.get("code") != EXTRACTOR_VERSION["code"]:
+        return "reextract"
+    if stamp.get("source_missing") and source_exists:
+        return "reextract"  # the file is back: the cached text came from older code
+    if stamp.get("aliases") != EXTRACTOR_VERSION["aliases"]:
+        return "rescan"
+    if stamp.get("ranges") != EXTRACTOR_VERSION["ranges"]:
+        return "reflag"
+    return None
+
+
+def _finish(job: BackfillJob, extracted: dict, values: dict, stamp: dict, action: str) -> tuple:
+    from utils.flagging import flag_metrics
+    extracted["metric_values"] = values
+    extracted["metrics"] = flag_metrics(values)
+    extracted["extractor_version"] = stamp
+    return job[0], job[2], json.dumps(extracted), action, None
+
+
+def refresh_extractions(jobs: List[BackfillJob]) -> List[Tuple[str, str, Optional[str], str, Optional[str]]]:
+    """
+    Worker: returns one (report_id, old_json, new_json, action_done, error) per job.
+    Rescans of the whole chunk go through BatchMetricExtractor in one vectorised
+    pass. Runs in a child process, so it must not touch the database.
+    """
+    from services.extraction.batch_metric_extractor import BatchMetricExtractor
+    from services.extraction.metric_extractor import MetricExtractor
+    from services.extraction.text_extractor import RawTextExtractor
+
+    results: List[Optional[tuple]] = [None] * len(jobs)
+    rescans = []  # (position, extracted, stamp, free_text, table_rows)
+    for pos, job in enumerate(jobs):
+        report_id, file_path, old_json, action = job
+        try:
+            extracted = json.loads(old_json) if old_json else {}
+            old_stamp = extracted.get("extractor_version") or {}
+            stamp = dict(EXTRACTOR_VERSION)
+
+            if action == "reextract":
+                if _source_exists(file_path):
+                    from services.document_parser import DocumentParser # Lazy import (pulls in streamlit)
+                    fresh = DocumentParser.parse_report(file_path)
+                    if not fresh or not fresh.get("raw_text"):
+                        raise ValueError("re-extraction produced no text")
+                    results[pos] = (report_id, old_json, json.dumps(fresh), action, None)
+                    continue
+                action = "rescan"
+            if old_stamp.get("code") != stamp["code"] or old_stamp.get("source_missing"):
+                # Source file is gone: refresh what the cached text allows and mark the
+                # report done for this code version (the text itself came from older code)
+                stamp["source_missing"] = True
+
+            if action == "rescan":
+                free_text, rows = RawTextExtractor._split_pipe_rows(extracted.get("raw_text") or "")
+                rescans.append((pos, extracted, stamp, free_text, rows))
+            elif action == "reflag":
+                from utils.flagging import values_from_flagged
+                values = extracted.get("metric_values") or values_from_flagged(extracted.get("metrics") or {})
+                results[pos] = _finish(job, extracted, values, stamp, action)
+            else:
+                raise ValueError(f"unknown backfill action '{action}'")
+        except Exception as exc:
+            results[pos] = (report_id, old_json, None, action, f"{type(exc).__name__}: {exc}")
+
+    if rescans:
+        try:
+            values = BatchMetricExtractor.derive_ratios(BatchMetricExtractor.extract_values(
+                [r[3] for r in rescans], table_rows=[r[4] for r in rescans]))
+            for (pos, extracted, stamp, _, rows), doc_values in zip(rescans, BatchMetricExtractor.to_records(values)):
+                extracted["metric_units"] = MetricExtractor.units_from_table_rows(rows)
+                results[pos] = _finish(jobs[pos], extracted, doc_values, stamp, "rescan")
+        except Exception as exc:
+            for pos, *_ in rescans:
+                results[pos] = (jobs[pos][0], jobs[pos][2], None, "rescan", f"{type(exc).__name__}: {exc}")
+    return results
+
+
+def _lower_priority():
+    # Process-pool initializer: yield the CPU to the app serving live uploads
+    if hasattr(os, "nice"):
+        try:
+            os.nice(10)
+        except OSError:
+            pass
+
+
+def iter_stale_jobs(page_size: int = 500) -> Iterator[BackfillJob]:
+    """Reports with extracted text whose extractor_version is not current, in rowid order."""
+    last_rowid = 0
+    while True:
+        rows = DBManager.fetch_all(
+            "SELECT rowid, report_id, file_path, extracted_data_json FROM health_reports "
+            "WHERE rowid > ? ORDER BY rowid LIMIT ?",
+            (last_rowid, page_size),
+        )
+        if not rows:
+            return
+        for row in rows:
+            last_rowid = row["rowid"]
+            try:
+                extracted = json.loads(row["extracted_data_json"] or "{}")
+            except json.JSONDecodeError:
+                continue
+            if not extracted.get("raw_text"):
+                continue  # never extracted successfully; the pipeline retry handles these
+            action = plan_action(extracted.get("extractor_version"), _source_exists(row["file_path"]))
+            if action:
+                yield row["report_id"], row["file_path"], row["extracted_data_json"], action
+
+
+def _write_batch(results: List[tuple]) -> Optional[set]:
+    """
+    Writes a batch in one transaction; returns the ids of the reports written
+    (None if the transaction failed). A report whose extraction changed since
+    it was read is skipped, observations included.
+    """
+    from models.metric_observation import MetricObservation
+    query = ("UPDATE health_reports SET extracted_data_json = ? "
+             "WHERE report_id = ? AND extracted_data_json = ?")
+
+    def write(cursor):
+        written, observations = set(), []
+        for report_id, old_json, new_json, _, _ in results:
+            cursor.execute(query, (new_json, report_id, old_json))
+            if cursor.rowcount:
+                extracted = json.loads(new_json)
+                written.add(report_id)
+                observations.append((report_id, extracted.get("metric_values"), extracted.get("metric_units")))
+        for statement, rows in MetricObservation.replace_statements(observations):
+            cursor.executemany(statement, rows)
+        return written
+
+    if not results:
+        return set()
+    return DBManager.run_in_transaction(write)
+
+
+def run_backfill(workers: int = 2, batch_size: int = 200, pause_seconds: float = 0.5,
+                 limit: Optional[int] = None, dry_run: bool = False) -> Dict:
+    """Refreshes stale extractions; returns counts per action and failures."""
+    planned: Counter = Counter()
+    done: Counter = Counter()
+    failures: List[Tuple[str, str]] = []
+    skipped = 0  # changed while being refreshed (e.g. reprocessed); left alone
+    start = time.perf_counter()
+
+    def _batches() -> Iterator[List[BackfillJob]]:
+        batch: List[BackfillJob] = []
+        for n, job in enumerate(iter_stale_jobs(), 1):
+            batch.append(job)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+            if limit and n >= limit:
+                break
+        if batch:
+            yield batch
+
+    if dry_run:
+        for batch in _batches():
+            planned.update(job[3] for job in batch)
+        print(f"[backfill] Dry run – stale reports by action: {dict(planned)}")
+        return {"planned": dict(planned), "done": {}, "skipped_changed": 0, "failed": 0, "seconds": 0.0}
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_lower_priority) as pool:
+        for batch in _batches():
+            planned.update(job[3] for job in batch)
+            # One chunk per worker, so each rescan is a vectorised pass over many reports
+            chunk = -(-len(batch) // workers)
+            chunks = [batch[i:i + chunk] for i in range(0, len(batch), chunk)]
+            results = [r for part in pool.map(refresh_extractions, chunks) for r in part]
+            ok = [r for r in results if r[4] is None]
+            for report_id, _, _, action, error in results:
+                if error:
+                    failures.append((report_id, error))
+            # One transaction per batch, written from this process only
+            written = _write_batch(ok)
+            if written is None:
+                failures.extend((r[0], "database write failed") for r in ok)
+            else:
+                done.update(r[3] for r in ok if r[0] in written)
+                skipped += len(ok) - len(written)
+            print(f"[backfill] {sum(planned.values())} processed – {dict(done)}, {skipped} changed meanwhile, "
+                  f"{len(failures)} failed")
+            if pause_seconds:
+                time.sleep(pause_seconds)  # throttle: leave room for live uploads
+
+    summary = {
+        "planned": dict(planned),
+        "done": dict(done),
+        "skipped_changed": skipped,
+        "failed": len(failures),
+        "seconds": round(time.perf_counter() - start, 2),
+    }
+    print(f"[backfill] Finished: {summary}")
+    for report_id, error in failures[:20]:
+        print(f"  ✗ {report_id}: {error}")
+    return summary
@@ -0,0 +1,115 @@
+# services/llm_backends.py
+"""
+Interchangeable backends for the AI recommendation engine.
+
+Every backend offers the same coroutine and async generator
+
+    response = await backend.chat(model, messages, temperature=..., max_tokens=..., response_format=...)
+    async for delta in backend.stream_chat(model, messages, ...): ...
+
+`chat` returns an `LLMResponse` (services/llm_client.py); `stream_chat`
+yields the answer's text as it is generated and fills an optional `usage`
+dict with the tokens it used. Each backend also has a `counters` dict.
+
+    "openai" – the OpenAI API (OPENAI_API_KEY; OPENAI_BASE_URL for another OpenAI-compatible host)
+    "stub"   – the local OpenAI-compatible stub server (llm_stub_server.py) at LLM_STUB_URL
+    "fake"   – in-process and deterministic: no network, no key, same prompt → same answer
+
+AI_BACKEND in config.py selects the backend the engine uses; `create_backend`
+builds one explicitly (e.g. for load tests).
+"""
+import asyncio
+import json
+import os
+import re
+import time
+
+from config import OPENAI_API_KEY, OPENAI_BASE_URL, LLM_STUB_URL
+from services.llm_client import AsyncLLMClient, LLMResponse
+
+BACKENDS = ("openai", "stub", "fake")
+
+_ABNORMAL_RE = re.compile(r"^([^:\n]+): .* (HIGH|LOW) \(ref", re.MULTILINE)
+
+# Streamed answers come in pieces of this many characters, this many seconds apart
+_STREAM_PIECE, _STREAM_INTERVAL = 8, 0.01
+
+
+class FakeLLMBackend:
+    """
+    Deterministic stand-in for the model: the answer is derived from the
+    out-of-range lines of the prompt. `latency_ms` adds a fixed delay, so the
+    rest of the pipeline can be load-tested without any HTTP.
+    """
+
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency_ms = latency_ms
+        self.counters = {"requests": 0}
+
+    @staticmethod
+    def complete(messages: list) -> str:
+        """The answer's JSON content for `messages` (no delay, no counting)."""
+        prompt = "\n".join(m.get("content") or "" for m in messages)
+        abnormal = [f"{name} ({direction.lower()})" for name, direction in _ABNORMAL_RE.findall(prompt)]
+        if abnormal:
+            treatment = f"Review the out-of-range results with the patient: {', '.join(abnormal)}."
+        else:
+            treatment = "No treatment needed; all reported results are within range."
+        return json.dumps({
+            "treatment_suggestions": treatment,
+            "lifestyle_recommendations": "Balanced diet, regular exercise, adequate sleep and stress management.",
+            "priority": "High" if len(abnormal) >= 3 else "Medium" if abnormal else "Low",
+        })
+
+    @staticmethod
+    def _count_tokens(messages: list) -> int:
+        """Rough token count of a prompt (~4 characters per token)."""
+        return sum(len(m.get("content") or "") for m in messages) // 4
+
+    async def chat(self, model: str, messages: list, temperature: float = 0.7, max_tokens: int = 1500,
+                   response_format: dict = None) -> LLMResponse:
+        self.counters["requests"] += 1
+        start = time.perf_counter()
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+        content = self.complete(messages)
+        prompt_tokens = self._count_tokens(messages)
+        completion_tokens = len(content) // 4
+        return LLMResponse(content, prompt_tokens, completion_tokens, prompt_tokens + completion_tokens,
+                           latency_ms=(time.perf_counter() - start) * 1000)
+
+
+    async def stream_chat(self, model: str, messages: list, temperature: float = 0.7, max_tokens: int = 1500,
+                          response_format: dict = None, usage: dict = None):
+        """Yields the answer in small pieces: the first after `latency_ms`, then at a typing pace."""
+        self.counters["requests"] += 1
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+        content = self.complete(messages)
+        for i in range(0, len(content), _STREAM_PIECE):
+            yield content[i:i + _STREAM_PIECE]
+            await asyncio.sleep(_STREAM_INTERVAL)
+        if usage is not None:
+            usage.update(prompt_tokens=self._count_tokens(messages), completion_tokens=len(content) // 4, retries=0)
+
+
+def create_backend(name: str, **options):
+    """
+    A new backend of kind `name` (see BACKENDS). `options` go to the
+    constructor, e.g. rate limits for AsyncLLMClient or latency_ms for the fake.
+    """
+    if name == "openai":
+        from dotenv import load_dotenv
+        # Load API key from .env
+        load_dotenv()
+        api_key = OPENAI_API_KEY or os.getenv('OPENAI_API_KEY', '')
+        # Ensure API key is available (another OpenAI-compatible host may not need one)
+        if not api_key and not OPENAI_BASE_URL:
+            raise ValueError("OPENAI_API_KEY environment variable not set.")
+        return AsyncLLMClient(api_key=api_key, **options)
+    if name == "stub":
+        options.setdefault("base_url", LLM_STUB_URL)
+        return AsyncLLMClient(api_key="stub", **options)
+    if name == "fake":
+        return FakeLLMBackend(**options)
+    raise ValueError(f"Unknown AI backend '{name}' (expected one of: {', '.join(BACKENDS)})")
@@ -0,0 +1,303 @@
+# services/llm_batch.py
+"""
+Offline batch generation of AI recommendations, e.g. to regenerate the back catalogue.
+
+    1. write_batch_requests()  – one chat-completion request per report in a JSONL
+                                 file, in the OpenAI Batch API format (custom_id = report_id)
+    2. run the file through a batch endpoint, or write_fake_results() to stay offline
+    3. ingest_batch_results()  – parses the result file and applies it in bulk,
+                                 one transaction per chunk of reports
+
+A result is applied the way a pipeline run would have stored it:
+  - the report's AI checkpoint (ai_output_json) is replaced;
+  - a recommendation still awaiting review gets the new AI suggestions
+    (reviewed ones are left alone unless overwrite_reviewed=True, which sends
+    them back for review: 'pending_doctor_review', the doctor's approved
+    treatment/lifestyle and review date cleared, their notes kept);
+  - a report with a doctor but no recommendation gets one ('pending_doctor_review');
+  - a report without a doctor only gets the checkpoint, which the pipeline
+    picks up after allocation;
+  - 'pending_ai' reports go back to 'extracted' once they have a recommendation.
+
+Every result line is also recorded in the llm_calls telemetry (mode 'batch',
+priced at the batch discount), including the failed ones.
+"""
+import json
+import random
+import uuid
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from database.db_utils import DBManager
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+
+# Recommendation statuses a doctor hasn't acted on yet
+_AWAITING_REVIEW = ("AI_generated", "pending_doctor_review")
+
+
+def select_reports(report_ids: List[str] = None, status: str = None, only_missing: bool = False,
+                   limit: int = None) -> List[dict]:
+    """Reports to (re)generate: explicit ids, or by processing status and/or lacking a recommendation."""
+    query = """
+        SELECT hr.report_id, hr.extracted_data_json
+        FROM health_reports hr
+        LEFT JOIN recommendations r ON r.report_id = hr.report_id
+        WHERE 1 = 1
+    """
+    params = []
+    if report_ids:
+        query += f" AND hr.report_id IN ({', '.join('?' * len(report_ids))})"
+        params.extend(report_ids)
+    if status:
+        query += " AND hr.processing_status = ?"
+        params.append(status)
+    if only_missing:
+        query += " AND r.recommendation_id IS NULL"
+    query += " ORDER BY hr.upload_date ASC"
+    if limit:
+        query += " LIMIT ?"
+        params.append(limit)
+    return DBManager.fetch_all(query, tuple(params))
+
+
+def write_batch_requests(path: str, reports: List[dict]) -> Dict[str, int]:
+    """
+    Writes one batch request per report with extracted data to `path`.
+    Returns {"written": n, "skipped": n} (skipped = nothing extracted to send).
+    """
+    from services.ai_recommendation_engine import MODEL, TEMPERATURE, MAX_TOKENS, build_messages
+    counts = {"written": 0, "skipped": 0}
+    with open(path, "w", encoding="utf-8") as f:
+        for row in reports:
+            extracted = json.loads(row["extracted_data_json"] or "{}")
+            if not extracted.get("raw_text"):
+                counts["skipped"] += 1
+                continue
+            request = {
+                "custom_id": row["report_id"],
+                "method": "POST",
+                "url": BATCH_ENDPOINT,
+                "body": {
+                    "model": MODEL,
+                    "messages": build_messages(extracted),
+                    "temperature": TEMPERATURE,
+                    "max_tokens": MAX_TOKENS,
+                    "response_format": {"type": "json_object"},
+                },
+            }
+            f.write(json.dumps(request, ensure_ascii=False) + "\n")
+            counts["written"] += 1
+    print(f"[LLMBatch] {counts['written']} request(s) written to {path} ({counts['skipped']} without extracted data).")
+    return counts
+
+
+def write_fake_results(requests_path: str, results_path: str, error_rate: float = 0.0,
+                       invalid_rate: float = 0.0, seed: int = 0) -> int:
+    """
+    Answers a batch-request file offline with the deterministic fake backend, in
+    the batch output format. `error_rate` / `invalid_rate` inject failed requests
+    and unparseable answers. Returns the number of result lines.
+    """
+    from services.llm_backends import FakeLLMBackend
+    rng = random.Random(seed)
+    n = 0
+    with open(requests_path, encoding="utf-8") as src, open(results_path, "w", encoding="utf-8") as out:
+        for line in src:
+            if not line.strip():
+                continue
+            request = json.loads(line)
+            n += 1
+            result = {"id": f"batch_req_fake_{n}", "custom_id": request["custom_id"], "response": None, "error": None}
+            draw = rng.random()
+            if draw < error_rate:
+                result["error"] = {"code": "server_error", "message": "Injected failure (fake)"}
+            else:
+                content = "not json" if draw < error_rate + invalid_rate else FakeLLMBackend.complete(request["body"]["messages"])
+                prompt_tokens = FakeLLMBackend._count_tokens(request["body"]["messages"])
+                result["response"] = {"status_code": 200, "request_id": f"req_fake_{n}", "body": {
+                    "object": "chat.completion",
+                    "model": request["body"].get("model"),
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": content}}],
+                    "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(content) // 4,
+                              "total_tokens": prompt_tokens + len(content) // 4},
+                }}
+            out.write(json.dumps(result) + "\n")
+    print(f"[LLMBatch] {n} fake result(s) written to {results_path}.")
+    return n
+
+
+def _read_results(path: str) -> Iterator[Tuple[str, Optional[dict], Optional[str], Optional["LLMCall"]]]:
+    """(report_id, recommendations or None, error or None, telemetry or None) per result line."""
+    from models.llm_call import LLMCall
+    from services.ai_recommendation_engine import MODEL, parse_ai_response
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                result = json.loads(line)
+                report_id = result["custom_id"]
+            except (json.JSONDecodeError, KeyError, TypeError):
+                yield None, None, f"line {line_no}: not a batch result", None
+                continue
+            response = result.get("response") or {}
+            body = response.get("body") or {}
+            usage = body.get("usage") or {}
+            call = LLMCall(report_id=report_id, mode="batch", model=body.get("model") or MODEL, backend="batch",
+                           request_id=result.get("id"), prompt_tokens=usage.get("prompt_tokens"), completion_tokens=usage.get("completion_tokens"))
+            if result.get("error") or response.get("status_code") != 200:
+                error = result.get("error") or {}
+                call.status = "error"
+                yield report_id, None, error.get("message") or f"HTTP {response.get('status_code')}", call
+                continue
+            try:
+                content = body["choices"][0]["message"]["content"]
+            except (KeyError, IndexError, TypeError):
+                call.status = "invalid"
+                yield report_id, None, "no message in response", call
+                continue
+            recommendations = parse_ai_response(content)
+            if recommendations is None:
+                call.status = "invalid"
+                yield report_id, None, "invalid AI response", call
+            else:
+                yield report_id, recommendations, None, call
+
+
+def _record_calls(calls: list) -> None:
+    """Saves batch telemetry; results for reports that no longer exist are kept without a report."""
+    from models.llm_call import LLMCall
+    ids = list({call.report_id for call in calls})
+    known = set()
+    for i in range(0, len(ids), 500):
+        part = ids[i:i + 500]
+        known.update(row["report_id"] for row in DBManager.fetch_all(
+            f"SELECT report_id FROM health_reports WHERE report_id IN ({', '.join('?' * len(part))})", tuple(part)))
+    for call in calls:
+        if call.report_id not in known:
+            call.report_id = None
+    LLMCall.bulk_create(calls)
+
+
+def _apply_chunk(results: Dict[str, dict], overwrite_reviewed: bool) -> Counter:
+    """
+    Applies {report_id: recommendations} in one transaction; returns counts per outcome.
+    Recommendation statuses are read inside it, so a doctor's review can't slip in between.
+    """
+    ids = list(results)
+    placeholders = ", ".join("?" * len(ids))
+    now = datetime.now(timezone.utc).isoformat()
+    outcomes = Counter()
+
+    def work(cursor) -> Counter:
+        reports = {r["report_id"]: r for r in cursor.execute(
+            f"SELECT report_id, patient_id, assigned_doctor_id FROM health_reports WHERE report_id IN ({placeholders})",
+            tuple(ids)).fetchall()}
+        existing = {r["report_id"]: r for r in cursor.execute(
+            f"SELECT recommendation_id, report_id, status FROM recommendations WHERE report_id IN ({placeholders})",
+            tuple(ids)).fetchall()}
+
+        checkpoints, updates, reopened, inserts, completed = [], [], [], [], []
+        for report_id, ai in results.items():
+            report = reports.get(report_id)
+            if report is None:
+                outcomes["unknown_report"] += 1
+                continue
+            ai_fields = (ai.get("treatment_suggestions", ""), ai.get("lifestyle_recommendations", ""),
+                         ai.get("priority", "Medium"))
+            rec = existing.get(report_id)
+            reviewed = rec is not None and rec["status"] not in _AWAITING_REVIEW
+            if reviewed and not overwrite_reviewed:
+                outcomes["skipped_reviewed"] += 1
+                continue
+            checkpoints.append((json.dumps(ai), report_id))
+            if reviewed:
+                # What the doctor approved was the old suggestion, so the new one needs a fresh review
+                reopened.append(ai_fields + ("pending_doctor_review", now, rec["recommendation_id"]))
+                completed.append((now, report_id))
+                outcomes["reopened"] += 1
+            elif rec:
+                updates.append(ai_fields + (now, rec["recommendation_id"]))
+                completed.append((now, report_id))
+                outcomes["updated"] += 1
+            elif report["assigned_doctor_id"]:
+                inserts.append((str(uuid.uuid4()), report_id, report["patient_id"], report["assigned_doctor_id"])
+                               + ai_fields + ("pending_doctor_review", now))
+                completed.append((now, report_id))
+                outcomes["created"] += 1
+            else:
+                outcomes["checkpointed"] += 1
+
+        statements = [
+            ("UPDATE health_reports SET ai_output_json = ? WHERE report_id = ?", checkpoints),
+            ("""
+                UPDATE recommendations
+                SET ai_generated_treatment = ?, ai_generated_lifestyle = ?, ai_generated_priority = ?,
+                    last_updated_at = ?
+                WHERE recommendation_id = ?
+            """, updates),
+            ("""
+                UPDATE recommendations
+                SET ai_generated_treatment = ?, ai_generated_lifestyle = ?, ai_generated_priority = ?,
+                    status = ?, approved_treatment = NULL, approved_lifestyle = NULL, reviewed_date = NULL,
+                    last_updated_at = ?
+                WHERE recommendation_id = ?
+            """, reopened),
+            ("""
+                INSERT INTO recommendations (recommendation_id, report_id, patient_id, doctor_id,
+                                            ai_generated_treatment, ai_generated_lifestyle,
+                                            ai_generated_priority, status, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, inserts),
+            ("""
+                UPDATE health_reports
+                SET processing_status = CASE WHEN processing_status = 'pending_ai' THEN 'extracted'
+                                             ELSE processing_status END,
+                    pipeline_stage = 'completed', pipeline_stage_updated_at = ?
+                WHERE report_id = ?
+            """, completed),
+        ]
+        for query, rows in statements:
+            if rows:
+                cursor.executemany(query, rows)
+        return outcomes
+
+    if DBManager.run_in_transaction(work) is None:
+        applied = outcomes["updated"] + outcomes["reopened"] + outcomes["created"] + outcomes["checkpointed"]
+        return Counter(unknown_report=outcomes["unknown_report"], skipped_reviewed=outcomes["skipped_reviewed"],
+                       db_failed=applied)
+    return outcomes
+
+
+def ingest_batch_results(path: str, chunk_size: int = 500, overwrite_reviewed: bool = False) -> Dict:
+    """
+    Applies a batch result file to the reports' recommendations, `chunk_size`
+    reports per transaction. Returns counts per outcome plus "failed" (requests
+    that errored or returned an unusable answer) and up to 20 failure messages.
+    """
+    outcomes = Counter()
+    failures = []
+    chunk: Dict[str, dict] = {}
+    calls = []
+    for report_id, recommendations, error, call in _read_results(path):
+        if call is not None:
+            calls.append(call)
+        if error:
+            outcomes["failed"] += 1
+            failures.append((report_id, error))
+            continue
+        chunk[report_id] = recommendations  # a report listed twice keeps its last result
+        if len(chunk) >= chunk_size:
+            outcomes.update(_apply_chunk(chunk, overwrite_reviewed))
+            chunk = {}
+    if chunk:
+        outcomes.update(_apply_chunk(chunk, overwrite_reviewed))
+    _record_calls(calls)
+
+    summary = dict(outcomes)
+    summary["failures"] = failures[:20]
+    print(f"[LLMBatch] Ingested {path}: {dict(outcomes)}")
+    return summary
@@ -0,0 +1,112 @@
+# services/llm_cache.py
+"""
+Persistent (SQLite) cache of LLM responses.
+
+Re-uploaded or re-processed reports with identical metrics, flags and patient
+fields produce the same prompt, so the model's earlier answer is reused
+instead of paying for another call. Entries are keyed by a hash of the model,
+the temperature and the canonical prompt messages; they expire after
+LLM_CACHE_TTL_SECONDS and the least recently used ones are evicted beyond
+LLM_CACHE_MAX_ENTRIES. Hits, misses, bypasses and the latency / tokens the
+hits saved are counted in llm_cache_stats.
+"""
+import hashlib
+import json
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from config import LLM_CACHE_TTL_SECONDS, LLM_CACHE_MAX_ENTRIES
+from database.db_utils import DBManager
+
+# Bump to invalidate every cached response (e.g. when the output schema changes)
+LLM_CACHE_VERSION = "1"
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class LLMResponseCache:
+    """Key → parsed model response, with TTL and LRU eviction."""
+
+    def __init__(self, ttl_seconds: int = LLM_CACHE_TTL_SECONDS, max_entries: int = LLM_CACHE_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+
+    @staticmethod
+    def make_key(model: str, temperature: float, messages: list) -> str:
+        """sha256 over a canonical JSON encoding of everything that shapes the response."""
+        payload = json.dumps(
+            {"v": LLM_CACHE_VERSION, "model": model, "temperature": float(temperature), "messages": messages},
+            sort_keys=True, separators=(",", ":"), ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _expiry_cutoff(self) -> str:
+        return (_now() - timedelta(seconds=self.ttl_seconds)).isoformat()
+
+    def get(self, key: str) -> Optional[dict]:
+        """Cached response for `key` (counted as a hit), or None (counted as a miss)."""
+        row = DBManager.fetch_one("SELECT * FROM llm_cache WHERE cache_key = ?", (key,))
+        if row and self.ttl_seconds and row["created_at"] < self._expiry_cutoff():
+            DBManager.execute_query("DELETE FROM llm_cache WHERE cache_key = ?", (key,))
+            row = None
+        if not row:
+            self._bump(misses=1)
+            return None
+        DBManager.execute_query(
+            "UPDATE llm_cache SET last_accessed_at = ?, hit_count = hit_count + 1 WHERE cache_key = ?",
+            (_now().isoformat(), key),
+        )
+        self._bump(hits=1, latency_saved_ms=row["latency_ms"] or 0, tokens_saved=row["total_tokens"] or 0)
+        return json.loads(row["response_json"])
+
+    def put(self, key: str, model: str, temperature: float, response: dict,
+            total_tokens: int = None, latency_ms: float = None) -> bool:
+        now = _now().isoformat()
+        saved = DBManager.execute_query(
+            """
+            INSERT OR REPLACE INTO llm_cache
+                (cache_key, model, temperature, response_json, total_tokens, latency_ms,
+                 created_at, last_accessed_at, hit_count)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0)
+            """,
+            (key, model, float(temperature), json.dumps(response), total_tokens, latency_ms, now, now),
+        )
+        self.evict()
+        return saved
+
+    def evict(self) -> None:
+        """Drops expired entries, then the least recently used ones beyond max_entries."""
+        if self.ttl_seconds:
+            DBManager.execute_query("DELETE FROM llm_cache WHERE created_at < ?", (self._expiry_cutoff(),))
+        if self.max_entries:
+            DBManager.execute_query(
+                "DELETE FROM llm_cache WHERE cache_key IN "
+                "(SELECT cache_key FROM llm_cache ORDER BY last_accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def record_bypass(self) -> None:
+        """A caller skipped the lookup on purpose (e.g. a doctor asked for a fresh suggestion)."""
+        self._bump(bypasses=1)
+
+    @staticmethod
+    def _bump(**counters) -> None:
+        DBManager.execute_many(
+            "INSERT INTO llm_cache_stats (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            list(counters.items()),
+        )
+
+    @staticmethod
+    def stats() -> dict:
+        """Counters plus the derived hit rate and the current number of entries."""
+        stats = {"hits": 0, "misses": 0, "bypasses": 0, "latency_saved_ms": 0.0, "tokens_saved": 0}
+        for row in DBManager.fetch_all("SELECT name, value FROM llm_cache_stats"):
+            stats[row["name"]] = row["value"] if row["name"] == "latency_saved_ms" else int(row["value"])
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else None
+        entries = DBManager.fetch_one("SELECT COUNT(*) AS n FROM llm_cache")
+        stats["entries"] = entries["n"] if entries else 0
+        return stats
@@ -0,0 +1,318 @@
+# services/llm_client.py
+"""
+Shared asyncio client for chat completions, safe to call from many reports at once.
+
+    client = AsyncLLMClient()
+    response = await client.chat(model, messages, temperature=0.7, max_tokens=1500)
+    response = run_sync(client.chat(...))        # from threads (the pipeline's stages)
+    for delta in iterate_sync(client.stream_chat(...)):   # streamed, e.g. into the UI
+
+- Two token buckets keep us under the provider's requests-per-minute and
+  tokens-per-minute limits: a request waits for 1 request token and for its
+  estimated tokens (prompt + max_tokens); the estimate is corrected by the
+  actual usage afterwards.
+- A semaphore bounds concurrent HTTP requests.
+- 429s, timeouts, connection errors and 5xx are retried with full-jitter
+  exponential backoff (or the server's Retry-After).
+- Identical in-flight requests are coalesced: callers share one HTTP call
+  (`coalesce=False` turns this off, e.g. to load-test with identical reports).
+
+`base_url` points the client at any OpenAI-compatible server, e.g. the local
+stub in llm_stub_server.py.
+"""
+import asyncio
+import hashlib
+import json
+import random
+import threading
+import time
+from typing import Optional
+
+from config import (OPENAI_API_KEY, OPENAI_BASE_URL, LLM_REQUESTS_PER_MINUTE, LLM_TOKENS_PER_MINUTE,
+                    LLM_MAX_CONCURRENCY, LLM_MAX_RETRIES)
+
+
+class TokenBucket:
+    """`per_minute` tokens, refilled continuously, at most one minute's worth banked."""
+
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()  # waiters are served in arrival order
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, amount: float = 1) -> float:
+        """Waits until `amount` tokens are available and takes them; returns the seconds waited."""
+        amount = min(amount, self.capacity)  # an oversized request must still be able to run
+        waited = 0.0
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return waited
+                delay = (amount - self.tokens) / self.rate
+                waited += delay
+                await asyncio.sleep(delay)
+
+    def settle(self, estimated: float, actual: float):
+        """Gives back (or charges) the difference between the estimated and the actual cost."""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + estimated - actual)
+
+
+class LLMResponse:
+    def __init__(self, content: str, prompt_tokens: int = None, completion_tokens: int = None,
+                 total_tokens: int = None, latency_ms: float = None, retries: int = 0):
+        self.content = content
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        self.total_tokens = total_tokens
+        self.latency_ms = latency_ms  # including rate-limit waits and retries
+        self.retries = retries
+        self.coalesced = False        # True for callers that shared another caller's request
+
+
+def _is_retryable(exc: Exception) -> bool:
+    import openai
+    if isinstance(exc, (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError)):
+        return True
+    return isinstance(exc, openai.APIStatusError) and exc.status_code >= 500
+
+
+def _retry_after(exc: Exception) -> Optional[float]:
+    response = getattr(exc, "response", None)
+    try:
+        return float(response.headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+class AsyncLLMClient:
+    def __init__(self, api_key: str = None, base_url: str = None,
+                 requests_per_minute: float = LLM_REQUESTS_PER_MINUTE,
+                 tokens_per_minute: float = LLM_TOKENS_PER_MINUTE,
+                 max_concurrency: int = LLM_MAX_CONCURRENCY, max_retries: int = LLM_MAX_RETRIES,
+                 base_delay: float = 0.5, max_delay: float = 20.0, timeout: float = 60.0,
+                 coalesce: bool = True):
+        from openai import AsyncOpenAI
+        # Our own retry loop replaces the SDK's, so limits and backoff are applied once
+        self._openai = AsyncOpenAI(api_key=api_key or OPENAI_API_KEY or "not-needed",
+                                   base_url=base_url or OPENAI_BASE_URL or None,
+                                   max_retries=0, timeout=timeout)
+        self._requests = TokenBucket(requests_per_minute)
+        self._tokens = TokenBucket(tokens_per_minute)
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.coalesce = coalesce
+        self._inflight = {}
+        self.counters = {"requests": 0, "http_calls": 0, "coalesced": 0, "retries": 0, "failures": 0}
+
+    @staticmethod
+    def _request_key(**request) -> str:
+        return hashlib.sha256(json.dumps(request, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _estimate_tokens(messages: list, max_tokens: int) -> int:
+        from services.prompt_builder import count_tokens # Lazy import
+        return sum(count_tokens(m.get("content") or "") for m in messages) + (max_tokens or 0)
+
+    async def chat(self, model: str, messages: list, temperature: float = 0.7, max_tokens: int = 1500,
+                   response_format: dict = None) -> LLMResponse:
+        """One chat completion; shares the HTTP call with an identical request already in flight."""
+        self.counters["requests"] += 1
+        request = dict(model=model, messages=messages, temperature=temperature, max_tokens=max_tokens)
+        if response_format:
+            request["response_format"] = response_format
+        key = self._request_key(**request)
+
+        if not self.coalesce:
+            # Awaited directly, so a caller giving up (e.g. the latency budget) cancels the HTTP call
+            return await self._call(request)
+
+        entry = self._inflight.get(key)
+        if entry is not None:
+            self.counters["coalesced"] += 1
+            shared = await self._join(key, entry)
+            response = LLMResponse(shared.content, shared.prompt_tokens, shared.completion_tokens,
+                                   shared.total_tokens, shared.latency_ms, shared.retries)
+            response.coalesced = True
+            return response
+
+        entry = {"task": asyncio.ensure_future(self._call(request)), "waiters": 0}
+        self._inflight[key] = entry
+        entry["task"].add_done_callback(lambda _: self._forget(key, entry))
+        return await self._join(key, entry)
+
+    def _forget(self, key: str, entry: dict):
+        if self._inflight.get(key) is entry:
+            del self._inflight[key]
+
+    async def _join(self, key: str, entry: dict) -> LLMResponse:
+        """
+        Waits for a shared call. A cancelled waiter doesn't cancel it for the
+        others, but once every waiter has given up the call is cancelled, so it
+        doesn't keep holding a concurrency slot until the HTTP timeout.
+        """
+        task = entry["task"]
+        entry["waiters"] += 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            entry["waiters"] -= 1
+            if not entry["waiters"] and not task.done():
+                self._forget(key, entry)
+                task.cancel()
+
+    async def _call(self, request: dict) -> LLMResponse:
+        start = time.perf_counter()
+        estimate = self._estimate_tokens(request["messages"], request["max_tokens"])
+        for attempt in range(self.max_retries + 1):
+            await self._requests.acquire(1)
+            await self._tokens.acquire(estimate)
+            try:
+                async with self._semaphore:
+                    self.counters["http_calls"] += 1
+                    completion = await self._openai.chat.completions.create(**request)
+            except Exception as e:
+                self._tokens.settle(estimate, 0)  # nothing was consumed
+                if attempt >= self.max_retries or not _is_retryable(e):
+                    self.counters["failures"] += 1
+                    raise
+                self.counters["retries"] += 1
+                # Full jitter: spreads the retries of a burst of 429s instead of synchronising them
+                delay = _retry_after(e) or random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                print(f"[LLMClient] {type(e).__name__}; retry {attempt + 1}/{self.max_retries} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+                continue
+
+            usage = getattr(completion, "usage", None)
+            total = getattr(usage, "total_tokens", None)
+            if total is not None:
+                self._tokens.settle(estimate, total)
+            return LLMResponse(
+                completion.choices[0].message.content,
+                prompt_tokens=getattr(usage, "prompt_tokens", None),
+                completion_tokens=getattr(usage, "completion_tokens", None),
+                total_tokens=total,
+                latency_ms=(time.perf_counter() - start) * 1000,
+                retries=attempt,
+            )
+
+
+    async def stream_chat(self, model: str, messages: list, temperature: float = 0.7, max_tokens: int = 1500,
+                          response_format: dict = None, usage: dict = None):
+        """
+        Streams one chat completion: yields the content deltas as they arrive.
+        Rate limits and the concurrency bound apply as for chat(); failures are
+        retried only until the first delta (after that the caller has shown text).
+        Streams are never coalesced. A `usage` dict is filled with the call's
+        'retries' and, once the stream ends, its 'prompt_tokens' / 'completion_tokens'.
+        """
+        usage = {} if usage is None else usage
+        self.counters["requests"] += 1
+        request = dict(model=model, messages=messages, temperature=temperature, max_tokens=max_tokens,
+                       stream=True, stream_options={"include_usage": True})
+        if response_format:
+            request["response_format"] = response_format
+        estimate = self._estimate_tokens(messages, max_tokens)
+        for attempt in range(self.max_retries + 1):
+            await self._requests.acquire(1)
+            await self._tokens.acquire(estimate)
+            usage["retries"] = attempt
+            started = False
+            total = None
+            try:
+                async with self._semaphore:
+                    self.counters["http_calls"] += 1
+                    stream = await self._openai.chat.completions.create(**request)
+                    async for chunk in stream:
+                        chunk_usage = getattr(chunk, "usage", None)
+                        if chunk_usage is not None:
+                            total = getattr(chunk_usage, "total_tokens", None)
+                            usage["prompt_tokens"] = getattr(chunk_usage, "prompt_tokens", None)
+                            usage["completion_tokens"] = getattr(chunk_usage, "completion_tokens", None)
+                        delta = chunk.choices[0].delta.content if chunk.choices else None
+                        if delta:
+                            started = True
+                            yield delta
+            except Exception as e:
+                self._tokens.settle(estimate, 0)
+                if started or attempt >= self.max_retries or not _is_retryable(e):
+                    self.counters["failures"] += 1
+                    raise
+                self.counters["retries"] += 1
+                delay = _retry_after(e) or random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                print(f"[LLMClient] {type(e).__name__} before the stream started; "
+                      f"retry {attempt + 1}/{self.max_retries} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+                continue
+            if total is not None:
+                self._tokens.settle(estimate, total)
+            return
+
+
+# --- One event loop in a background thread, shared by every app thread ---
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="llm-client-loop", daemon=True).start()
+    return _loop
+
+
+def run_sync(coro, timeout: float = None):
+    """Runs `coro` on the shared loop and blocks the calling thread until it finishes."""
+    return asyncio.run_coroutine_threadsafe(coro, _get_loop()).result(timeout)
+
+
+_STREAM_END = object()
+
+
+def iterate_sync(agen, first_item_timeout: float = None):
+    """
+    Consumes the async generator `agen` on the shared loop and yields its items
+    in the calling thread as they arrive. Raises TimeoutError if the first item
+    takes longer than `first_item_timeout` seconds (the stream is then cancelled).
+    """
+    import queue
+    items = queue.Queue()
+
+    async def pump():
+        try:
+            async for item in agen:
+                items.put(item)
+        except BaseException as e:
+            items.put(e)
+        else:
+            items.put(_STREAM_END)
+
+    future = asyncio.run_coroutine_threadsafe(pump(), _get_loop())
+    first = True
+    try:
+        while True:
+            try:
+                item = items.get(timeout=first_item_timeout if first else None)
+            except queue.Empty:
+                raise TimeoutError(f"no output within {first_item_timeout:g}s")
+            first = False
+            if item is _STREAM_END:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        future.cancel()  # no-op once the stream has finished
@@ -0,0 +1,45 @@
+# services/pending_ai_sweeper.py
+"""
+Background thread that fills in the recommendations of 'pending_ai' reports.
+
+Reports are parked as 'pending_ai' when the LLM is unavailable (circuit
+breaker open, error, or over the latency budget). Every
+PENDING_AI_SWEEP_SECONDS the sweeper resumes them via
+DocumentParser.sweep_pending_ai, which stops while the breaker is open, so
+an outage costs one trial call per sweep at most.
+"""
+import threading
+from typing import Optional
+
+from config import PENDING_AI_SWEEP_SECONDS
+
+_thread: Optional[threading.Thread] = None
+_stop = threading.Event()
+_lock = threading.Lock()
+
+
+def _run(interval: float):
+    from services.document_parser import DocumentParser # Lazy import: keeps app start-up light
+    while not _stop.wait(interval):
+        try:
+            DocumentParser.sweep_pending_ai()
+        except Exception as e:
+            print(f"[PendingAISweeper] Sweep failed: {type(e).__name__}: {e}")
+
+
+def start(interval: float = PENDING_AI_SWEEP_SECONDS) -> bool:
+    """Starts the sweeper once per process; returns False if it is disabled (interval 0)."""
+    global _thread
+    if not interval:
+        return False
+    with _lock:
+        if _thread is None or not _thread.is_alive():
+            _stop.clear()
+            _thread = threading.Thread(target=_run, args=(interval,), name="pending-ai-sweeper", daemon=True)
+            _thread.start()
+            print(f"[PendingAISweeper] Sweeping 'pending_ai' reports every {interval:g}s.")
+    return True
+
+
+def stop():
+    _stop.set()
@@ -0,0 +1,121 @@
+# services/pipeline_tracing.py
+"""
+Lightweight per-stage tracing for the report processing pipeline.
+
+    with PipelineTrace(report_id) as trace:          # persisted to pipeline_runs on exit
+        with trace.span("text_extraction", input_bytes=size):
+            ...
+            pipeline_tracing.annotate(pages=3)        # from any code running inside the span
+            pipeline_tracing.incr("ocr_pages")
+
+The active trace and span live in context variables, so extractors can attach
+page / OCR counts without threading a tracer through their signatures.
+Outside of a trace, `span`, `annotate` and `incr` are no-ops.
+"""
+import contextvars
+import datetime
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Optional
+
+_current_trace = contextvars.ContextVar("pipeline_trace", default=None)
+_current_span = contextvars.ContextVar("pipeline_span", default=None)
+
+
+class Span:
+    def __init__(self, stage: str, **attrs):
+        self.stage = stage
+        self.attrs = dict(attrs)
+        self.status = "ok"
+        self.error = None
+        self.started_at = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        self.duration_ms = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def incr(self, key: str, n: int = 1):
+        self.attrs[key] = self.attrs.get(key, 0) + n
+
+
+class PipelineTrace:
+    def __init__(self, report_id: str):
+        self.run_id = str(uuid.uuid4())
+        self.report_id = report_id
+        self.spans: list[Span] = []
+        self._token = None
+
+    @contextmanager
+    def span(self, stage: str, **attrs):
+        """Times a stage; the span is marked 'error' if the block raises."""
+        span = Span(stage, **attrs)
+        token = _current_span.set(span)
+        start = time.perf_counter()
+        try:
+            yield span
+        except Exception as e:
+            span.status = "error"
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span.duration_ms = (time.perf_counter() - start) * 1000
+            _current_span.reset(token)
+            self.spans.append(span)
+
+    def __enter__(self) -> "PipelineTrace":
+        self._token = _current_trace.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current_trace.reset(self._token)
+        self.save()
+        return False
+
+    def save(self) -> bool:
+        """Persists one pipeline_runs row per recorded span."""
+        from models.pipeline_run import PipelineRun # Lazy import
+        if not self.spans:
+            return True
+        ok = PipelineRun.bulk_create(self.run_id, self.report_id, self.spans)
+        summary = ", ".join(f"{s.stage}={s.duration_ms:.0f}ms" for s in self.spans)
+        print(f"[PipelineTrace] report {self.report_id}: {summary}")
+        return ok
+
+
+def current_trace() -> Optional[PipelineTrace]:
+    return _current_trace.get()
+
+
+@contextmanager
+def span(stage: str, **attrs):
+    """Span on the active trace, or an unrecorded one when no trace is active."""
+    trace = _current_trace.get()
+    if trace is None:
+        yield Span(stage, **attrs)
+        return
+    with trace.span(stage, **attrs) as s:
+        yield s
+
+
+def annotate(**attrs):
+    """Attaches attributes (e.g. pages=3) to the innermost active span, if any."""
+    s = _current_span.get()
+    if s is not None:
+        s.set(**attrs)
+
+
+def incr(key: str, n: int = 1):
+    """Increments a counter (e.g. 'ocr_pages') on the innermost active span, if any."""
+    s = _current_span.get()
+    if s is not None:
+        s.incr(key, n)
+
+
+def mark_error(error: str = None):
+    """Marks the innermost active span as failed without raising (e.g. a stage returning False)."""
+    s = _current_span.get()
+    if s is not None:
+        s.status = "error"
+        if error:
+            s.error = error
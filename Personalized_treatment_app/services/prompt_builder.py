@@ -0,0 +1,124 @@
+# services/prompt_builder.py
+"""
+Compact, token-budgeted prompt for the AI recommendation engine.
+
+Only what the model needs to reason about goes in: age and sex, and the
+populated metrics as terse "name: value unit FLAG (ref lo-hi)" lines –
+no raw_text, no "❌ Missing" metrics, no identifiers. When the prompt is
+over `token_budget`, it is shortened in this order until it fits:
+
+    1. normal results lose their values: one "Normal: A, B, C" line
+    2. that line is reduced to a count ("12 other results normal")
+    3. results without a reference range, then out-of-range results, are
+       dropped from the end, with a note of how many were left out
+
+Out-of-range results are listed first, so they are the last to go.
+"""
+import math
+from typing import List, Optional, Tuple
+
+from utils.flagging import flag_code, values_from_flagged, FLAG_LOW, FLAG_HIGH, FLAG_NO_REF
+from utils.metrics import REF_RANGES
+
+_INSTRUCTIONS = (
+    "You are an expert AI assistant specialized in functional and integrative medicine.\n"
+    "Analyze the lab results below and give concise, actionable recommendations.\n"
+    "Reply with a JSON object with exactly these string keys:\n"
+    "treatment_suggestions: medical treatment suggestions (if needed)\n"
+    "lifestyle_recommendations: personalized lifestyle, diet and stress/wellness strategies\n"
+    "priority: High, Medium or Low"
+)
+
+# Patient fields that matter clinically; names and IDs never leave the app
+_PATIENT_FIELDS = ("Age", "Sex")
+
+_encoder = None
+_encoder_loaded = False
+
+
+def count_tokens(text: str) -> int:
+    """
+    Prompt tokens of `text`: exact with tiktoken installed, otherwise the usual
+    ~4 characters per token estimate (good enough to compare prompts).
+    """
+    global _encoder, _encoder_loaded
+    if not _encoder_loaded:
+        _encoder_loaded = True
+        try:
+            import tiktoken # Optional dependency
+            _encoder = tiktoken.get_encoding("o200k_base") # gpt-4o family
+        except Exception:
+            _encoder = None
+    if _encoder is not None:
+        return len(_encoder.encode(text))
+    return math.ceil(len(text) / 4)
+
+
+def _fmt(value: float) -> str:
+    value = float(value)
+    return str(int(value)) if value.is_integer() else f"{value:g}"
+
+
+def _result_lines(extracted_data: dict) -> Tuple[List[str], List[str], List[str], List[str]]:
+    """Abnormal, no-reference and normal result lines (each in extraction order), plus the normal metric names."""
+    values = extracted_data.get("metric_values")
+    if values is None:
+        # Extractions from before metric_values was stored
+        values = values_from_flagged(extracted_data.get("metrics") or {})
+    units = extracted_data.get("metric_units") or {}
+
+    abnormal, no_ref, normal, normal_names = [], [], [], []
+    for metric, value in values.items():
+        if value is None:
+            continue
+        unit = f" {units[metric]}" if units.get(metric) else ""
+        line = f"{metric}: {_fmt(value)}{unit}"
+        flag = flag_code(metric, value)
+        if flag in (FLAG_LOW, FLAG_HIGH):
+            lo, hi = REF_RANGES[metric]
+            abnormal.append(f"{line} {flag.upper()} (ref {_fmt(lo)}-{_fmt(hi)})")
+        elif flag == FLAG_NO_REF:
+            no_ref.append(f"{line} (no ref)")
+        else:
+            normal.append(line)
+            normal_names.append(metric)
+    return abnormal, no_ref, normal, normal_names
+
+
+def _patient_line(extracted_data: dict) -> Optional[str]:
+    info = extracted_data.get("patient_info") or {}
+    fields = [f"{k} {info[k]}" for k in _PATIENT_FIELDS if info.get(k)]
+    return f"Patient: {', '.join(fields)}" if fields else None
+
+
+def build_compact_prompt(extracted_data: dict, token_budget: int) -> str:
+    """The prompt for `extracted_data`, shortened as described above to fit `token_budget` tokens."""
+    head = [_INSTRUCTIONS, ""]
+    patient = _patient_line(extracted_data)
+    if patient:
+        head.append(patient)
+    head.append("Results (out-of-range first):")
+
+    abnormal, no_ref, normal, normal_names = _result_lines(extracted_data)
+    normal_names = [f"Normal: {', '.join(normal_names)}"] if normal else []
+    normal_count = [f"{len(normal)} other results normal"] if normal else []
+
+    def render(kept: List[str], normal_part: List[str], omitted: int) -> str:
+        tail = [f"({omitted} more results omitted)"] if omitted else []
+        return "\n".join(head + kept + normal_part + tail)
+
+    listed = abnormal + no_ref
+    prompt = render(listed, normal, 0)
+    if not token_budget or count_tokens(prompt) <= token_budget:
+        return prompt
+    for normal_part in (normal_names, normal_count):
+        prompt = render(listed, normal_part, 0)
+        if count_tokens(prompt) <= token_budget:
+            return prompt
+    kept = list(listed)
+    while kept and count_tokens(prompt) > token_budget:
+        kept.pop()
+        prompt = render(kept, normal_count, len(listed) - len(kept))
+    print(f"[PromptBuilder] Prompt shortened to {count_tokens(prompt)} tokens "
+          f"(budget {token_budget}, {len(listed) - len(kept)} result(s) omitted).")
+    return prompt
@@ -0,0 +1,126 @@
+# services/rule_recommendations.py
+"""
+Deterministic recommendations for well-understood reports, without an LLM call.
+
+The flagged metrics of a report are matched against a few patterns:
+
+    all results in range            -> maintenance advice, priority Low
+    one mild pattern, e.g. raised
+    lipids or raised glucose/HbA1c  -> templated advice for it, priority Medium
+
+A pattern may span several related metrics (high LDL and high total
+cholesterol are one lipid pattern). Anything else – abnormal results from
+more than one pattern, a result without a template, or a value far outside
+its range – returns None, and the report goes to the LLM.
+"""
+from typing import Dict, List, Optional, Tuple
+
+from services.prompt_builder import _fmt
+from utils.flagging import flag_code, values_from_flagged, FLAG_LOW, FLAG_HIGH
+from utils.metrics import REF_RANGES
+
+# How far past its bound a value may be, as a share of the reference range width,
+# and still count as mild; anything further out needs the LLM (and a closer look)
+MARKED_DEVIATION = 0.5
+
+# (metric, flag) -> pattern
+_PATTERNS: Dict[Tuple[str, str], str] = {
+    **{(m, FLAG_HIGH): "lipids" for m in ("Total Cholesterol", "LDL", "Triglycerides", "VLDL", "LDL/HDL Ratio",
+                                          "Total Cholesterol/HDL Ratio", "TG/HDL Ratio", "Non-HDL Cholesterol")},
+    ("HDL", FLAG_LOW): "lipids",
+    **{(m, FLAG_HIGH): "glucose" for m in ("Fasting Glucose", "Random Glucose", "Glucose", "HbA1c")},
+    **{(m, FLAG_HIGH): "liver" for m in ("ALT (SGPT)", "AST (SGOT)", "Alkaline Phosphatase", "Total Bilirubin")},
+    **{(m, FLAG_HIGH): "kidney" for m in ("Serum Creatinine", "Blood Urea")},
+    ("Hemoglobin", FLAG_LOW): "anaemia",
+    ("RBC", FLAG_LOW): "anaemia",
+}
+
+_NORMAL = {
+    "treatment_suggestions": "All reported results are within their reference ranges; no medical treatment is indicated. "
+                             "Repeat routine screening as advised for the patient's age.",
+    "lifestyle_recommendations": "Maintain the current routine: a balanced diet rich in vegetables, whole grains and lean "
+                                 "protein, at least 150 minutes of moderate exercise a week, 7-8 hours of sleep, and "
+                                 "regular stress management (e.g. breathing exercises or meditation).",
+    "priority": "Low",
+}
+
+_TEMPLATES = {
+    "lipids": {
+        "treatment_suggestions": "Mild dyslipidaemia ({results}). Repeat a fasting lipid profile in 3 months; consider "
+                                 "lipid-lowering therapy if it persists, based on overall cardiovascular risk.",
+        "lifestyle_recommendations": "Reduce saturated and trans fats and refined sugar; favour oats, legumes, nuts, oily "
+                                     "fish and olive oil. At least 150 minutes of aerobic exercise a week, weight "
+                                     "management, no smoking and limited alcohol.",
+    },
+    "glucose": {
+        "treatment_suggestions": "Blood sugar above the normal range ({results}), in the prediabetic range. Repeat fasting "
+                                 "glucose and HbA1c in 3 months; no medication is usually needed at this stage.",
+        "lifestyle_recommendations": "Cut down on sugar, sweetened drinks and refined carbohydrates; choose high-fibre, "
+                                     "low-glycaemic foods and regular meal times. Aim for 30 minutes of brisk walking "
+                                     "daily and a 5-7% weight loss if overweight.",
+    },
+    "liver": {
+        "treatment_suggestions": "Mildly raised liver function results ({results}). Review medications and alcohol intake "
+                                 "and repeat the liver function test in 4-6 weeks.",
+        "lifestyle_recommendations": "Avoid alcohol and unnecessary over-the-counter medicines until the retest; limit fried "
+                                     "and processed foods and sugary drinks, and keep active to support a healthy weight.",
+    },
+    "kidney": {
+        "treatment_suggestions": "Mildly raised kidney function results ({results}). Check hydration and recent medication "
+                                 "(e.g. NSAIDs) and repeat creatinine and urea in 4-6 weeks.",
+        "lifestyle_recommendations": "Drink adequate water through the day, moderate salt and protein intake, avoid "
+                                     "painkillers such as NSAIDs without advice, and keep blood pressure and blood sugar "
+                                     "under control.",
+    },
+    "anaemia": {
+        "treatment_suggestions": "Mild anaemia ({results}). Check iron studies, vitamin B12 and folate; iron "
+                                 "supplementation may be considered once the cause is known.",
+        "lifestyle_recommendations": "Include iron-rich foods (leafy greens, legumes, lean red meat, eggs) with vitamin C "
+                                     "sources to aid absorption, and avoid tea or coffee with meals.",
+    },
+}
+
+
+def _is_marked(metric: str, flag: str, value: float) -> bool:
+    lo, hi = REF_RANGES[metric]
+    beyond = value - hi if flag == FLAG_HIGH else lo - value
+    return beyond > MARKED_DEVIATION * (hi - lo)
+
+
+def recommend_from_rules(extracted_data: dict) -> Optional[dict]:
+    """
+    Templated 'treatment_suggestions' / 'lifestyle_recommendations' / 'priority'
+    for a report that matches a known pattern, or None if it needs the LLM.
+    """
+    values = (extracted_data or {}).get("metric_values")
+    if values is None:
+        # Extractions from before metric_values was stored
+        values = values_from_flagged((extracted_data or {}).get("metrics") or {})
+    populated = {metric: value for metric, value in values.items() if value is not None}
+    if not populated:
+        return None  # nothing to reason about; let the LLM look at the report
+
+    units = extracted_data.get("metric_units") or {}
+    patterns: Dict[str, List[str]] = {}
+    for metric, value in populated.items():
+        flag = flag_code(metric, value)
+        if flag not in (FLAG_LOW, FLAG_HIGH):
+            continue
+        pattern = _PATTERNS.get((metric, flag))
+        if pattern is None or _is_marked(metric, flag, value):
+            return None
+        unit = f" {units[metric]}" if units.get(metric) else ""
+        patterns.setdefault(pattern, []).append(f"{metric} {_fmt(value)}{unit} {flag}")
+
+    if not patterns:
+        return dict(_NORMAL)
+    if len(patterns) > 1:
+        return None  # several abnormal systems: needs the LLM
+
+    pattern, results = next(iter(patterns.items()))
+    template = _TEMPLATES[pattern]
+    return {
+        "treatment_suggestions": template["treatment_suggestions"].format(results=", ".join(results)),
+        "lifestyle_recommendations": template["lifestyle_recommendations"],
+        "priority": "Medium",
+    }
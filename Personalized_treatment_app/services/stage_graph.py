@@ -0,0 +1,55 @@
+# services/stage_graph.py
+"""
+Tiny dependency graph for running independent pipeline stages concurrently.
+
+    graph = StageGraph()
+    graph.add("db_write", save_report)
+    graph.add("allocation", allocate, deps=("db_write",))   # called as allocate(db_write=<result>)
+    graph.add("ai_generation", generate)                    # independent → runs alongside
+    results = graph.run()                                   # {"db_write": ..., "allocation": ..., ...}
+
+Each stage runs on a worker thread inside a copy of the caller's context, so
+it is recorded as a span of the active PipelineTrace. A stage starts once its
+dependencies have finished; a failed dependency fails its dependents too.
+"""
+import contextvars
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable
+
+from services import pipeline_tracing
+
+
+class StageGraph:
+    def __init__(self):
+        # name → (fn, deps); insertion order is a valid topological order
+        self._stages: Dict[str, tuple] = {}
+
+    def add(self, name: str, fn: Callable[..., Any], deps: Iterable[str] = ()) -> "StageGraph":
+        deps = tuple(deps)
+        missing = [d for d in deps if d not in self._stages]
+        if missing:
+            raise ValueError(f"Stage '{name}' depends on unknown stage(s): {', '.join(missing)}")
+        if name in self._stages:
+            raise ValueError(f"Stage '{name}' is already defined.")
+        self._stages[name] = (fn, deps)
+        return self
+
+    @staticmethod
+    def _run_stage(name: str, fn: Callable[..., Any], dep_futures: Dict[str, Future]) -> Any:
+        # Dependencies were submitted earlier, so they are already running or finished
+        kwargs = {dep: fut.result() for dep, fut in dep_futures.items()}
+        with pipeline_tracing.span(name):
+            return fn(**kwargs)
+
+    def run(self) -> Dict[str, Any]:
+        """Runs every stage and returns their results; re-raises the first stage error."""
+        if not self._stages:
+            return {}
+        futures: Dict[str, Future] = {}
+        # One thread per stage: a stage waiting on its dependencies never starves them
+        with ThreadPoolExecutor(max_workers=len(self._stages), thread_name_prefix="stage") as pool:
+            for name, (fn, deps) in self._stages.items():
+                ctx = contextvars.copy_context()
+                futures[name] = pool.submit(ctx.run, self._run_stage, name, fn,
+                                            {d: futures[d] for d in deps})
+        return {name: fut.result() for name, fut in futures.items()}
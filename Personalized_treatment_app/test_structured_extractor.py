@@ -0,0 +1,59 @@
+# test_structured_extractor.py
+import json
+import os
+
+import pytest
+
+from services.extraction.structured_extractor import MultipleRecordsError, StructuredExtractor
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                       "fixtures", "structured", "Patient1_Sample Report_extracted.csv")
+
+
+def test_field_value_export_maps_metrics_and_patient_info():
+    """The DataExtraction export (Field,Value rows) is read directly, without the text fallback."""
+    result = StructuredExtractor.extract(FIXTURE)
+
+    assert result["patient_info"] == {"Patient Name": "John Doe", "Patient ID": "123456", "Age": "45"}
+    values = result["values"]
+    assert values["Hemoglobin"] == 13.8
+    assert values["Total Cholesterol"] == 210.0      # "210.0 ⚠️"
+    assert values["ALT (SGPT)"] == 35.0              # canonical name as the field
+    assert values["LDL/HDL Ratio"] == 3.0
+    assert values["VLDL"] is None                    # "❌ Missing"
+    assert sum(v is not None for v in values.values()) == 20
+
+
+
+def test_wide_csv_with_several_rows_is_rejected(tmp_path):
+    """Rows of a wide table may be different patients: their values must not be merged into one report."""
+    path = tmp_path / "two_patients.csv"
+    path.write_text("Patient Name,HDL,Total Cholesterol,LDL\nA,45,200,\nB,,,130\n")
+
+    with pytest.raises(MultipleRecordsError):
+        StructuredExtractor.extract(str(path))
+
+
+def test_wide_csv_reads_its_single_data_row(tmp_path):
+    path = tmp_path / "one_patient.csv"
+    path.write_text("Patient Name,HDL,Total Cholesterol,LDL\n,,,\nA,45,200,\n")
+
+    result = StructuredExtractor.extract(str(path))
+
+    assert result["patient_info"] == {"Patient Name": "A"}
+    assert result["values"]["HDL"] == 45.0
+    assert result["values"]["Total Cholesterol"] == 200.0
+    assert result["values"]["LDL"] is None
+
+
+def test_json_record_list_with_several_patients_is_rejected(tmp_path):
+    path = tmp_path / "records.json"
+    path.write_text(json.dumps({"results": [{"HDL": 45, "Total Cholesterol": 200}, {"LDL": 130}]}))
+
+    with pytest.raises(MultipleRecordsError):
+        StructuredExtractor.extract(str(path))
+
+
+if __name__ == "__main__":
+    test_field_value_export_maps_metrics_and_patient_info()
+    print("OK")
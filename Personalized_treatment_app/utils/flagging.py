@@ -1,6 +1,7 @@
 # utils/flagging.py
 from __future__ import annotations
-from typing import Dict, Union, Tuple
+import re
+from typing import Dict, Optional, Union, Tuple
 from utils.metrics import REF_RANGES # Import reference ranges
 
 # Define the FlaggedMetric type for clarity
@@ -31,4 +32,65 @@ def flag_metrics(values: Dict[str, Union[float, None]]) -> Dict[str, FlaggedMetr
             suffix = " ⚠️" # Warning flag
             
         flagged[metric] = (f"{val}{suffix}", colour)
-    return flagged
\ No newline at end of file
+    return flagged
+
+
+_NUMBER_RE = re.compile(r"[-+]?[0-9]*\.?[0-9]+")
+
+
+def values_from_flagged(flagged_metrics: Dict[str, FlaggedMetric]) -> Dict[str, Optional[float]]:
+    """Numeric values recovered from flagged strings ("5.2 ⚠️", "❌ Missing") of old extractions."""
+    values = {}
+    for metric, flagged in flagged_metrics.items():
+        text = flagged[0] if isinstance(flagged, (list, tuple)) and flagged else str(flagged)
+        m = _NUMBER_RE.search(text or "")
+        values[metric] = float(m.group()) if m else None
+    return values
+
+
+# ------------------------------------------------------------------
+# Machine-readable flags, stored per observation in metric_observations
+# ------------------------------------------------------------------
+FLAG_NORMAL, FLAG_LOW, FLAG_HIGH, FLAG_NO_REF = "normal", "low", "high", "no_ref"
+
+
+def flag_code(metric: str, val: float, ref_ranges: Dict[str, Tuple[float, float]] = None) -> str:
+    """Flag of a single value; same bounds as flag_metrics (inclusive range = normal)."""
+    ref_ranges = REF_RANGES if ref_ranges is None else ref_ranges
+    if metric not in ref_ranges:
+        return FLAG_NO_REF
+    lo, hi = ref_ranges[metric]
+    if val < lo:
+        return FLAG_LOW
+    if val > hi:
+        return FLAG_HIGH
+    return FLAG_NORMAL
+
+
+def flag_codes_vectorized(metrics, values, ref_ranges: Dict[str, Tuple[float, float]] = None):
+    """
+    Vectorised flag_code over parallel arrays of metric names and values.
+
+    REF_RANGES is turned into lo/hi arrays once; every observation then looks
+    up its bounds by integer index and is compared in a single NumPy pass, so
+    millions of observations re-flag in well under a second.
+    Returns an object array of flag strings.
+    """
+    import numpy as np # Lazy imports: only batch re-flagging needs NumPy / pandas
+    import pandas as pd
+    ref_ranges = REF_RANGES if ref_ranges is None else ref_ranges
+    values = np.asarray(values, dtype=float)
+
+    # Hash-based factorisation: each distinct metric name is looked up once
+    metric_codes, uniques = pd.factorize(np.asarray(metrics, dtype=object))
+    lo = np.array([ref_ranges[m][0] if m in ref_ranges else np.nan for m in uniques], dtype=float)
+    hi = np.array([ref_ranges[m][1] if m in ref_ranges else np.nan for m in uniques], dtype=float)
+    row_lo, row_hi = lo[metric_codes], hi[metric_codes]
+
+    # 0 = normal, 1 = low, 2 = high, 3 = no reference range
+    codes = np.zeros(values.shape, dtype=np.int8)
+    codes[values < row_lo] = 1
+    codes[values > row_hi] = 2
+    codes[np.isnan(row_lo)] = 3
+    labels = np.array([FLAG_NORMAL, FLAG_LOW, FLAG_HIGH, FLAG_NO_REF], dtype=object)
+    return labels[codes]
@@ -2,6 +2,8 @@
 Central place to store metric → alias mapping and reference ranges.
 Add or edit entries here – extractor.py will pick them up automatically.
 """
+import hashlib
+import json
 from typing import Dict, List, Tuple
 
 # ------------------------------------------------------------------
@@ -115,3 +117,23 @@ REF_RANGES: Dict[str, Tuple[float, float]] = {
     "Urine pH": (4.5, 8.0),
     "Specific Gravity": (1.005, 1.030),
 }
+
+# ------------------------------------------------------------------
+# Extractor version stamp – stored with every extraction so stale
+# reports can be found and refreshed (see services/extraction_backfill.py)
+# ------------------------------------------------------------------
+# Bump when text / table / metric parsing code changes: affected reports
+# are re-extracted from the source file. Alias and range edits are picked
+# up automatically through the fingerprints below.
+EXTRACTOR_CODE_VERSION = 1
+
+
+def _fingerprint(obj) -> str:
+    return hashlib.sha256(json.dumps(obj, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+
+
+EXTRACTOR_VERSION: Dict[str, object] = {
+    "code": EXTRACTOR_CODE_VERSION,
+    "aliases": _fingerprint(METRIC_ALIASES),
+    "ranges": _fingerprint(REF_RANGES),
+}
@@ -0,0 +1,140 @@
+# utils/streaming_json.py
+"""
+Incremental parser for a JSON object that arrives in chunks (a streamed LLM answer).
+
+    parser = PartialJSONObject()
+    for chunk in chunks:
+        changed = parser.feed(chunk)      # keys whose value grew or finished
+        parser.values["treatment_suggestions"]   # the text so far, decoded
+
+String values are readable while they are still being written; other values
+(numbers, lists, nested objects) appear once complete. Escapes split across
+chunks (e.g. "\\u00" + "e9") are held back until they can be decoded.
+"""
+import json
+import re
+from typing import Dict, Set
+
+# A trailing escape that isn't complete yet, or a high surrogate waiting for its pair
+_INCOMPLETE_ESCAPE = re.compile(r"(\\u[dD][89abAB][0-9a-fA-F]{2})?(\\u[0-9a-fA-F]{0,3})?\\?$")
+
+
+def _decode_partial(raw: str) -> str:
+    """Decodes the escaped body of an unterminated JSON string, up to its last complete character."""
+    # An odd run of trailing backslashes means the last one starts an escape
+    trailing = len(raw) - len(raw.rstrip("\\"))
+    if trailing % 2:
+        raw = raw[:-1]
+    raw = _INCOMPLETE_ESCAPE.sub(lambda m: "" if (m.group(1) or m.group(2)) else m.group(0), raw)
+    try:
+        return json.loads(f'"{raw}"')
+    except json.JSONDecodeError:
+        return raw
+
+
+class PartialJSONObject:
+    def __init__(self):
+        self.values: Dict[str, object] = {}
+        self.finished: Set[str] = set()   # keys whose value is complete
+        self.complete = False             # the closing brace has been seen
+        self._state = "start"
+        self._key = None
+        self._raw = ""                    # escaped text of the current key / string value, or a raw value
+        self._escaped = False
+        self._depth = 0                   # nesting inside a non-string value
+        self._in_string = False           # inside a string within a non-string value
+
+    def feed(self, chunk: str) -> Set[str]:
+        """Consumes the next chunk; returns the keys whose value changed."""
+        changed: Set[str] = set()
+        for ch in chunk:
+            state = self._state
+            if state == "start":
+                if ch == "{":
+                    self._state = "key_or_end"
+            elif state == "key_or_end":
+                if ch == '"':
+                    self._state, self._raw, self._escaped = "key", "", False
+                elif ch == "}":
+                    self._state, self.complete = "done", True
+            elif state == "key":
+                if self._escaped:
+                    self._escaped = False
+                    self._raw += ch
+                elif ch == "\\":
+                    self._escaped = True
+                    self._raw += ch
+                elif ch == '"':
+                    self._key = _decode_partial(self._raw)
+                    self._state = "colon"
+                else:
+                    self._raw += ch
+            elif state == "colon":
+                if ch == ":":
+                    self._state = "value"
+            elif state == "value":
+                if ch == '"':
+                    self._state, self._raw, self._escaped = "string", "", False
+                    self.values[self._key] = ""
+                    changed.add(self._key)
+                elif not ch.isspace():
+                    self._state, self._raw = "raw", ""
+                    self._depth, self._in_string, self._escaped = 0, False, False
+                    self._feed_raw(ch, changed)
+            elif state == "string":
+                if self._escaped:
+                    self._escaped = False
+                    self._raw += ch
+                elif ch == "\\":
+                    self._escaped = True
+                    self._raw += ch
+                elif ch == '"':
+                    self.values[self._key] = _decode_partial(self._raw)
+                    self.finished.add(self._key)
+                    changed.add(self._key)
+                    self._state = "next"
+                else:
+                    self._raw += ch
+            elif state == "raw":
+                self._feed_raw(ch, changed)
+            elif state == "next":
+                if ch == ",":
+                    self._state = "key_or_end"
+                elif ch == "}":
+                    self._state, self.complete = "done", True
+
+        if self._state == "string" and self._key is not None:
+            text = _decode_partial(self._raw)
+            if text != self.values.get(self._key):
+                self.values[self._key] = text
+                changed.add(self._key)
+        return changed
+
+    def _feed_raw(self, ch: str, changed: Set[str]):
+        """A number, literal, list or nested object: collected whole, decoded when it ends."""
+        if self._in_string:
+            if self._escaped:
+                self._escaped = False
+            elif ch == "\\":
+                self._escaped = True
+            elif ch == '"':
+                self._in_string = False
+        elif ch == '"':
+            self._in_string = True
+        elif ch in "[{":
+            self._depth += 1
+        elif ch in "]}" and self._depth:
+            self._depth -= 1
+        elif self._depth == 0 and ch in ",}":
+            try:
+                self.values[self._key] = json.loads(self._raw)
+            except json.JSONDecodeError:
+                self.values[self._key] = self._raw.strip()
+            self.finished.add(self._key)
+            changed.add(self._key)
+            if ch == ",":
+                self._state = "key_or_end"
+            else:
+                self._state, self.complete = "done", True
+            return
+        self._raw += ch
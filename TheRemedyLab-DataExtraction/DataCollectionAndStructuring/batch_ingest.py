@@ -0,0 +1,191 @@
+"""
+Batch ingestion of a report archive (command‑line counterpart of app.py).
+
+    python batch_ingest.py <input_dir> [--workers N] [--manifest PATH] [--batch-size N]
+
+Walks <input_dir>, extracts text, metrics and patient info on a process
+pool and appends records through `Consolidator`. Every processed file is
+logged to a checkpoint manifest, so an interrupted run resumes where it
+stopped; files that changed since (size / mtime) are processed again.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Iterator, Optional, Tuple
+
+from modules.extractor.text_extractor import RawTextExtractor
+from modules.extractor.metric_extractor import MetricExtractor
+from modules.extractor.patient_info_extractor import PatientInfoExtractor
+from modules.consolidator import Consolidator
+from config import STRUCTURED_DIR
+
+SUPPORTED_EXTENSIONS = {".pdf", ".docx", ".csv", ".json"}
+MANIFEST_PATH = os.path.join(STRUCTURED_DIR, "batch_manifest.jsonl")
+
+
+# ---------------------- Worker (runs in a child process) ----------------------
+
+def process_file(path: str) -> Dict:
+    """Extract one report; never raises so a bad file can't kill the pool."""
+    start = time.perf_counter()
+    try:
+        text = RawTextExtractor.extract_text(path)
+        if not text or not text.strip():
+            # the extractors swallow read errors and return ""
+            raise ValueError("no text could be extracted")
+        flagged = MetricExtractor.extract_metrics(text, is_path=False)
+        patient_md = PatientInfoExtractor.extract_patient_info(text)
+        return {"path": path, "patient_info": patient_md, "metrics": flagged,
+                "error": None, "seconds": time.perf_counter() - start}
+    except Exception as exc:
+        return {"path": path, "patient_info": None, "metrics": None,
+                "error": f"{type(exc).__name__}: {exc}",
+                "seconds": time.perf_counter() - start}
+
+
+# ---------------------- Manifest (checkpoint) ----------------------
+
+def _fingerprint(path: str) -> Tuple[int, float]:
+    st = os.stat(path)
+    return st.st_size, st.st_mtime
+
+
+def load_manifest(manifest_path: str) -> Dict[str, Dict]:
+    """Last manifest entry per path (later lines win)."""
+    done: Dict[str, Dict] = {}
+    if not os.path.exists(manifest_path):
+        return done
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # torn last line from an interrupted run
+            done[entry["path"]] = entry
+    return done
+
+
+def iter_reports(input_dir: str) -> Iterator[str]:
+    for root, _, files in os.walk(input_dir):
+        for name in sorted(files):
+            if os.path.splitext(name.lower())[1] in SUPPORTED_EXTENSIONS:
+                yield os.path.abspath(os.path.join(root, name))
+
+
+def pending_reports(input_dir: str, done: Dict[str, Dict], retry_failed: bool) -> Iterator[Tuple[str, Tuple[int, float]]]:
+    """(path, fingerprint) of every file to process; the fingerprint is taken before processing."""
+    for path in iter_reports(input_dir):
+        try:
+            fingerprint = _fingerprint(path)
+        except OSError:
+            continue  # removed since the directory was listed
+        entry = done.get(path)
+        if entry is None:
+            yield path, fingerprint
+            continue
+        size, mtime = fingerprint
+        if entry.get("size") != size or entry.get("mtime") != mtime:
+            yield path, fingerprint  # changed since it was processed
+        elif entry.get("status") == "failed" and retry_failed:
+            yield path, fingerprint
+
+
+# ---------------------- Driver ----------------------
+
+def run(input_dir: str, workers: Optional[int] = None, manifest_path: str = MANIFEST_PATH,
+        batch_size: int = 100, retry_failed: bool = False) -> Dict:
+    done = load_manifest(manifest_path)
+    todo = list(pending_reports(input_dir, done, retry_failed))
+    skipped = sum(1 for _ in iter_reports(input_dir)) - len(todo)
+    print(f"[batch] {len(todo)} file(s) to process, {skipped} already done (resuming).")
+
+    consolidator = Consolidator()
+    pending_records = []
+    failures: Counter = Counter()
+    failed_files = []
+    ok = 0
+    start = time.perf_counter()
+
+    os.makedirs(os.path.dirname(manifest_path) or ".", exist_ok=True)
+    with open(manifest_path, "a", encoding="utf-8") as manifest, \
+            ProcessPoolExecutor(max_workers=workers) as pool:
+
+        def _flush():
+            # Records first, then the manifest: a crash in between re-processes
+            # the batch instead of losing it.
+            if pending_records:
+                consolidator.save_structured_records([(r["patient_info"], r["metrics"]) for r in pending_records])
+            for r in pending_records:
+                manifest.write(r["manifest_line"])
+            manifest.flush()
+            pending_records.clear()
+
+        # Fingerprints from before processing: a file removed meanwhile can't abort the run,
+        # and one changed meanwhile is processed again next time
+        futures = {pool.submit(process_file, path): fingerprint for path, fingerprint in todo}
+        for i, fut in enumerate(as_completed(futures), 1):
+            result = fut.result()
+            size, mtime = futures[fut]
+            entry = {"path": result["path"], "size": size, "mtime": mtime,
+                     "status": "failed" if result["error"] else "ok",
+                     "error": result["error"], "seconds": round(result["seconds"], 3)}
+            line = json.dumps(entry, ensure_ascii=False) + "\n"
+
+            if result["error"]:
+                failures[result["error"].split(":", 1)[0]] += 1
+                failed_files.append((result["path"], result["error"]))
+                manifest.write(line)
+            else:
+                ok += 1
+                result["manifest_line"] = line
+                pending_records.append(result)
+                if len(pending_records) >= batch_size:
+                    _flush()
+
+            if i % 100 == 0:
+                elapsed = time.perf_counter() - start
+                print(f"[batch] {i}/{len(todo)} done – {i / elapsed:.1f} files/s")
+        _flush()
+
+    elapsed = time.perf_counter() - start
+    summary = {
+        "processed": len(todo),
+        "succeeded": ok,
+        "failed": len(failed_files),
+        "skipped": skipped,
+        "seconds": round(elapsed, 2),
+        "files_per_second": round(len(todo) / elapsed, 2) if elapsed > 0 else 0.0,
+        "failures_by_type": dict(failures),
+    }
+
+    print("\n[batch] ---------------- Summary ----------------")
+    print(f"Processed {summary['processed']} file(s) in {summary['seconds']}s "
+          f"({summary['files_per_second']} files/s): {ok} ok, {len(failed_files)} failed, "
+          f"{skipped} skipped.")
+    for err_type, count in failures.most_common():
+        print(f"  {err_type}: {count}")
+    for path, err in failed_files[:20]:
+        print(f"  ✗ {path}: {err}")
+    if len(failed_files) > 20:
+        print(f"  … and {len(failed_files) - 20} more (see {manifest_path})")
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch-extract a directory of lab reports.")
+    parser.add_argument("input_dir")
+    parser.add_argument("--workers", type=int, default=None, help="process count (default: CPU count)")
+    parser.add_argument("--manifest", default=MANIFEST_PATH, help="checkpoint manifest (JSONL)")
+    parser.add_argument("--batch-size", type=int, default=100, help="records per Consolidator write")
+    parser.add_argument("--retry-failed", action="store_true", help="re-process files that failed before")
+    args = parser.parse_args()
+    run(args.input_dir, args.workers, args.manifest, args.batch_size, args.retry_failed)
+
+
+if __name__ == "__main__":
+    main()
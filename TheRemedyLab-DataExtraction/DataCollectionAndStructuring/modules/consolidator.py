@@ -1,7 +1,7 @@
 import os
 import json
 import pandas as pd
-from typing import Dict
+from typing import Dict, List, Tuple
 from config import STRUCTURED_DIR, RECORDS_FILENAME
 
 # Update the filename to end with `.jsonl`
@@ -18,9 +18,9 @@ class Consolidator:
         # Ensure the full path to the JSON file is set
         self.json_path = os.path.join(self.json_dir, self.filename)
 
-    def save_structured_record(self,patient_info: Dict[str, str], metrics: Dict[str, tuple]):
-
-  # Combine patient info and metric values (as nested dicts: {value, color})
+    @staticmethod
+    def _build_record(patient_info: Dict[str, str], metrics: Dict[str, tuple]) -> Dict:
+        # Combine patient info and metric values (as nested dicts: {value, color})
         record = {**patient_info}
         for k, (value, color) in metrics.items():
             record[k] = {
@@ -29,11 +29,20 @@ class Consolidator:
             }
 
         # Sort keys for consistency (optional)
-        record = dict(sorted(record.items()))
+        return dict(sorted(record.items()))
 
-        # Write as JSON line
+    def save_structured_record(self,patient_info: Dict[str, str], metrics: Dict[str, tuple]):
+        self.save_structured_records([(patient_info, metrics)])
+
+    def save_structured_records(self, items: List[Tuple[Dict[str, str], Dict[str, tuple]]]):
+        """Append many (patient_info, metrics) records with a single file open."""
+        lines = [
+            json.dumps(self._build_record(patient_info, metrics), ensure_ascii=False) + "\n"
+            for patient_info, metrics in items
+        ]
+        # Write as JSON lines
         with open(self.json_path, "a", encoding="utf-8") as f:
-            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.writelines(lines)
 
 
 # from consolidator import Consolidator
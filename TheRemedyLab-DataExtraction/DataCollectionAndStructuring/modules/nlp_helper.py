@@ -1,10 +1,18 @@
 # modules/nlp_helper.py
 """Resolve medical term synonyms to standard keys."""
-import spacy
 
-nlp = spacy.load("en_core_web_sm", disable=["parser", "ner"])
+_nlp = None
+
+
+def get_nlp():
+    """Load the spaCy pipeline on first use (it is slow to import and load)."""
+    global _nlp
+    if _nlp is None:
+        import spacy
+        _nlp = spacy.load("en_core_web_sm", disable=["parser", "ner"])
+    return _nlp
 
 
 def standardize_term(raw_term: str) -> str:
  
-    return raw_term.strip().title()
\ No newline at end of file
+    return raw_term.strip().title()